@@ -118,6 +118,12 @@ class T2SBlock:
 
         self.false = torch.tensor(False, dtype=torch.bool)
 
+    def qkv_proj(self, x: torch.Tensor):
+        return F.linear(x, self.qkv_w, self.qkv_b)
+
+    def out_proj(self, x: torch.Tensor):
+        return F.linear(x, self.out_w, self.out_b)
+
     @torch.jit.ignore
     def to_mask(
         self,
@@ -139,7 +145,7 @@ class T2SBlock:
         padding_mask: Optional[torch.Tensor] = None,
         torch_sdpa: bool = True,
     ):
-        q, k, v = F.linear(self.to_mask(x, padding_mask), self.qkv_w, self.qkv_b).chunk(3, dim=-1)
+        q, k, v = self.qkv_proj(self.to_mask(x, padding_mask)).chunk(3, dim=-1)
 
         batch_size = q.shape[0]
         q_len = q.shape[1]
@@ -159,7 +165,7 @@ class T2SBlock:
             attn = scaled_dot_product_attention(q, k, v, attn_mask)
 
         attn = attn.transpose(1, 2).reshape(batch_size, q_len, -1)
-        attn = F.linear(self.to_mask(attn, padding_mask), self.out_w, self.out_b)
+        attn = self.out_proj(self.to_mask(attn, padding_mask))
 
         x = x + attn
         x = F.layer_norm(x, [self.hidden_dim], self.norm_w1, self.norm_b1, self.norm_eps1)
@@ -181,7 +187,7 @@ class T2SBlock:
         attn_mask: torch.Tensor = None,
         torch_sdpa: bool = True,
     ):
-        q, k, v = F.linear(x, self.qkv_w, self.qkv_b).chunk(3, dim=-1)
+        q, k, v = self.qkv_proj(x).chunk(3, dim=-1)
 
         k_cache = torch.cat([k_cache, k], dim=1)
         v_cache = torch.cat([v_cache, v], dim=1)
@@ -200,7 +206,106 @@ class T2SBlock:
             attn = scaled_dot_product_attention(q, k, v, attn_mask)
 
         attn = attn.transpose(1, 2).reshape(batch_size, q_len, -1)
-        attn = F.linear(attn, self.out_w, self.out_b)
+        attn = self.out_proj(attn)
+
+        x = x + attn
+        x = F.layer_norm(
+            x,
+            [self.hidden_dim],
+            self.norm_w1,
+            self.norm_b1,
+            self.norm_eps1,
+        )
+        x = x + self.mlp.forward(x)
+        x = F.layer_norm(
+            x,
+            [self.hidden_dim],
+            self.norm_w2,
+            self.norm_b2,
+            self.norm_eps2,
+        )
+        return x, k_cache, v_cache
+
+    def decode_next_token_static(
+        self,
+        x: torch.Tensor,
+        k_cache: torch.Tensor,
+        v_cache: torch.Tensor,
+        pos: int,
+        attn_mask: Optional[torch.Tensor] = None,
+        torch_sdpa: bool = True,
+    ):
+        # k_cache/v_cache are fixed-capacity buffers; the new key/value is written in place at pos
+        q, k, v = self.qkv_proj(x).chunk(3, dim=-1)
+
+        k_cache[:, pos : pos + 1] = k
+        v_cache[:, pos : pos + 1] = v
+
+        batch_size = q.shape[0]
+        q_len = q.shape[1]
+        kv_len = pos + 1
+
+        q = q.view(batch_size, q_len, self.num_heads, -1).transpose(1, 2)
+        k = k_cache[:, :kv_len].view(batch_size, kv_len, self.num_heads, -1).transpose(1, 2)
+        v = v_cache[:, :kv_len].view(batch_size, kv_len, self.num_heads, -1).transpose(1, 2)
+
+        if torch_sdpa:
+            attn = F.scaled_dot_product_attention(q, k, v, (~attn_mask) if attn_mask is not None else None)
+        else:
+            attn = scaled_dot_product_attention(q, k, v, attn_mask)
+
+        attn = attn.transpose(1, 2).reshape(batch_size, q_len, -1)
+        attn = self.out_proj(attn)
+
+        x = x + attn
+        x = F.layer_norm(
+            x,
+            [self.hidden_dim],
+            self.norm_w1,
+            self.norm_b1,
+            self.norm_eps1,
+        )
+        x = x + self.mlp.forward(x)
+        x = F.layer_norm(
+            x,
+            [self.hidden_dim],
+            self.norm_w2,
+            self.norm_b2,
+            self.norm_eps2,
+        )
+        return x, k_cache, v_cache
+
+    def decode_next_token_slots(
+        self,
+        x: torch.Tensor,
+        k_cache: torch.Tensor,
+        v_cache: torch.Tensor,
+        positions: torch.Tensor,
+        kv_len: int,
+        attn_mask: torch.Tensor,
+        torch_sdpa: bool = True,
+    ):
+        # 每个slot各自的写入位置positions，attn_mask屏蔽各slot自身长度之外的kv
+        q, k, v = self.qkv_proj(x).chunk(3, dim=-1)
+
+        index = positions.view(-1, 1, 1).expand(-1, 1, k.shape[-1])
+        k_cache.scatter_(1, index, k)
+        v_cache.scatter_(1, index, v)
+
+        batch_size = q.shape[0]
+        q_len = q.shape[1]
+
+        q = q.view(batch_size, q_len, self.num_heads, -1).transpose(1, 2)
+        k = k_cache[:, :kv_len].view(batch_size, kv_len, self.num_heads, -1).transpose(1, 2)
+        v = v_cache[:, :kv_len].view(batch_size, kv_len, self.num_heads, -1).transpose(1, 2)
+
+        if torch_sdpa:
+            attn = F.scaled_dot_product_attention(q, k, v, ~attn_mask)
+        else:
+            attn = scaled_dot_product_attention(q, k, v, attn_mask)
+
+        attn = attn.transpose(1, 2).reshape(batch_size, q_len, -1)
+        attn = self.out_proj(attn)
 
         x = x + attn
         x = F.layer_norm(
@@ -256,6 +361,52 @@ class T2STransformer:
             )
         return x, k_cache, v_cache
 
+    def init_static_cache(self, k_cache: List[torch.Tensor], v_cache: List[torch.Tensor], capacity: int):
+        """Copy the prompt KV cache into preallocated buffers of `capacity` positions"""
+        k_static: List[torch.Tensor] = []
+        v_static: List[torch.Tensor] = []
+        for i in range(self.num_blocks):
+            k = k_cache[i]
+            v = v_cache[i]
+            k_buf = torch.zeros((k.shape[0], capacity, k.shape[2]), dtype=k.dtype, device=k.device)
+            v_buf = torch.zeros((v.shape[0], capacity, v.shape[2]), dtype=v.dtype, device=v.device)
+            k_buf[:, : k.shape[1]] = k
+            v_buf[:, : v.shape[1]] = v
+            k_static.append(k_buf)
+            v_static.append(v_buf)
+        return k_static, v_static
+
+    def decode_next_token_static(
+        self,
+        x: torch.Tensor,
+        k_cache: List[torch.Tensor],
+        v_cache: List[torch.Tensor],
+        pos: int,
+        attn_mask: Optional[torch.Tensor] = None,
+        torch_sdpa: bool = True,
+    ):
+        for i in range(self.num_blocks):
+            x, k_cache[i], v_cache[i] = self.blocks[i].decode_next_token_static(
+                x, k_cache[i], v_cache[i], pos, attn_mask, torch_sdpa
+            )
+        return x, k_cache, v_cache
+
+    def decode_next_token_slots(
+        self,
+        x: torch.Tensor,
+        k_cache: List[torch.Tensor],
+        v_cache: List[torch.Tensor],
+        positions: torch.Tensor,
+        kv_len: int,
+        attn_mask: torch.Tensor,
+        torch_sdpa: bool = True,
+    ):
+        for i in range(self.num_blocks):
+            x, k_cache[i], v_cache[i] = self.blocks[i].decode_next_token_slots(
+                x, k_cache[i], v_cache[i], positions, kv_len, attn_mask, torch_sdpa
+            )
+        return x, k_cache, v_cache
+
 
 class Text2SemanticDecoder(nn.Module):
     def __init__(self, config, norm_first=False, top_k=3):
@@ -608,6 +759,9 @@ class Text2SemanticDecoder(nn.Module):
             )
 
         max_len = kwargs.get("max_len", x_lens.max())
+        # fixed-capacity KV buffers written by position and a precomputed, sliced attention mask
+        static_cache = kwargs.get("static_cache", True)
+        max_steps = 1500
         x_list = []
         for x_item, bert_item in zip(x, bert_feature):
             # max_len = max(max_len, x_item.shape[0], bert_item.shape[1])
@@ -698,17 +852,25 @@ class Text2SemanticDecoder(nn.Module):
         y_list = [None] * y.shape[0]
         batch_idx_map = list(range(y.shape[0]))
         idx_list = [None] * y.shape[0]
-        for idx in tqdm(range(1500)):
+        for idx in tqdm(range(max_steps)):
             if idx == 0:
                 xy_dec, k_cache, v_cache = self.t2s_transformer.process_prompt(xy_pos, attn_mask, None)
+                if static_cache:
+                    k_cache, v_cache = self.t2s_transformer.init_static_cache(k_cache, v_cache, src_len + max_steps)
+            elif static_cache:
+                xy_dec, k_cache, v_cache = self.t2s_transformer.decode_next_token_static(
+                    xy_pos, k_cache, v_cache, src_len + idx - 1, attn_mask[:, :, :, : src_len + idx]
+                )
             else:
                 xy_dec, k_cache, v_cache = self.t2s_transformer.decode_next_token(xy_pos, k_cache, v_cache, attn_mask)
             logits = self.ar_predict_layer(xy_dec[:, -1])
 
             if idx == 0:
-                attn_mask = F.pad(attn_mask[:, :, -1].unsqueeze(-2), (0, 1), value=False)
+                attn_mask = F.pad(
+                    attn_mask[:, :, -1].unsqueeze(-2), (0, max_steps if static_cache else 1), value=False
+                )
                 logits = logits[:, :-1]
-            else:
+            elif not static_cache:
                 attn_mask = F.pad(attn_mask, (0, 1), value=False)
 
             samples = sample(
@@ -744,7 +906,7 @@ class Text2SemanticDecoder(nn.Module):
                         k_cache[i] = torch.index_select(k_cache[i], dim=0, index=reserved_idx_of_batch_for_y)
                         v_cache[i] = torch.index_select(v_cache[i], dim=0, index=reserved_idx_of_batch_for_y)
 
-            if (early_stop_num != -1 and (y.shape[1] - prefix_len) > early_stop_num) or idx == 1499:
+            if (early_stop_num != -1 and (y.shape[1] - prefix_len) > early_stop_num) or idx == max_steps - 1:
                 print("use early stop num:", early_stop_num)
                 stop = True
                 for i, batch_index in enumerate(batch_idx_map):
@@ -834,6 +996,9 @@ class Text2SemanticDecoder(nn.Module):
         x_len = x.shape[1]
         x_attn_mask = torch.zeros((x_len, x_len), dtype=torch.bool)
         stop = False
+        # fixed-capacity KV buffers written by position instead of growing with torch.cat
+        static_cache = kwargs.get("static_cache", True)
+        max_steps = 1500
         # print(1111111,self.num_layers)
 
         k_cache = None
@@ -875,9 +1040,15 @@ class Text2SemanticDecoder(nn.Module):
             .to(device=x.device, dtype=torch.bool)
         )
 
-        for idx in tqdm(range(1500)):
+        for idx in tqdm(range(max_steps)):
             if xy_attn_mask is not None:
                 xy_dec, k_cache, v_cache = self.t2s_transformer.process_prompt(xy_pos, xy_attn_mask, None)
+                if static_cache:
+                    k_cache, v_cache = self.t2s_transformer.init_static_cache(k_cache, v_cache, src_len + max_steps)
+            elif static_cache:
+                xy_dec, k_cache, v_cache = self.t2s_transformer.decode_next_token_static(
+                    xy_pos, k_cache, v_cache, src_len + idx - 1
+                )
             else:
                 xy_dec, k_cache, v_cache = self.t2s_transformer.decode_next_token(xy_pos, k_cache, v_cache)
 
@@ -0,0 +1,358 @@
+# Continuous batching for Text2SemanticDecoder:
+# 固定数量的slot，每个slot有独立的kv cache；某个slot生成到EOS后立即释放并从队列中接入新的请求，
+# 而不是像infer_panel_batch_infer那样让batch越解越小
+import threading
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from concurrent.futures import wait as wait_futures
+from typing import List, Optional
+
+import torch
+import torch.nn.functional as F
+
+from AR.models.utils import sample
+
+
+class T2SRequest:
+    def __init__(
+        self,
+        phones: torch.LongTensor,  # 参考文本+目标文本的phone id, [N]
+        bert_feature: torch.Tensor,  # [1024, N]
+        prompt: torch.LongTensor,  # 参考音频semantic token, [T]
+        top_k: int = 15,
+        top_p: float = 1.0,
+        temperature: float = 1.0,
+        repetition_penalty: float = 1.35,
+        early_stop_num: int = -1,
+    ):
+        self.phones = phones
+        self.bert_feature = bert_feature
+        self.prompt = prompt
+        self.top_k = top_k
+        self.top_p = top_p
+        self.temperature = temperature
+        self.repetition_penalty = repetition_penalty
+        self.early_stop_num = early_stop_num
+        self.future: Future = Future()
+
+    def sampling_params(self):
+        return (self.top_k, self.top_p, self.temperature, self.repetition_penalty)
+
+
+class _Slot:
+    def __init__(self, request: T2SRequest, src_len: int, y_len: int):
+        self.request = request
+        self.src_len = src_len
+        self.y_len = y_len
+        self.step = 0  # 已生成的token数
+
+    @property
+    def n_tokens(self):
+        return self.y_len + self.step
+
+
+class T2SContinuousBatchScheduler:
+    """
+    Request queue + slot-based decode loop for Text2SemanticDecoder.
+
+    submit() is thread-safe and returns a Future resolving to (pred_semantic, idx), the same pair
+    infer_panel_batch_infer returns per item. Decoding is driven by wait() in the calling thread;
+    concurrent callers take turns running one step at a time. cancel() is thread-safe too: a request
+    that is already decoding gives up its slot before the next step, its future raises CancelledError.
+    """
+
+    def __init__(self, model, max_batch_size: int = 8, max_steps: int = 1500):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_steps = max_steps
+        self.min_steps = 11  ###至少预测出10个token不然不给停止（0.4s）
+
+        self.slots: List[Optional[_Slot]] = [None] * max_batch_size
+        self.k_cache: Optional[List[torch.Tensor]] = None
+        self.v_cache: Optional[List[torch.Tensor]] = None
+        self.tokens: Optional[torch.Tensor] = None
+        self.last_tokens: Optional[torch.Tensor] = None
+        self.capacity = 0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._drive_lock = threading.Lock()
+        # 已经进入slot、等待下一步前释放的请求
+        self._cancelled = set()
+
+        self.decode_steps = 0
+        self.slot_steps = 0
+        self.completed = 0
+        self.cancelled = 0
+
+    ################### request queue ###################
+    def submit(self, request: T2SRequest) -> Future:
+        with self._cond:
+            self._queue.append(request)
+            self._cond.notify()
+        return request.future
+
+    def submit_batch(
+        self,
+        phones_list: List[torch.LongTensor],
+        bert_features: List[torch.Tensor],
+        prompts: torch.LongTensor,
+        **sampling_kwargs,
+    ) -> List[Future]:
+        return [
+            self.submit(T2SRequest(phones, bert_feature, prompts[i], **sampling_kwargs))
+            for i, (phones, bert_feature) in enumerate(zip(phones_list, bert_features))
+        ]
+
+    def wait(self, futures: List[Future]):
+        """Drive decoding until all futures are resolved; returns (pred_semantic_list, idx_list)"""
+        while True:
+            pending = [f for f in futures if not f.done()]
+            if not pending:
+                break
+            if self._drive_lock.acquire(blocking=False):
+                try:
+                    active = self._step()
+                finally:
+                    self._drive_lock.release()
+                if active:
+                    continue
+            # 其他线程正在推进解码
+            wait_futures(pending, timeout=0.01)
+        results = [f.result() for f in futures]
+        return [r[0] for r in results], [r[1] for r in results]
+
+    def cancel(self, futures: List[Future]):
+        """
+        Cancel requests. Queued ones are dropped; decoding ones free their slot (and its kv cache region,
+        reused by the next prefill) right away if no other thread is stepping, otherwise before the next step.
+        """
+        with self._cond:
+            for future in futures:
+                # 还在队列里的直接取消，_admit_pending会跳过
+                if not future.cancel() and not future.done():
+                    self._cancelled.add(future)
+        if self._drive_lock.acquire(blocking=False):
+            try:
+                self._drop_cancelled()
+            finally:
+                self._drive_lock.release()
+
+    def stop(self):
+        """Cancel everything queued or decoding, e.g. before the model is replaced"""
+        with self._cond:
+            futures = [request.future for request in self._queue]
+        futures += [slot.request.future for slot in self.slots if slot is not None]
+        self.cancel(futures)
+
+    def has_active(self):
+        return any(slot is not None for slot in self.slots)
+
+    def is_idle(self):
+        return not self._queue and not self.has_active()
+
+    def stats(self):
+        return {
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "decode_steps": self.decode_steps,
+            "utilization": self.slot_steps / (self.decode_steps * self.max_batch_size) if self.decode_steps else 0.0,
+        }
+
+    ################### decode loop ###################
+    def _step(self):
+        try:
+            self._admit_pending()
+            self._drop_cancelled()
+            if not self.has_active():
+                return False
+            self._decode()
+        except Exception as e:
+            # 出错时让当前所有请求都失败，保证调用方不会一直等待
+            for i, slot in enumerate(self.slots):
+                if slot is not None:
+                    slot.request.future.set_exception(e)
+                    self.slots[i] = None
+        return True
+
+    def _drop_cancelled(self):
+        with self._cond:
+            cancelled, self._cancelled = self._cancelled, set()
+        if not cancelled:
+            return
+        for i, slot in enumerate(self.slots):
+            if slot is not None and slot.request.future in cancelled:
+                self.slots[i] = None
+                self.cancelled += 1
+                slot.request.future.set_exception(CancelledError())
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self.capacity:
+            return
+        model = self.model
+        weight = model.ar_predict_layer.weight
+        shape = (self.max_batch_size, needed, model.model_dim)
+        k_cache = [torch.zeros(shape, dtype=weight.dtype, device=weight.device) for _ in range(model.num_layers)]
+        v_cache = [torch.zeros(shape, dtype=weight.dtype, device=weight.device) for _ in range(model.num_layers)]
+        tokens = torch.zeros((self.max_batch_size, needed), dtype=torch.long, device=weight.device)
+        if self.k_cache is not None:
+            for i in range(model.num_layers):
+                k_cache[i][:, : self.capacity] = self.k_cache[i]
+                v_cache[i][:, : self.capacity] = self.v_cache[i]
+            tokens[:, : self.capacity] = self.tokens
+            tokens[:, self.capacity :] = self.tokens[:, :1]
+        else:
+            self.last_tokens = torch.zeros((self.max_batch_size, 1), dtype=torch.long, device=weight.device)
+        self.k_cache, self.v_cache, self.tokens = k_cache, v_cache, tokens
+        self.capacity = needed
+
+    def _admit_pending(self):
+        while True:
+            free = [i for i, slot in enumerate(self.slots) if slot is None]
+            if not free:
+                return
+            with self._cond:
+                if not self._queue:
+                    return
+                request = self._queue.popleft()
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            try:
+                self._prefill(free[0], request)
+            except Exception as e:
+                request.future.set_exception(e)
+
+    @torch.no_grad()
+    def _prefill(self, slot_id: int, request: T2SRequest):
+        model = self.model
+        device = model.ar_predict_layer.weight.device
+        phones = request.phones.to(device)
+        bert_feature = request.bert_feature.to(device=device, dtype=model.bert_proj.weight.dtype)
+        y = request.prompt.to(device).view(1, -1).long()
+
+        x = model.ar_text_embedding(phones.unsqueeze(0))
+        x = x + model.bert_proj(bert_feature.transpose(0, 1).unsqueeze(0))
+        x = model.ar_text_position(x)
+
+        x_len = x.shape[1]
+        y_len = y.shape[1]
+        src_len = x_len + y_len
+        y_emb = model.ar_audio_embedding(y)
+        y_pos = model.ar_audio_position(y_emb)
+        xy_pos = torch.concat([x, y_pos], dim=1)
+
+        x_attn_mask_pad = F.pad(torch.zeros((x_len, x_len), dtype=torch.bool), (0, y_len), value=True)
+        y_attn_mask = F.pad(torch.triu(torch.ones(y_len, y_len, dtype=torch.bool), diagonal=1), (x_len, 0), value=False)
+        xy_attn_mask = (
+            torch.concat([x_attn_mask_pad, y_attn_mask], dim=0)
+            .unsqueeze(0)
+            .expand(model.num_head, -1, -1)
+            .view(1, model.num_head, src_len, src_len)
+            .to(device=device, dtype=torch.bool)
+        )
+
+        xy_dec, k_cache, v_cache = model.t2s_transformer.process_prompt(xy_pos, xy_attn_mask, None)
+
+        self._ensure_capacity(max(src_len, y_len) + self.max_steps)
+        for i in range(model.num_layers):
+            self.k_cache[i][slot_id, :src_len] = k_cache[i][0]
+            self.v_cache[i][slot_id, :src_len] = v_cache[i][0]
+        # 未写入的位置填充为prompt的第一个token，批量计算repetition penalty时不会引入多余的token
+        self.tokens[slot_id].fill_(int(y[0, 0]) if y_len > 0 else 0)
+        self.tokens[slot_id, :y_len] = y[0]
+
+        logits = model.ar_predict_layer(xy_dec[:, -1])[:, :-1]
+        top_k, top_p, temperature, repetition_penalty = request.sampling_params()
+        samples = sample(
+            logits, y, top_k=top_k, top_p=top_p, repetition_penalty=repetition_penalty, temperature=temperature
+        )[0]
+        self.tokens[slot_id, y_len] = samples[0, 0]
+        self.last_tokens[slot_id, 0] = samples[0, 0]
+
+        slot = _Slot(request, src_len, y_len)
+        slot.step = 1
+        self.slots[slot_id] = slot
+        if request.early_stop_num != -1 and slot.step > request.early_stop_num:
+            self._finish(slot_id)
+
+    @torch.no_grad()
+    def _decode(self):
+        model = self.model
+        device = self.tokens.device
+        active = [i for i, slot in enumerate(self.slots) if slot is not None]
+
+        # 空闲slot写入位置0，结果会被丢弃
+        kv_positions = [0] * self.max_batch_size
+        pe_positions = [0] * self.max_batch_size
+        for i in active:
+            slot = self.slots[i]
+            kv_positions[i] = slot.src_len + slot.step - 1
+            pe_positions[i] = slot.y_len + slot.step - 1
+        kv_len = max(kv_positions) + 1
+        kv_positions_t = torch.tensor(kv_positions, dtype=torch.long, device=device)
+        pe_positions_t = torch.tensor(pe_positions, dtype=torch.long, device=device)
+
+        y_emb = model.ar_audio_embedding(self.last_tokens)
+        position = model.ar_audio_position
+        xy_pos = y_emb * position.x_scale + position.alpha * position.pe[0, pe_positions_t].unsqueeze(1).to(
+            dtype=y_emb.dtype, device=device
+        )
+        attn_mask = (torch.arange(kv_len, device=device).unsqueeze(0) > kv_positions_t.unsqueeze(1)).view(
+            self.max_batch_size, 1, 1, kv_len
+        )
+
+        xy_dec, self.k_cache, self.v_cache = model.t2s_transformer.decode_next_token_slots(
+            xy_pos, self.k_cache, self.v_cache, kv_positions_t, kv_len, attn_mask
+        )
+        logits = model.ar_predict_layer(xy_dec[:, -1])
+
+        # 按采样参数分组，同组的slot一起采样
+        groups = {}
+        for i in active:
+            groups.setdefault(self.slots[i].request.sampling_params(), []).append(i)
+        eos_argmax = torch.zeros((self.max_batch_size,), dtype=torch.bool, device=device)
+        for (top_k, top_p, temperature, repetition_penalty), ids in groups.items():
+            ids_t = torch.tensor(ids, dtype=torch.long, device=device)
+            group_logits = logits.index_select(0, ids_t)
+            early = torch.tensor([self.slots[i].step < self.min_steps for i in ids], device=device)
+            group_logits[:, -1] = group_logits[:, -1].masked_fill(early, -float("Inf"))
+            n_tokens = max(self.slots[i].n_tokens for i in ids)
+            previous_tokens = self.tokens.index_select(0, ids_t)[:, :n_tokens]
+            samples = sample(
+                group_logits,
+                previous_tokens,
+                top_k=top_k,
+                top_p=top_p,
+                repetition_penalty=repetition_penalty,
+                temperature=temperature,
+            )[0]
+            self.last_tokens.index_copy_(0, ids_t, samples.long())
+            eos_argmax.index_copy_(0, ids_t, torch.argmax(group_logits, dim=-1) == model.EOS)
+
+        active_t = torch.tensor(active, dtype=torch.long, device=device)
+        write_positions = torch.tensor([self.slots[i].n_tokens for i in active], dtype=torch.long, device=device)
+        self.tokens[active_t, write_positions] = self.last_tokens[active_t, 0]
+
+        samples_list = self.last_tokens[:, 0].tolist()
+        eos_list = eos_argmax.tolist()
+        self.decode_steps += 1
+        self.slot_steps += len(active)
+        for i in active:
+            slot = self.slots[i]
+            slot.step += 1
+            early_stop_num = slot.request.early_stop_num
+            if (
+                samples_list[i] == model.EOS
+                or eos_list[i]
+                or (early_stop_num != -1 and slot.step > early_stop_num)
+                or slot.step >= self.max_steps
+            ):
+                self._finish(i)
+
+    def _finish(self, slot_id: int):
+        slot = self.slots[slot_id]
+        # 与infer_panel_batch_infer一致：去掉最后一个token（EOS），idx为最后一步的下标
+        pred_semantic = self.tokens[slot_id, : slot.n_tokens - 1].clone()
+        self.slots[slot_id] = None
+        self.completed += 1
+        slot.request.future.set_result((pred_semantic, slot.step - 1))
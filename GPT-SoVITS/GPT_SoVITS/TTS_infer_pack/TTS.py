@@ -5,6 +5,7 @@ import random
 import sys
 import time
 import traceback
+from concurrent.futures import CancelledError
 from copy import deepcopy
 
 import torchaudio
@@ -22,6 +23,7 @@ import torch
 import torch.nn.functional as F
 import yaml
 from AR.models.t2s_lightning_module import Text2SemanticLightningModule
+from AR.models.t2s_scheduler import T2SContinuousBatchScheduler
 from BigVGAN.bigvgan import BigVGAN
 from feature_extractor.cnhubert import CNHubert
 from module.mel_processing import mel_spectrogram_torch, spectrogram_torch
@@ -437,7 +439,7 @@ class TTS:
         self._init_models()
 
         self.text_preprocessor: TextPreprocessor = TextPreprocessor(
-            self.bert_model, self.bert_tokenizer, self.configs.device
+            self.bert_model, self.bert_tokenizer, self.configs.device, bert_id=self.configs.bert_base_path
         )
 
         self.prompt_cache: dict = {
@@ -454,6 +456,9 @@ class TTS:
 
         self.stop_flag: bool = False
         self.precision: torch.dtype = torch.float16 if self.configs.is_half else torch.float32
+        self.t2s_scheduler: T2SContinuousBatchScheduler = None
+        # 当前run提交给t2s_scheduler的句子，stop()时一起取消
+        self.t2s_futures: list = []
 
     def _init_models(
         self,
@@ -481,7 +486,7 @@ class TTS:
         if self.configs.is_half and str(self.configs.device) != "cpu":
             self.bert_model = self.bert_model.half()
 
-    def init_vits_weights(self, weights_path: str):
+    def init_vits_weights(self, weights_path: str, save: bool = True):
         self.configs.vits_weights_path = weights_path
         version, model_version, if_lora_v3 = get_sovits_version_from_path_fast(weights_path)
         if "Pro" in model_version:
@@ -578,14 +583,16 @@ class TTS:
         if self.configs.is_half and str(self.configs.device) != "cpu":
             self.vits_model = self.vits_model.half()
 
-        self.configs.save_configs()
+        if save:
+            self.configs.save_configs()
 
 
 
-    def init_t2s_weights(self, weights_path: str):
+    def init_t2s_weights(self, weights_path: str, save: bool = True):
         print(f"Loading Text2Semantic weights from {weights_path}")
         self.configs.t2s_weights_path = weights_path
-        self.configs.save_configs()
+        if save:
+            self.configs.save_configs()
         self.configs.hz = 50
         dict_s1 = torch.load(weights_path, map_location=self.configs.device, weights_only=False)
         config = dict_s1["config"]
@@ -597,6 +604,21 @@ class TTS:
         self.t2s_model = t2s_model
         if self.configs.is_half and str(self.configs.device) != "cpu":
             self.t2s_model = self.t2s_model.half()
+        if getattr(self, "t2s_scheduler", None) is not None:
+            self.t2s_scheduler.stop()
+        self.t2s_scheduler = None
+
+    def get_t2s_scheduler(self, max_batch_size: int) -> T2SContinuousBatchScheduler:
+        """
+        Continuous-batching T2S scheduler for the current GPT weights.
+        Other threads (e.g. API servers) can submit requests to it directly.
+        """
+        scheduler = self.t2s_scheduler
+        if scheduler is None or (scheduler.max_batch_size != max_batch_size and scheduler.is_idle()):
+            if scheduler is not None:
+                scheduler.stop()
+            self.t2s_scheduler = T2SContinuousBatchScheduler(self.t2s_model.model, max_batch_size=max_batch_size)
+        return self.t2s_scheduler
 
     def init_vocoder(self, version: str):
         if version == "v3":
@@ -979,6 +1001,9 @@ class TTS:
         Stop the inference process.
         """
         self.stop_flag = True
+        # 连续批处理时句子可能已经在slot里解码，只设标记的话要等VITS之后才停
+        if self.t2s_scheduler is not None and self.t2s_futures:
+            self.t2s_scheduler.cancel(self.t2s_futures)
 
     @torch.no_grad()
     def run(self, inputs: dict):
@@ -989,6 +1014,8 @@ class TTS:
             inputs (dict):
                 {
                     "text": "",                   # str.(required) text to be synthesized
+                    "texts": None,                # list.(optional) several texts synthesized in one batch instead of "text",
+                                                  #   e.g. requests merged by request_scheduler.py; not with return_fragment
                     "text_lang: "",               # str.(required) language of the text to be synthesized
                     "ref_audio_path": "",         # str.(required) reference audio path
                     "aux_ref_audio_paths": [],    # list.(optional) auxiliary reference audio paths for multi-speaker tone fusion
@@ -1006,16 +1033,21 @@ class TTS:
                     "fragment_interval":0.3,      # float. to control the interval of the audio fragment.
                     "seed": -1,                   # int. random seed for reproducibility.
                     "parallel_infer": True,       # bool. whether to use parallel inference.
+                    "static_kv_cache": True,      # bool. decode with preallocated kv cache buffers instead of growing them.
+                    "continuous_batching": True,  # bool. with parallel_infer, decode all sentences in batch_size slots and refill slots as sentences finish.
                     "repetition_penalty": 1.35    # float. repetition penalty for T2S model.
                     "sample_steps": 32,           # int. number of sampling steps for VITS model V3.
                     "super_sampling": False,       # bool. whether to use super-sampling for audio when using VITS model V3.
                 }
         returns:
             Tuple[int, np.ndarray]: sampling rate and audio data.
+            Tuple[int, List[np.ndarray]]: with "texts", one audio per text (a failed or stopped run still
+                yields a single silent np.ndarray).
         """
         ########## variables initialization ###########
         self.stop_flag: bool = False
         text: str = inputs.get("text", "")
+        texts: list = inputs.get("texts", None)
         text_lang: str = inputs.get("text_lang", "")
         ref_audio_path: str = inputs.get("ref_audio_path", "")
         aux_ref_audio_paths: list = inputs.get("aux_ref_audio_paths", [])
@@ -1035,6 +1067,8 @@ class TTS:
         seed = -1 if seed in ["", None] else seed
         actual_seed = set_seed(seed)
         parallel_infer = inputs.get("parallel_infer", True)
+        static_kv_cache = inputs.get("static_kv_cache", True)
+        continuous_batching = inputs.get("continuous_batching", True)
         repetition_penalty = inputs.get("repetition_penalty", 1.35)
         sample_steps = inputs.get("sample_steps", 32)
         super_sampling = inputs.get("super_sampling", False)
@@ -1047,6 +1081,8 @@ class TTS:
             self.t2s_model.model.infer_panel = self.t2s_model.model.infer_panel_naive_batched
 
         if return_fragment:
+            if texts is not None:
+                raise ValueError("texts cannot be used with return_fragment")
             print(i18n("分段返回模式已开启"))
             if split_bucket:
                 split_bucket = False
@@ -1126,8 +1162,17 @@ class TTS:
         ###### text preprocessing ########
         t1 = time.perf_counter()
         data: list = None
+        request_sizes: list = None
         if not return_fragment:
-            data = self.text_preprocessor.preprocess(text, text_lang, text_split_method, self.configs.version)
+            if texts is None:
+                data = self.text_preprocessor.preprocess(text, text_lang, text_split_method, self.configs.version)
+            else:
+                # 多个请求的句子放进同一批推理，request_sizes记录每个请求的句数，合成后再切回
+                per_text = self.text_preprocessor.preprocess_many(
+                    texts, text_lang, text_split_method, self.configs.version
+                )
+                data = sum(per_text, [])
+                request_sizes = [len(item) for item in per_text]
             if len(data) == 0:
                 yield 16000, np.zeros(int(16000), dtype=np.int16)
                 return
@@ -1154,10 +1199,9 @@ class TTS:
             def make_batch(batch_texts):
                 batch_data = []
                 print(f"############ {i18n('提取文本Bert特征')} ############")
-                for text in tqdm(batch_texts):
-                    phones, bert_features, norm_text = self.text_preprocessor.segment_and_extract_feature_for_text(
-                        text, text_lang, self.configs.version
-                    )
+                for phones, bert_features, norm_text in self.text_preprocessor.get_phones_and_bert_batch(
+                    batch_texts, text_lang, self.configs.version
+                ):
                     if phones is None:
                         continue
                     res = {
@@ -1180,6 +1224,27 @@ class TTS:
                 return batch[0]
 
         t2 = time.perf_counter()
+        t2s_futures = None
+        if continuous_batching and parallel_infer and not no_prompt_text and not return_fragment:
+            # 所有句子一次性提交给调度器，短句结束后空出的slot立即由后面的句子填上
+            t2s_scheduler = self.get_t2s_scheduler(batch_size)
+            t2s_futures = [
+                t2s_scheduler.submit_batch(
+                    item["all_phones"],
+                    item["all_bert_features"],
+                    self.prompt_cache["prompt_semantic"].expand(len(item["all_phones"]), -1).to(self.configs.device),
+                    top_k=top_k,
+                    top_p=top_p,
+                    temperature=temperature,
+                    repetition_penalty=repetition_penalty,
+                    early_stop_num=self.configs.hz * self.configs.max_sec,
+                )
+                for item in data
+            ]
+            self.t2s_futures = [future for futures in t2s_futures for future in futures]
+            if self.stop_flag:
+                # stop()在提交之前到达
+                t2s_scheduler.cancel(self.t2s_futures)
         try:
             print("############ 推理 ############")
             ###### inference ######
@@ -1187,7 +1252,7 @@ class TTS:
             t_45 = 0.0
             audio = []
             output_sr = self.configs.sampling_rate if not self.configs.use_vocoder else self.vocoder_configs["sr"]
-            for item in data:
+            for batch_no, item in enumerate(data):
                 t3 = time.perf_counter()
                 if return_fragment:
                     item = make_batch(item)
@@ -1204,27 +1269,37 @@ class TTS:
                 max_len = item["max_len"]
 
                 print(i18n("前端处理后的文本(每句):"), norm_text)
-                if no_prompt_text:
-                    prompt = None
+                if t2s_futures is not None:
+                    print(f"############ {i18n('预测语义Token')} ############")
+                    try:
+                        pred_semantic_list, idx_list = t2s_scheduler.wait(t2s_futures[batch_no])
+                    except CancelledError:
+                        # stop()取消了剩下的句子
+                        yield 16000, np.zeros(int(16000), dtype=np.int16)
+                        return
                 else:
-                    prompt = (
-                        self.prompt_cache["prompt_semantic"].expand(len(all_phoneme_ids), -1).to(self.configs.device)
-                    )
+                    if no_prompt_text:
+                        prompt = None
+                    else:
+                        prompt = (
+                            self.prompt_cache["prompt_semantic"].expand(len(all_phoneme_ids), -1).to(self.configs.device)
+                        )
 
-                print(f"############ {i18n('预测语义Token')} ############")
-                pred_semantic_list, idx_list = self.t2s_model.model.infer_panel(
-                    all_phoneme_ids,
-                    all_phoneme_lens,
-                    prompt,
-                    all_bert_features,
-                    # prompt_phone_len=ph_offset,
-                    top_k=top_k,
-                    top_p=top_p,
-                    temperature=temperature,
-                    early_stop_num=self.configs.hz * self.configs.max_sec,
-                    max_len=max_len,
-                    repetition_penalty=repetition_penalty,
-                )
+                    print(f"############ {i18n('预测语义Token')} ############")
+                    pred_semantic_list, idx_list = self.t2s_model.model.infer_panel(
+                        all_phoneme_ids,
+                        all_phoneme_lens,
+                        prompt,
+                        all_bert_features,
+                        # prompt_phone_len=ph_offset,
+                        top_k=top_k,
+                        top_p=top_p,
+                        temperature=temperature,
+                        early_stop_num=self.configs.hz * self.configs.max_sec,
+                        max_len=max_len,
+                        repetition_penalty=repetition_penalty,
+                        static_cache=static_kv_cache,
+                    )
                 t4 = time.perf_counter()
                 t_34 += t4 - t3
 
@@ -1280,6 +1355,28 @@ class TTS:
                             _batch_audio_fragment[audio_frag_end_idx[i - 1] : audio_frag_end_idx[i]]
                             for i in range(1, len(audio_frag_end_idx))
                         ]
+                    elif parallel_infer:
+                        print(f"{i18n('并行合成中')}...")
+                        # ## vits并行推理 method 1: 补零成batch，每条按自己的长度拉伸语速后再切回
+                        pred_semantic_list = [item[-idx:] for item, idx in zip(pred_semantic_list, idx_list)]
+                        pred_semantic_len = torch.LongTensor([item.shape[0] for item in pred_semantic_list]).to(
+                            self.configs.device
+                        )
+                        pred_semantic = (
+                            self.batch_sequences(pred_semantic_list, axis=0, pad_value=0)
+                            .unsqueeze(0)
+                            .to(self.configs.device)
+                        )
+                        _batch_phones = self.batch_sequences(batch_phones, axis=0, pad_value=0).to(self.configs.device)
+                        batch_audio_fragment = self.vits_model.batched_decode(
+                            pred_semantic,
+                            pred_semantic_len,
+                            _batch_phones,
+                            batch_phones_len.to(self.configs.device),
+                            refer_audio_spec,
+                            speed=speed_factor,
+                            sv_emb=sv_emb if self.is_v2pro else None,
+                        )
                     else:
                         # ## vits串行推理
                         for i, idx in enumerate(tqdm(idx_list)):
@@ -1336,6 +1433,8 @@ class TTS:
 
             if not return_fragment:
                 print("%.3f\t%.3f\t%.3f\t%.3f" % (t1 - t0, t2 - t1, t_34, t_45))
+                if t2s_futures is not None:
+                    print("T2S scheduler: %(completed)d done, %(decode_steps)d steps, slot utilization %(utilization).2f" % t2s_scheduler.stats())
                 if len(audio) == 0:
                     yield 16000, np.zeros(int(16000), dtype=np.int16)
                     return
@@ -1347,6 +1446,7 @@ class TTS:
                     split_bucket,
                     fragment_interval,
                     super_sampling if self.configs.use_vocoder and self.configs.version == "v3" else False,
+                    request_sizes=request_sizes,
                 )
 
         except Exception as e:
@@ -1358,10 +1458,15 @@ class TTS:
             del self.vits_model
             self.t2s_model = None
             self.vits_model = None
-            self.init_t2s_weights(self.configs.t2s_weights_path)
-            self.init_vits_weights(self.configs.vits_weights_path)
+            # 重新加载的是当前这组权重，不改写配置文件（多音色时当前组不一定是默认组）
+            self.init_t2s_weights(self.configs.t2s_weights_path, save=False)
+            self.init_vits_weights(self.configs.vits_weights_path, save=False)
             raise e
         finally:
+            if t2s_futures is not None:
+                # 提前停止（stop、出错或生成器被关闭）时取消剩下的句子，包括已经在slot里解码的
+                t2s_scheduler.cancel(self.t2s_futures)
+                self.t2s_futures = []
             self.empty_cache()
 
     def empty_cache(self):
@@ -1383,7 +1488,9 @@ class TTS:
         split_bucket: bool = True,
         fragment_interval: float = 0.3,
         super_sampling: bool = False,
+        request_sizes: list = None,
     ) -> Tuple[int, np.ndarray]:
+        """request_sizes: 每个请求的句数（按原顺序）；给出时返回(sr, 每个请求一段音频的list)"""
         zero_wav = torch.zeros(
             int(self.configs.sampling_rate * fragment_interval), dtype=self.precision, device=self.configs.device
         )
@@ -1402,8 +1509,26 @@ class TTS:
             # audio = [item for batch in audio for item in batch]
             audio = sum(audio, [])
 
-        audio = torch.cat(audio, dim=0)
+        if request_sizes is not None:
+            outputs = []
+            start = 0
+            output_sr = sr
+            for size in request_sizes:
+                if size == 0:
+                    outputs.append(None)
+                    continue
+                output_sr, request_audio = self._finalize_audio(
+                    torch.cat(audio[start : start + size], dim=0), sr, super_sampling
+                )
+                outputs.append(request_audio)
+                start += size
+            # 没有可合成的句子，与单个请求时一样返回一秒静音；按超采样后的输出采样率计算，与同批的其他请求一致
+            outputs = [np.zeros(int(output_sr), dtype=np.int16) if item is None else item for item in outputs]
+            return output_sr, outputs
+
+        return self._finalize_audio(torch.cat(audio, dim=0), sr, super_sampling)
 
+    def _finalize_audio(self, audio: torch.Tensor, sr: int, super_sampling: bool) -> Tuple[int, np.ndarray]:
         if super_sampling:
             print(f"############ {i18n('音频超采样')} ############")
             t1 = time.perf_counter()
@@ -1,8 +1,10 @@
+import inspect
 import os
+import queue
 import sys
 import threading
-
-from tqdm import tqdm
+import weakref
+from concurrent.futures import Future
 
 now_dir = os.getcwd()
 sys.path.append(now_dir)
@@ -10,12 +12,13 @@ sys.path.append(now_dir)
 import re
 import torch
 from text.LangSegmenter import LangSegmenter
-from text import chinese
 from typing import Dict, List, Tuple
 from text.cleaner import clean_text
+from text.frontend_pool import FrontendPool, get_pool
 from text import cleaned_text_to_sequence
 from transformers import AutoModelForMaskedLM, AutoTokenizer
 from TTS_infer_pack.text_segmentation_method import split_big_text, splits, get_method as get_seg_method
+from text_feature_cache import TextFeatureCache, bert_precision
 
 from tools.i18n.i18n import I18nAuto, scan_language_list
 
@@ -49,21 +52,140 @@ def merge_short_text_in_array(texts: str, threshold: int) -> list:
     return result
 
 
+class BertRequestQueue:
+    """
+    BERT推理请求队列：所有调用方把(norm_text, word2ph)列表提交给唯一的工作线程，由它独占BERT模型。
+    工作线程每次取出队列里所有已到达的请求合并推理，多个并发请求共享同一批次；
+    合并的批次出错时（比如某个请求的文本有问题或显存不够）逐个请求重试，只有出错的请求收到异常
+
+    extract_fn为绑定方法时只保持弱引用，工作线程不会让它的对象（TextPreprocessor）一直存活；
+    对象被回收或调用close()后工作线程退出
+    """
+
+    def __init__(self, extract_fn):
+        if inspect.ismethod(extract_fn):
+            self._extract_ref = weakref.WeakMethod(extract_fn)
+        else:
+            self._extract_ref = lambda: extract_fn
+        self._requests = queue.Queue()
+        self._closed = False
+        # 保证close()放入的结束标记之后不会再有请求
+        self._close_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="bert-request-queue", daemon=True)
+        self._worker.start()
+
+    def extract(self, requests: List[Tuple[str, list]]) -> List[torch.Tensor]:
+        if len(requests) == 0:
+            return []
+        future = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("BertRequestQueue is closed")
+            self._requests.put((list(requests), future))
+        return future.result()
+
+    def close(self):
+        """停止工作线程，还在排队的请求收到RuntimeError"""
+        with self._close_lock:
+            if not self._closed:
+                self._closed = True
+                self._requests.put(None)
+
+    def _run(self):
+        while self._serve_once():
+            pass
+
+    def _serve_once(self) -> bool:
+        """处理一批请求，返回False时工作线程退出。每批的局部变量（包括带异常的future）在返回时释放"""
+        jobs = [self._requests.get()]
+        while True:
+            try:
+                jobs.append(self._requests.get_nowait())
+            except queue.Empty:
+                break
+        closed = None in jobs
+        jobs = [job for job in jobs if job is not None]
+        extract_fn = self._extract_ref()
+        if closed or extract_fn is None:
+            for _, future in jobs:
+                future.set_exception(RuntimeError("BertRequestQueue is closed"))
+            return False
+        self._process(extract_fn, jobs)
+        return True
+
+    @staticmethod
+    def _process(extract_fn, jobs: list):
+        merged = [request for requests, _ in jobs for request in requests]
+        try:
+            features = extract_fn(merged)
+        except Exception as e:
+            if len(jobs) == 1:
+                jobs[0][1].set_exception(e)
+                return
+            for requests, future in jobs:
+                try:
+                    future.set_result(extract_fn(requests))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        start = 0
+        for requests, future in jobs:
+            future.set_result(features[start : start + len(requests)])
+            start += len(requests)
+
+
 class TextPreprocessor:
-    def __init__(self, bert_model: AutoModelForMaskedLM, tokenizer: AutoTokenizer, device: torch.device):
+    def __init__(
+        self,
+        bert_model: AutoModelForMaskedLM,
+        tokenizer: AutoTokenizer,
+        device: torch.device,
+        bert_batch_size: int = 16,
+        feature_cache: TextFeatureCache = None,
+        bert_id: str = None,
+        frontend_pool: FrontendPool = None,
+    ):
         self.bert_model = bert_model
         self.tokenizer = tokenizer
         self.device = device
-        self.bert_lock = threading.RLock()
+        self.bert_batch_size = bert_batch_size
+        # 相同(文本, 语种, 版本, BERT模型, BERT精度)的前端结果直接复用，见text_feature_cache.py
+        self.feature_cache = feature_cache if feature_cache is not None else TextFeatureCache()
+        self.bert_id = bert_id if bert_id is not None else getattr(bert_model, "name_or_path", "")
+        # BERT只在队列的工作线程里运行；G2P前端（jieba、g2pw缓存等）不是线程安全的，单独串行
+        self.g2p_lock = threading.RLock()
+        # 整篇文本时，纯CPU语种的G2P分到多个进程（默认关闭），见text/frontend_pool.py；默认共用一个进程池
+        self.frontend_pool = frontend_pool if frontend_pool is not None else get_pool()
+        self.bert_queue = BertRequestQueue(self.get_bert_features)
+
+    def close(self):
+        """停止BERT队列的工作线程；对象被回收时也会调用"""
+        self.bert_queue.close()
+
+    def __del__(self):
+        if hasattr(self, "bert_queue"):
+            self.close()
 
     def preprocess(self, text: str, lang: str, text_split_method: str, version: str = "v2") -> List[Dict]:
+        return self.preprocess_many([text], lang, text_split_method, version)[0]
+
+    def preprocess_many(
+        self, texts: List[str], lang: str, text_split_method: str, version: str = "v2"
+    ) -> List[List[Dict]]:
+        """多段文本（如合并成一批的多个请求）一起提取特征，返回与texts一一对应的preprocess结果"""
         print(f"############ {i18n('切分文本')} ############")
-        text = self.replace_consecutive_punctuation(text)
-        texts = self.pre_seg_text(text, lang, text_split_method)
-        result = []
+        segments = []
+        owners = []
+        for i, text in enumerate(texts):
+            text = self.replace_consecutive_punctuation(text)
+            for segment in self.pre_seg_text(text, lang, text_split_method):
+                segments.append(segment)
+                owners.append(i)
+        results = [[] for _ in texts]
         print(f"############ {i18n('提取文本Bert特征')} ############")
-        for text in tqdm(texts):
-            phones, bert_features, norm_text = self.segment_and_extract_feature_for_text(text, lang, version)
+        for owner, (phones, bert_features, norm_text) in zip(
+            owners, self.get_phones_and_bert_batch(segments, lang, version)
+        ):
             if phones is None or norm_text == "":
                 continue
             res = {
@@ -71,8 +193,10 @@ class TextPreprocessor:
                 "bert_features": bert_features,
                 "norm_text": norm_text,
             }
-            result.append(res)
-        return result
+            results[owner].append(res)
+        if self.feature_cache.enabled:
+            print(self.feature_cache.report())
+        return results
 
     def pre_seg_text(self, text: str, lang: str, text_split_method: str):
         text = text.strip("\n")
@@ -120,88 +244,202 @@ class TextPreprocessor:
         return self.get_phones_and_bert(text, language, version)
 
     def get_phones_and_bert(self, text: str, language: str, version: str, final: bool = False):
-        with self.bert_lock:
-            text = re.sub(r' {2,}', ' ', text)
-            textlist = []
-            langlist = []
-            if language == "all_zh":
-                for tmp in LangSegmenter.getTexts(text,"zh"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_yue":
-                for tmp in LangSegmenter.getTexts(text,"zh"):
-                    if tmp["lang"] == "zh":
-                        tmp["lang"] = "yue"
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_ja":
-                for tmp in LangSegmenter.getTexts(text,"ja"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_ko":
-                for tmp in LangSegmenter.getTexts(text,"ko"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "en":
-                langlist.append("en")
-                textlist.append(text)
-            elif language == "auto":
-                for tmp in LangSegmenter.getTexts(text):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "auto_yue":
-                for tmp in LangSegmenter.getTexts(text):
-                    if tmp["lang"] == "zh":
-                        tmp["lang"] = "yue"
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            else:
-                for tmp in LangSegmenter.getTexts(text):
-                    if langlist:
-                        if (tmp["lang"] == "en" and langlist[-1] == "en") or (tmp["lang"] != "en" and langlist[-1] != "en"):
-                            textlist[-1] += tmp["text"]
-                            continue
-                    if tmp["lang"] == "en":
-                        langlist.append(tmp["lang"])
-                    else:
-                        # 因无法区别中日韩文汉字,以用户输入为准
-                        langlist.append(language)
-                    textlist.append(tmp["text"])
-            # print(textlist)
-            # print(langlist)
-            phones_list = []
+        return self.get_phones_and_bert_batch([text], language, version)[0]
+
+    @property
+    def bert_dtype(self) -> torch.dtype:
+        # TTS.enable_half_precision会在运行中切换BERT的精度
+        return next(self.bert_model.parameters()).dtype
+
+    def get_phones_and_bert_batch(
+        self, texts: List[str], language: str, version: str
+    ) -> List[Tuple[list, torch.Tensor, str]]:
+        """先查特征缓存；未命中的句子逐句做语种切分和G2P，再把它们的中文片段一次提交给BERT队列批量推理"""
+        result = [None] * len(texts)
+        keys = [None] * len(texts)
+        dtype = self.bert_dtype
+        if self.feature_cache.enabled:
+            precision = bert_precision(dtype)
+            for i, text in enumerate(texts):
+                keys[i] = TextFeatureCache.make_key(text, language, version, self.bert_id, precision)
+                cached = self.feature_cache.get(keys[i])
+                if cached is not None:
+                    result[i] = (cached["phones"], cached["bert"].to(self.device, dtype), cached["norm_text"])
+        pending = [i for i in range(len(texts)) if result[i] is None]
+        if len(pending) == 0:
+            return result
+
+        cleaned = self.clean_segments_batch([texts[i] for i in pending], language, version)
+        bert_requests = [
+            (norm_text, word2ph)
+            for segments in cleaned
+            for phones, word2ph, norm_text, lang in segments
+            if lang.replace("all_", "") == "zh"
+        ]
+        bert_features = iter(self.bert_queue.extract(bert_requests))
+
+        for i, segments in zip(pending, cleaned):
             bert_list = []
-            norm_text_list = []
-            for i in range(len(textlist)):
-                lang = langlist[i]
-                phones, word2ph, norm_text = self.clean_text_inf(textlist[i], lang, version)
-                bert = self.get_bert_inf(phones, word2ph, norm_text, lang)
-                phones_list.append(phones)
-                norm_text_list.append(norm_text)
-                bert_list.append(bert)
+            for phones, word2ph, norm_text, lang in segments:
+                if lang.replace("all_", "") == "zh":
+                    bert_list.append(next(bert_features).to(self.device, dtype))
+                else:
+                    bert_list.append(torch.zeros((1024, len(phones)), dtype=dtype).to(self.device))
             bert = torch.cat(bert_list, dim=1)
-            phones = sum(phones_list, [])
-            norm_text = "".join(norm_text_list)
+            phones = sum([segment[0] for segment in segments], [])
+            norm_text = "".join([segment[2] for segment in segments])
+            if keys[i] is not None:
+                self.feature_cache.put(keys[i], phones, [segment[1] for segment in segments], norm_text, bert)
+            result[i] = (phones, bert, norm_text)
+        return result
 
-            if not final and len(phones) < 6:
-                return self.get_phones_and_bert("." + text, language, version, final=True)
+    def clean_segments(
+        self, text: str, language: str, version: str, final: bool = False
+    ) -> List[Tuple[list, list, str, str]]:
+        """语种切分+G2P（不含BERT），返回每个片段的(phones, word2ph, norm_text, lang)"""
+        text = re.sub(r' {2,}', ' ', text)
+        textlist, langlist = self.segment_languages(text, language)
+        segments = []
+        for i in range(len(textlist)):
+            lang = langlist[i]
+            phones, word2ph, norm_text = self.clean_text_inf(textlist[i], lang, version)
+            segments.append((phones, word2ph, norm_text, lang))
 
-            return phones, bert, norm_text
+        if not final and sum(len(segment[0]) for segment in segments) < 6:
+            return self.clean_segments("." + text, language, version, final=True)
+
+        return segments
+
+    def clean_segments_batch(
+        self, texts: List[str], language: str, version: str
+    ) -> List[List[Tuple[list, list, str, str]]]:
+        """
+        多句的clean_segments：所有片段一起交给FrontendPool，句子够多时进程池负责的语种并行G2P，
+        英文片段的OOV词整批预测
+        """
+        with self.g2p_lock:
+            segmented = []
+            for text in texts:
+                text = re.sub(r' {2,}', ' ', text)
+                textlist, langlist = self.segment_languages(text, language)
+                segmented.append((text, textlist, langlist))
+            results = iter(
+                self.frontend_pool.clean(
+                    (segment_text, lang, version)
+                    for _, textlist, langlist in segmented
+                    for segment_text, lang in zip(textlist, langlist)
+                )
+            )
+
+            cleaned = []
+            for text, textlist, langlist in segmented:
+                segments = []
+                for segment_text, lang in zip(textlist, langlist):
+                    phones, word2ph, norm_text = next(results)
+                    segments.append((phones, word2ph, norm_text, lang))
+                if sum(len(segment[0]) for segment in segments) < 6:
+                    segments = self.clean_segments("." + text, language, version, final=True)
+                cleaned.append(segments)
+            return cleaned
+
+    def prefetch_g2pw(self, texts: List[str], language: str, version: str):
+        """
+        texts是之后逐句传给get_phones_and_bert的句子：中文片段按clean_segments_batch的方式切分后一次交给G2PW，
+        G2P时直接命中G2PW缓存；特征缓存已命中的句子跳过
+        """
+        # v1的zh走text.chinese，没有G2PW
+        if version == "v1":
+            return
+        precision = bert_precision(self.bert_dtype)
+        with self.g2p_lock:
+            zh_texts = []
+            for text in texts:
+                key = TextFeatureCache.make_key(text, language, version, self.bert_id, precision)
+                if self.feature_cache.enabled and key in self.feature_cache:
+                    continue
+                textlist, langlist = self.segment_languages(re.sub(r' {2,}', ' ', text), language)
+                zh_texts.extend(
+                    segment for segment, lang in zip(textlist, langlist) if lang.replace("all_", "") == "zh"
+                )
+            if len(zh_texts) > 1:
+                from text import chinese2
+
+                chinese2.prefetch_g2pw(zh_texts)
+
+    def segment_languages(self, text: str, language: str) -> Tuple[List[str], List[str]]:
+        textlist = []
+        langlist = []
+        if language == "all_zh":
+            for tmp in LangSegmenter.getTexts(text,"zh"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_yue":
+            for tmp in LangSegmenter.getTexts(text,"zh"):
+                if tmp["lang"] == "zh":
+                    tmp["lang"] = "yue"
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_ja":
+            for tmp in LangSegmenter.getTexts(text,"ja"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_ko":
+            for tmp in LangSegmenter.getTexts(text,"ko"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "en":
+            langlist.append("en")
+            textlist.append(text)
+        elif language == "auto":
+            for tmp in LangSegmenter.getTexts(text):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "auto_yue":
+            for tmp in LangSegmenter.getTexts(text):
+                if tmp["lang"] == "zh":
+                    tmp["lang"] = "yue"
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        else:
+            for tmp in LangSegmenter.getTexts(text):
+                if langlist:
+                    if (tmp["lang"] == "en" and langlist[-1] == "en") or (tmp["lang"] != "en" and langlist[-1] != "en"):
+                        textlist[-1] += tmp["text"]
+                        continue
+                if tmp["lang"] == "en":
+                    langlist.append(tmp["lang"])
+                else:
+                    # 因无法区别中日韩文汉字,以用户输入为准
+                    langlist.append(language)
+                textlist.append(tmp["text"])
+        return textlist, langlist
 
     def get_bert_feature(self, text: str, word2ph: list) -> torch.Tensor:
-        with torch.no_grad():
-            inputs = self.tokenizer(text, return_tensors="pt")
-            for i in inputs:
-                inputs[i] = inputs[i].to(self.device)
-            res = self.bert_model(**inputs, output_hidden_states=True)
-            res = torch.cat(res["hidden_states"][-3:-2], -1)[0].cpu()[1:-1]
-        assert len(word2ph) == len(text)
-        phone_level_feature = []
-        for i in range(len(word2ph)):
-            repeat_feature = res[i].repeat(word2ph[i], 1)
-            phone_level_feature.append(repeat_feature)
-        phone_level_feature = torch.cat(phone_level_feature, dim=0)
-        return phone_level_feature.T
+        return self.bert_queue.extract([(text, word2ph)])[0]
+
+    def get_bert_features(self, requests: List[Tuple[str, list]]) -> List[torch.Tensor]:
+        """
+        批量BERT：按长度排序后每bert_batch_size句padding成一批前向，
+        再用repeat_interleave按word2ph展开到phone级。只在BertRequestQueue的工作线程中调用
+        """
+        features = [None] * len(requests)
+        order = sorted(range(len(requests)), key=lambda i: len(requests[i][0]))
+        for start in range(0, len(order), self.bert_batch_size):
+            batch = order[start : start + self.bert_batch_size]
+            with torch.no_grad():
+                inputs = self.tokenizer([requests[i][0] for i in batch], return_tensors="pt", padding=True)
+                for key in inputs:
+                    inputs[key] = inputs[key].to(self.device)
+                res = self.bert_model(**inputs, output_hidden_states=True)
+                hidden = torch.cat(res["hidden_states"][-3:-2], -1).cpu()
+                lengths = inputs["attention_mask"].sum(dim=1).tolist()
+            for row, i in enumerate(batch):
+                text, word2ph = requests[i]
+                assert len(word2ph) == len(text)
+                char_feature = hidden[row, 1 : lengths[row] - 1]
+                phone_level_feature = char_feature.repeat_interleave(torch.tensor(word2ph), dim=0)
+                features[i] = phone_level_feature.T
+        return features
 
     def clean_text_inf(self, text: str, language: str, version: str = "v2"):
         language = language.replace("all_", "")
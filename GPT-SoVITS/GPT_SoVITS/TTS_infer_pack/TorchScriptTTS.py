@@ -0,0 +1,212 @@
+"""
+加载export_torch_script.py导出的TorchScript模型包并合成，不依赖inference_webui/gradio，所有模型都在实例上，
+同一进程内可以创建多个互不影响的实例
+
+模型包目录（export_torch_script.py --export_common_model 的输出）：
+    gpt_sovits_model.pt   GPT_SoVITS / GPT_SoVITS_V2Pro
+    ssl_model.pt          cnhubert（含resample）
+    bert_model.pt         chinese-roberta，输出已按word2ph展开到phone级
+    tokenizer/            BERT tokenizer（没有时使用环境变量bert_path）
+    bundle.json           version、sampling_rate、speed、is_half
+"""
+
+import json
+import os
+from typing import List
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer
+
+from TTS_infer_pack.TextPreprocessor import TextPreprocessor, i18n, merge_short_text_in_array
+from TTS_infer_pack.text_segmentation_method import get_method as get_seg_method
+from TTS_infer_pack.text_segmentation_method import splits
+
+dict_language = {
+    i18n("中文"): "all_zh",  # 全部按中文识别
+    i18n("英文"): "en",  # 全部按英文识别#######不变
+    i18n("日文"): "all_ja",  # 全部按日文识别
+    i18n("粤语"): "all_yue",  # 全部按中文识别
+    i18n("韩文"): "all_ko",  # 全部按韩文识别
+    i18n("中英混合"): "zh",  # 按中英混合识别####不变
+    i18n("日英混合"): "ja",  # 按日英混合识别####不变
+    i18n("粤英混合"): "yue",  # 按粤英混合识别####不变
+    i18n("韩英混合"): "ko",  # 按韩英混合识别####不变
+    i18n("多语种混合"): "auto",  # 多语种启动切分识别语种
+    i18n("多语种混合(粤语)"): "auto_yue",  # 多语种启动切分识别语种
+}
+
+cut_method_names = {
+    i18n("不切"): "cut0",
+    i18n("凑四句一切"): "cut1",
+    i18n("凑50字一切"): "cut2",
+    i18n("按中文句号。切"): "cut3",
+    i18n("按英文句号.切"): "cut4",
+    i18n("按标点符号切"): "cut5",
+}
+
+default_bundle_config = {"version": "v2", "sampling_rate": 32000, "speed": 1.0, "is_half": False}
+
+
+class ScriptedBertTextPreprocessor(TextPreprocessor):
+    """BERT使用bert_model.pt（export_torch_script.MyBertModel），其余文本前端与TextPreprocessor相同"""
+
+    def get_bert_features(self, requests):
+        # 导出的模型只接受单句输入，队列里的请求逐句推理
+        features = []
+        for text, word2ph in requests:
+            assert len(word2ph) == len(text)
+            with torch.no_grad():
+                inputs = self.tokenizer(text, return_tensors="pt")
+                feature = self.bert_model(
+                    inputs["input_ids"].to(self.device),
+                    inputs["attention_mask"].to(self.device),
+                    inputs["token_type_ids"].to(self.device),
+                    torch.IntTensor(word2ph).to(self.device),
+                )
+            features.append(feature.float().cpu().T)
+        return features
+
+
+class TorchScriptTTS:
+    def __init__(self, bundle_dir: str, device: str = None):
+        self.bundle_dir = os.path.abspath(bundle_dir)
+        self.config = dict(default_bundle_config)
+        config_path = self._path("bundle.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                self.config.update(json.load(f))
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        if self.config["is_half"] and self.device == "cpu":
+            raise ValueError(f"{self.bundle_dir} was exported in half precision and needs a CUDA device")
+        self.dtype = torch.float16 if self.config["is_half"] else torch.float32
+        self.sampling_rate = int(self.config["sampling_rate"])
+        # v2Pro/v2ProPlus用v2的符号表
+        self.version = "v1" if self.config["version"] == "v1" else "v2"
+
+        self.gpt_sovits = torch.jit.load(self._path("gpt_sovits_model.pt"), map_location=self.device).eval()
+        self.ssl_model = torch.jit.load(self._path("ssl_model.pt"), map_location=self.device).eval()
+        bert_model = torch.jit.load(self._path("bert_model.pt"), map_location=self.device).eval()
+        tokenizer_path = self._path("tokenizer")
+        if not os.path.isdir(tokenizer_path):
+            tokenizer_path = os.environ.get("bert_path", "GPT_SoVITS/pretrained_models/chinese-roberta-wwm-ext-large")
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+        self.text_preprocessor = ScriptedBertTextPreprocessor(
+            bert_model, tokenizer, self.device, bert_id=self._path("bert_model.pt")
+        )
+
+    def _path(self, name):
+        return os.path.join(self.bundle_dir, name)
+
+    def get_phones_and_bert(self, text: str, language: str):
+        """返回phones和[N,1024]的BERT特征（gpt_sovits_model.pt的输入布局）"""
+        phones, bert, norm_text = self.text_preprocessor.segment_and_extract_feature_for_text(
+            text, language, self.version
+        )
+        return phones, bert.T.to(self.device, self.dtype), norm_text
+
+    def _prompt_features(self, ref_wav_path: str, pause_second: float):
+        import librosa
+
+        wav16k, sr = librosa.load(ref_wav_path, sr=16000)
+        if wav16k.shape[0] > 160000 or wav16k.shape[0] < 48000:
+            raise OSError(i18n("参考音频在3~10秒范围外，请更换！"))
+        ref_audio = torch.from_numpy(wav16k).unsqueeze(0).to(self.device)
+        padded = torch.cat([ref_audio, torch.zeros((1, int(self.sampling_rate * pause_second)), device=self.device)], 1)
+        with torch.no_grad():
+            ssl_content = self.ssl_model(padded).to(self.dtype)
+            ref_audio_sr = self.ssl_model.resample(ref_audio, 16000, self.sampling_rate).to(self.dtype)
+        return ssl_content, ref_audio_sr
+
+    def _split_text(self, text: str, how_to_cut: str, text_language: str) -> List[str]:
+        text = get_seg_method(cut_method_names.get(how_to_cut, "cut0"))(text.strip("\n"))
+        while "\n\n" in text:
+            text = text.replace("\n\n", "\n")
+        texts = merge_short_text_in_array(self.text_preprocessor.filter_text(text.split("\n")), 5)
+        result = []
+        for text in texts:
+            if len(text.strip()) == 0:
+                continue
+            if text[-1] not in splits:
+                text += "。" if text_language != "en" else "."
+            result.append(text)
+        return result
+
+    def prefetch_g2pw(self, texts: List[str], text_language: str, how_to_cut: str = i18n("不切")):
+        """对之后要逐条传给get_tts_wav的一批文本一次性做G2PW批量推理，参数与get_tts_wav相同"""
+        text_language = dict_language.get(text_language, text_language)
+        sentences = []
+        for text in texts:
+            if text.strip():
+                sentences.extend(self._split_text(text, how_to_cut, text_language))
+        self.text_preprocessor.prefetch_g2pw(sentences, text_language, self.version)
+
+    def get_tts_wav(
+        self,
+        ref_wav_path,
+        prompt_text,
+        prompt_language,
+        text,
+        text_language,
+        how_to_cut=i18n("不切"),
+        top_k=15,
+        top_p=1,
+        temperature=1,
+        ref_free=False,
+        speed=1,
+        if_freeze=False,
+        inp_refs=None,
+        sample_steps=8,
+        if_sr=False,
+        pause_second=0.3,
+        prompt_cache=None,
+    ):
+        """
+        参数与inference_webui.get_tts_wav相同。导出的模型只有top_k是输入：top_p、temperature固定为1，
+        speed固定为导出时的值，不支持ref_free和多参考音频(inp_refs)
+        """
+        if prompt_cache is None:
+            prompt_cache = {}
+        if ref_free or prompt_text is None or len(prompt_text) == 0:
+            raise ValueError("the TorchScript backend needs a reference text (ref_free is not supported)")
+        if speed != self.config["speed"]:
+            print(f"TorchScript bundle was exported with speed={self.config['speed']}, ignoring speed={speed}")
+        prompt_language = dict_language.get(prompt_language, prompt_language)
+        text_language = dict_language.get(text_language, text_language)
+
+        prompt_text = prompt_text.strip("\n")
+        if prompt_text[-1] not in splits:
+            prompt_text += "。" if prompt_language != "en" else "."
+        if "ssl_content" not in prompt_cache:
+            prompt_cache["ssl_content"], prompt_cache["ref_audio_sr"] = self._prompt_features(
+                ref_wav_path, pause_second
+            )
+        if "phones" not in prompt_cache:
+            phones1, bert1, norm_text1 = self.get_phones_and_bert(prompt_text, prompt_language)
+            prompt_cache.update(phones=phones1, bert=bert1, norm_text=norm_text1)
+        ssl_content = prompt_cache["ssl_content"].to(self.device, self.dtype)
+        ref_audio_sr = prompt_cache["ref_audio_sr"].to(self.device, self.dtype)
+        ref_seq = torch.LongTensor([prompt_cache["phones"]]).to(self.device)
+        ref_bert = prompt_cache["bert"].to(self.device, self.dtype)
+        top_k = torch.LongTensor([top_k]).to(self.device)
+
+        zero_wav = np.zeros(int(self.sampling_rate * pause_second), dtype=np.float32)
+        audio_opt = []
+        texts = self._split_text(text, how_to_cut, text_language)
+        # 所有句子的中文片段一次批量做G2PW，逐句的前端直接命中缓存
+        self.text_preprocessor.prefetch_g2pw(texts, text_language, self.version)
+        for text in texts:
+            print(i18n("实际输入的目标文本(每句):"), text)
+            phones2, bert2, norm_text2 = self.get_phones_and_bert(text, text_language)
+            print(i18n("前端处理后的文本(每句):"), norm_text2)
+            text_seq = torch.LongTensor([phones2]).to(self.device)
+            with torch.no_grad():
+                audio = self.gpt_sovits(ssl_content, ref_audio_sr, ref_seq, text_seq, ref_bert, bert2, top_k)
+            audio = audio.float().cpu().numpy()
+            max_audio = np.abs(audio).max()  # 简单防止16bit爆音
+            if max_audio > 1:
+                audio = audio / max_audio
+            audio_opt.append(audio)
+            audio_opt.append(zero_wav)
+        audio_opt = np.concatenate(audio_opt, 0)
+        yield self.sampling_rate, (audio_opt * 32767).astype(np.int16)
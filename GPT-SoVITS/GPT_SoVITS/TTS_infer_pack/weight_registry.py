@@ -0,0 +1,160 @@
+# 多音色权重常驻：每组(GPT权重, SoVITS权重)加载一次后留在显存里，请求指定要用哪一组，
+# 切换时只在TTS实例上换模型引用和与权重相关的配置，不重新加载。BERT、cnhubert、SV和声码器仍是TTS实例上共用的一份
+# 超过max_entries组或memory_budget_mb时按LRU淘汰（先加载新的一组再淘汰，加载时会短暂超出）
+# 按请求加载的权重不写入tts_infer.yaml，只有set_default修改的默认组会保存，重启后仍用它
+import os
+from collections import OrderedDict
+
+# 随权重变化的TTS_Config字段（init_t2s_weights/init_vits_weights里设置的）
+CONFIG_FIELDS = (
+    "t2s_weights_path",
+    "vits_weights_path",
+    "version",
+    "languages",
+    "max_sec",
+    "hz",
+    "semantic_frame_rate",
+    "segment_size",
+    "filter_length",
+    "sampling_rate",
+    "hop_length",
+    "win_length",
+    "n_speakers",
+    "use_vocoder",
+)
+
+# 随权重变化的TTS字段；prompt_cache里的prompt_semantic和refer_spec是用这组SoVITS算出来的
+TTS_FIELDS = ("t2s_model", "vits_model", "t2s_scheduler", "is_v2pro", "prompt_cache")
+
+
+def _module_bytes(module) -> int:
+    if module is None:
+        return 0
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+class TTSWeightRegistry:
+    def __init__(self, tts, max_entries: int = 4, memory_budget_mb: float = 0):
+        """
+        tts: 已经加载了默认权重的TTS实例，这组权重作为第一组常驻
+        max_entries: 最多常驻的权重组数
+        memory_budget_mb: 常驻权重（参数和buffer）的总大小上限，0为不限制
+        """
+        self.tts = tts
+        self.max_entries = max(1, int(max_entries))
+        self.memory_budget = max(0.0, memory_budget_mb) * 1024 * 1024
+        self.entries = OrderedDict()
+        self.active_key = self._key(tts.configs.t2s_weights_path, tts.configs.vits_weights_path)
+        self.entries[self.active_key] = self._snapshot()
+        # 请求没有指定权重时用的一组，/set_gpt_weights和/set_sovits_weights修改的是它
+        self.default_key = self.active_key
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(gpt_path: str, sovits_path: str) -> tuple:
+        return (os.path.normpath(gpt_path), os.path.normpath(sovits_path))
+
+    def _snapshot(self) -> dict:
+        state = {field: getattr(self.tts, field) for field in TTS_FIELDS}
+        state["configs"] = {field: getattr(self.tts.configs, field) for field in CONFIG_FIELDS}
+        state["bytes"] = _module_bytes(state["t2s_model"]) + _module_bytes(state["vits_model"])
+        return state
+
+    def _restore(self, state: dict):
+        for field in TTS_FIELDS:
+            setattr(self.tts, field, state[field])
+        for field, value in state["configs"].items():
+            setattr(self.tts.configs, field, value)
+        if self.tts.configs.use_vocoder:
+            # 声码器按版本共用一个，v3和v4交替时才会重新加载
+            self.tts.init_vocoder(self.tts.configs.version)
+
+    def activate(self, gpt_path: str = None, sovits_path: str = None):
+        """
+        切换到指定的权重组，不在常驻的就加载。没有指定的一项取默认组的。
+        和推理一样要持有调度器的pipeline_lock
+        """
+        default_gpt, default_sovits = self.default_key
+        key = self._key(gpt_path or default_gpt, sovits_path or default_sovits)
+        if key == self.active_key:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return
+        # 当前组的prompt_cache等可能已经更新
+        self.entries[self.active_key] = self._snapshot()
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self._restore(self.entries[key])
+            self.active_key = key
+            self.hits += 1
+            return
+
+        self._load(key)
+        self._evict()
+
+    def _load(self, key: tuple):
+        previous = self.active_key
+        # t2s_scheduler跟着原来那组留着，init_t2s_weights不能把它停掉
+        self.tts.t2s_scheduler = None
+        try:
+            self.tts.init_t2s_weights(key[0], save=False)
+            self.tts.init_vits_weights(key[1], save=False)
+        except Exception:
+            self._restore(self.entries[previous])
+            raise
+        prompt_cache = self.entries[previous]["prompt_cache"]
+        self.tts.prompt_cache = {name: [] if isinstance(value, list) else None for name, value in prompt_cache.items()}
+        self.entries[key] = self._snapshot()
+        self.active_key = key
+        self.loads += 1
+
+    def _evict(self):
+        def over_budget():
+            if len(self.entries) > self.max_entries:
+                return True
+            resident_bytes = sum(state["bytes"] for state in self.entries.values())
+            return self.memory_budget > 0 and resident_bytes > self.memory_budget
+
+        evicted = False
+        while len(self.entries) > 1 and over_budget():
+            key = next(key for key in self.entries if key != self.active_key)
+            state = self.entries.pop(key)
+            if state["t2s_scheduler"] is not None:
+                state["t2s_scheduler"].stop()
+            self.evictions += 1
+            evicted = True
+            print(f"Evicted weights {key[0]} + {key[1]} ({state['bytes'] / 1024 / 1024:.0f} MB)")
+        if evicted:
+            self.tts.empty_cache()
+
+    def set_default(self, gpt_path: str = None, sovits_path: str = None):
+        """修改默认组的GPT或SoVITS权重并切换过去，保存到配置文件"""
+        default_gpt, default_sovits = self.default_key
+        self.activate(gpt_path or default_gpt, sovits_path or default_sovits)
+        self.default_key = self.active_key
+        self.tts.configs.save_configs()
+
+    def run(self, inputs: dict):
+        """供TTSRequestScheduler调用：inputs里的gpt_weights_path/sovits_weights_path选择权重组"""
+        self.activate(inputs.get("gpt_weights_path"), inputs.get("sovits_weights_path"))
+        return self.tts.run(inputs)
+
+    def stop(self):
+        self.tts.stop()
+
+    def stats(self) -> dict:
+        # 在事件循环里调用，调度线程可能正在加载或淘汰
+        entries = list(self.entries.items())
+        return {
+            "resident": [
+                {"gpt": key[0], "sovits": key[1], "mb": round(state["bytes"] / 1024 / 1024, 1)}
+                for key, state in entries
+            ],
+            "resident_mb": round(sum(state["bytes"] for _, state in entries) / 1024 / 1024, 1),
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,165 @@
+"""
+CPU部署模式对比：fp32 / int8 / bf16 / int8+bf16 的合成速度，以及与fp32输出的音频相似度
+
+python GPT_SoVITS/benchmark_cpu_quant.py --gpt_model xxx.ckpt --sovits_model xxx.pth \
+    --ref_audio ref.wav --ref_text "..." --ref_lang en --text "..." --text_lang ja
+
+每种模式在独立子进程中运行（inference_webui在import时读取环境变量并加载模型），
+相似度用说话人向量(ERes2NetV2)余弦相似度和平均log-mel谱余弦相似度衡量，采样导致的时长差异不影响这两个指标
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MODES = {
+    "fp32": {"cpu_int8": "False", "cpu_bf16": "False"},
+    "int8": {"cpu_int8": "True", "cpu_bf16": "False"},
+    "bf16": {"cpu_int8": "False", "cpu_bf16": "True"},
+    "int8+bf16": {"cpu_int8": "True", "cpu_bf16": "True"},
+}
+
+LANGUAGE_NAMES = {"zh": "中文", "en": "英文", "ja": "日文", "ko": "韩文", "yue": "粤语"}
+
+
+def run_worker(args):
+    import time
+
+    import numpy as np
+    import soundfile as sf
+
+    sys.path.append(os.getcwd())
+    t0 = time.perf_counter()
+    import inference_webui
+
+    # 直接加载权重，不经过gradio回调，避免改写weight.json
+    inference_webui.tts.load_gpt(args.gpt_model)
+    inference_webui.load_sovits_weights(args.sovits_model)
+    load_time = time.perf_counter() - t0
+    i18n = inference_webui.i18n
+
+    def synthesize():
+        inference_webui.set_seed(args.seed)
+        result = list(
+            inference_webui.get_tts_wav(
+                ref_wav_path=args.ref_audio,
+                prompt_text=args.ref_text,
+                prompt_language=i18n(LANGUAGE_NAMES[args.ref_lang]),
+                text=args.text,
+                text_language=i18n(LANGUAGE_NAMES[args.text_lang]),
+                how_to_cut=i18n("不切"),
+                top_k=args.top_k,
+                top_p=1,
+                temperature=1,
+            )
+        )
+        return result[-1]
+
+    synthesize()  # warmup
+    times = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        sr, audio = synthesize()
+        times.append(time.perf_counter() - t0)
+
+    sf.write(args.out + ".wav", audio, sr)
+    duration = len(audio) / sr
+    with open(args.out + ".json", "w") as f:
+        json.dump(
+            {
+                "load_time": load_time,
+                "synthesis_time": float(np.median(times)),
+                "audio_duration": duration,
+                "rtf": float(np.median(times)) / duration,
+            },
+            f,
+        )
+
+
+def audio_similarity(sv_model, wav_a, wav_b):
+    import librosa
+    import numpy as np
+    import torch
+
+    def embedding(path):
+        wav, _ = librosa.load(path, sr=16000)
+        return sv_model.compute_embedding3(torch.from_numpy(wav).unsqueeze(0))[0].float()
+
+    def mean_log_mel(path):
+        wav, sr = librosa.load(path, sr=16000)
+        mel = librosa.feature.melspectrogram(y=wav, sr=sr, n_mels=80)
+        return np.log(mel + 1e-5).mean(axis=1)
+
+    emb_a, emb_b = embedding(wav_a), embedding(wav_b)
+    speaker_sim = torch.nn.functional.cosine_similarity(emb_a, emb_b, dim=0).item()
+    mel_a, mel_b = mean_log_mel(wav_a), mean_log_mel(wav_b)
+    mel_sim = float(np.dot(mel_a, mel_b) / (np.linalg.norm(mel_a) * np.linalg.norm(mel_b)))
+    return speaker_sim, mel_sim
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU int8/bf16 synthesis benchmark")
+    parser.add_argument("--gpt_model", required=True)
+    parser.add_argument("--sovits_model", required=True)
+    parser.add_argument("--ref_audio", required=True)
+    parser.add_argument("--ref_text", required=True)
+    parser.add_argument("--ref_lang", default="en", choices=list(LANGUAGE_NAMES))
+    parser.add_argument("--text", required=True)
+    parser.add_argument("--text_lang", default="ja", choices=list(LANGUAGE_NAMES))
+    parser.add_argument("--top_k", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma separated subset of " + ",".join(MODES))
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--out", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+
+        torch.set_num_threads(args.threads)
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    if "fp32" not in modes:
+        modes.insert(0, "fp32")
+    out_dir = tempfile.mkdtemp(prefix="cpu_quant_bench_")
+    worker_args = []
+    worker_keys = ["gpt_model", "sovits_model", "ref_audio", "ref_text", "ref_lang", "text", "text_lang"]
+    worker_keys += ["top_k", "seed", "repeat", "threads"]
+    for key in worker_keys:
+        if getattr(args, key) is not None:
+            worker_args += [f"--{key}", str(getattr(args, key))]
+    results = {}
+    for mode in modes:
+        env = dict(os.environ, CUDA_VISIBLE_DEVICES="", is_half="False", **MODES[mode])
+        out = os.path.join(out_dir, mode.replace("+", "_"))
+        print(f"running {mode} ...")
+        subprocess.run([sys.executable, __file__, *worker_args, "--worker", "--out", out], env=env, check=True)
+        with open(out + ".json") as f:
+            results[mode] = dict(json.load(f), wav=out + ".wav")
+
+    from sv import SV
+
+    sv_model = SV("cpu", False)
+    baseline = results["fp32"]
+    print(f"{'mode':<10}{'load(s)':>9}{'synth(s)':>10}{'RTF':>7}{'speedup':>9}{'spk sim':>9}{'mel sim':>9}")
+    for mode in modes:
+        r = results[mode]
+        speaker_sim, mel_sim = audio_similarity(sv_model, baseline["wav"], r["wav"])
+        print(
+            f"{mode:<10}{r['load_time']:>9.2f}{r['synthesis_time']:>10.2f}{r['rtf']:>7.2f}"
+            f"{baseline['synthesis_time'] / r['synthesis_time']:>9.2f}{speaker_sim:>9.3f}{mel_sim:>9.3f}"
+        )
+    print(f"outputs: {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+文本前端冷启动开销：各入口模块的导入时间，以及每个语种第一次G2P（加载词典/模型）的耗时和常驻内存
+
+python GPT_SoVITS/benchmark_frontend_import.py
+python GPT_SoVITS/benchmark_frontend_import.py --targets import:TTS_infer_pack.TextPreprocessor,g2p:en
+
+每一项在独立子进程中测量（模块只会导入一次），RSS为该子进程结束时的常驻内存，
+"baseline"只导入torch，用来对比各项额外占用的内存
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+now_dir = os.getcwd()
+
+SAMPLE_TEXTS = {
+    "zh": "今天的天气很好，我们一起去公园散步吧。",
+    "yue": "今日天氣好好，我哋一齊去公園散步啦。",
+    "en": "The quick brown fox jumps over the lazy dog.",
+    "ja": "今日はいい天気ですね、一緒に公園を散歩しましょう。",
+    "ko": "오늘 날씨가 좋네요, 같이 공원에 산책하러 가요.",
+}
+
+FRONTEND_MODULES = [
+    "text.chinese2",
+    "text.cantonese",
+    "text.english",
+    "text.japanese",
+    "text.korean",
+    "text.LangSegmenter.langsegmenter",
+]
+
+DEFAULT_TARGETS = [
+    "baseline",
+    "import:text.LangSegmenter",
+    "import:text.cleaner",
+    "import:TTS_infer_pack.TextPreprocessor",
+    "import:inference_core",
+    "segment:zh",
+    "g2p:en",
+    "g2p:ja",
+    "g2p:ko",
+    "g2p:zh",
+    "g2p:yue",
+]
+
+
+def rss_mb():
+    import psutil
+
+    return psutil.Process().memory_info().rss / 1024**2
+
+
+def run_worker(target):
+    import time
+
+    sys.path.append(now_dir)
+    sys.path.append(os.path.join(now_dir, "GPT_SoVITS"))
+    import torch  # noqa: F401 所有入口都会导入torch，不计入测量
+
+    kind, _, name = target.partition(":")
+    t0 = time.perf_counter()
+    if kind == "import":
+        __import__(name)
+    elif kind == "segment":
+        from text.LangSegmenter import LangSegmenter
+
+        LangSegmenter.getTexts(SAMPLE_TEXTS[name])
+    elif kind == "g2p":
+        from text.cleaner import clean_text
+
+        clean_text(SAMPLE_TEXTS[name], name, "v2")
+    elapsed = time.perf_counter() - t0
+    loaded = sorted(module for module in FRONTEND_MODULES if module in sys.modules)
+    print(json.dumps({"seconds": elapsed, "rss_mb": rss_mb(), "frontends": loaded}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text frontend import time / memory benchmark")
+    parser.add_argument(
+        "--targets", default=",".join(DEFAULT_TARGETS), help="Comma separated subset of " + ",".join(DEFAULT_TARGETS)
+    )
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    print(f"{'target':<42}{'time(s)':>9}{'RSS(MB)':>10}{'+MB':>8}  frontends loaded")
+    baseline_rss = None
+    for target in [target for target in args.targets.split(",") if target]:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", target], capture_output=True, text=True, cwd=now_dir
+        )
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode
+            print(f"{target:<42} failed: {error}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        if target == "baseline":
+            baseline_rss = result["rss_mb"]
+        delta = result["rss_mb"] - baseline_rss if baseline_rss is not None else float("nan")
+        print(
+            f"{target:<42}{result['seconds']:>9.2f}{result['rss_mb']:>10.0f}{delta:>8.0f}  "
+            f"{', '.join(result['frontends']) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
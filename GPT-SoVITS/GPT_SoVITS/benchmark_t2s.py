@@ -0,0 +1,110 @@
+"""
+T2S decode benchmark: growing kv cache (torch.cat per step) vs preallocated static kv cache.
+
+python GPT_SoVITS/benchmark_t2s.py --gpt_model GPT_weights_v2/xxx.ckpt --device cuda --half
+不指定--gpt_model时使用随机初始化的默认结构，只测速度
+"""
+
+import argparse
+import time
+
+import torch
+
+from AR.models.t2s_lightning_module import Text2SemanticLightningModule
+
+default_benchmark_config = {
+    "model": {
+        "hidden_dim": 512,
+        "embedding_dim": 512,
+        "head": 16,
+        "n_layer": 24,
+        "vocab_size": 1025,
+        "phoneme_vocab_size": 732,
+        "dropout": 0,
+        "EOS": 1024,
+    },
+    "data": {"max_sec": 54},
+    "inference": {"top_k": 15},
+}
+
+
+def load_t2s_model(gpt_path, device, is_half):
+    if gpt_path:
+        dict_s1 = torch.load(gpt_path, map_location="cpu", weights_only=False)
+        config = dict_s1["config"]
+        t2s_model = Text2SemanticLightningModule(config, "****", is_train=False)
+        t2s_model.load_state_dict(dict_s1["weight"])
+    else:
+        t2s_model = Text2SemanticLightningModule(default_benchmark_config, "****", is_train=False)
+    if is_half:
+        t2s_model = t2s_model.half()
+    t2s_model = t2s_model.to(device)
+    t2s_model.eval()
+    return t2s_model.model
+
+
+def _sync(device):
+    if str(device).startswith("cuda"):
+        torch.cuda.synchronize()
+
+
+@torch.no_grad()
+def run_decode(model, xy_pos, attn_mask, steps, static_cache, device):
+    """process_prompt + `steps` decode steps; returns (steps/sec, last hidden state)"""
+    transformer = model.t2s_transformer
+    src_len = xy_pos.shape[1]
+    xy_dec, k_cache, v_cache = transformer.process_prompt(xy_pos, attn_mask, None)
+    if static_cache:
+        k_cache, v_cache = transformer.init_static_cache(k_cache, v_cache, src_len + steps + 1)
+    x = xy_dec[:, -1:]
+
+    _sync(device)
+    t0 = time.perf_counter()
+    for idx in range(1, steps + 1):
+        if static_cache:
+            x, k_cache, v_cache = transformer.decode_next_token_static(x, k_cache, v_cache, src_len + idx - 1)
+        else:
+            x, k_cache, v_cache = transformer.decode_next_token(x, k_cache, v_cache)
+    _sync(device)
+    return steps / (time.perf_counter() - t0), x
+
+
+def main():
+    parser = argparse.ArgumentParser(description="T2S decode steps/sec benchmark")
+    parser.add_argument("--gpt_model", default=None, help="Path to the GPT model file")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--half", action="store_true", help="Use half precision")
+    parser.add_argument("--prompt_len", type=int, default=300, help="Prompt (text + reference semantic) length")
+    parser.add_argument("--steps", type=int, default=500, help="Decode steps per run")
+    parser.add_argument("--batch_size", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    model = load_t2s_model(args.gpt_model, args.device, args.half)
+    dtype = torch.float16 if args.half else torch.float32
+    torch.manual_seed(0)
+    xy_pos = torch.randn(args.batch_size, args.prompt_len, model.model_dim, dtype=dtype, device=args.device)
+    attn_mask = torch.zeros(
+        (args.batch_size, model.num_head, args.prompt_len, args.prompt_len), dtype=torch.bool, device=args.device
+    )
+
+    # warmup
+    run_decode(model, xy_pos, attn_mask, 10, False, args.device)
+    run_decode(model, xy_pos, attn_mask, 10, True, args.device)
+
+    results = {}
+    for static_cache in (False, True):
+        speeds = []
+        for _ in range(args.repeat):
+            speed, out = run_decode(model, xy_pos, attn_mask, args.steps, static_cache, args.device)
+            speeds.append(speed)
+        results[static_cache] = (max(speeds), out)
+        name = "static kv cache" if static_cache else "torch.cat kv cache"
+        print(f"{name}: {max(speeds):.1f} steps/s")
+
+    diff = (results[True][1].float() - results[False][1].float()).abs().max().item()
+    print(f"speedup: {results[True][0] / results[False][0]:.2f}x, max abs diff: {diff:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+中文文本规范化吞吐：逐条依次替换的原始实现 vs 合并转换表+按需跳过数字规则的实现（不缓存 / 按句缓存），
+并逐句校验两者输出完全一致
+
+python GPT_SoVITS/benchmark_zh_normalization.py
+python GPT_SoVITS/benchmark_zh_normalization.py --corpus lines.txt --repeat 3
+
+不指定--corpus时用固定随机种子生成语料：日期、时间、电话、百分比、单位、算式、希腊字母、繁体、全角字符
+和不含数字的普通台词混合，--duplicate_ratio比例的句子重复前面出现过的句子（模拟剧本里反复出现的台词）
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+now_dir = os.getcwd()
+sys.path.append(now_dir)
+sys.path.append(os.path.join(now_dir, "GPT_SoVITS"))
+
+PLAIN_SENTENCES = [
+    "今天天气不错，我们出去走走吧。",
+    "你到底在说什么？我完全听不懂！",
+    "别担心，一切都会好起来的。",
+    "這件事情你為什麼不早點告訴我？",
+    "快点！他们马上就要到了！",
+    "嗯……让我再想一想。",
+    "《星际穿越》是我最喜欢的电影——没有之一。",
+    "谢谢你，真的非常感谢。",
+]
+
+TEMPLATES = [
+    lambda r: f"会议定在{r.randint(1990, 2030)}年{r.randint(1, 12)}月{r.randint(1, 28)}日举行。",
+    lambda r: f"报告日期是{r.randint(2000, 2030)}-{r.randint(1, 12):02d}-{r.randint(1, 28):02d}，请查收。",
+    lambda r: f"我们{r.randint(0, 23)}:{r.randint(0, 59):02d}在门口见。",
+    lambda r: f"营业时间{r.randint(7, 10)}:00-{r.randint(18, 22)}:30，周末照常。",
+    lambda r: f"请拨打1{r.choice('389')}{r.randint(100000000, 999999999)}联系我。",
+    lambda r: f"座机号码是010-{r.randint(10000000, 99999999)}。",
+    lambda r: f"销售额增长了{r.randint(1, 99)}.{r.randint(0, 9)}%，利润下降-{r.randint(1, 20)}%。",
+    lambda r: f"今天最高温度{r.randint(-10, 40)}℃，体感只有{r.randint(-15, 35)}度。",
+    lambda r: f"他身高{r.randint(150, 200)}cm，体重{r.randint(40, 120)}kg。",
+    lambda r: f"{r.randint(1, 99)}+{r.randint(1, 99)}={r.randint(2, 198)}，对吗？",
+    lambda r: f"x²+y²={r.randint(1, 9)}，这是一个圆。",
+    lambda r: f"大概有{r.randint(2, 50)}~{r.randint(51, 100)}个人，{r.randint(1000, 99999)}多块钱。",
+    lambda r: f"版本号是{r.randint(1, 9)}.{r.randint(0, 20)}.{r.randint(0, 99)}，{r.randint(1, 9)}/{r.randint(10, 20)}已完成。",
+    lambda r: f"α粒子和β射线的能量大约是{r.randint(1, 9)}.{r.randint(10, 99)}倍。",
+    lambda r: f"ＡＢＣ公司第{r.randint(1, 99)}号房间，編號１２３。",
+]
+
+
+def build_corpus(size: int, duplicate_ratio: float, seed: int):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        if corpus and rng.random() < duplicate_ratio:
+            corpus.append(rng.choice(corpus))
+        elif rng.random() < 0.5:
+            corpus.append(rng.choice(PLAIN_SENTENCES))
+        else:
+            corpus.append(rng.choice(TEMPLATES)(rng))
+    return corpus
+
+
+def measure(fn, corpus, repeat: int):
+    best = float("inf")
+    outputs = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        outputs = fn(corpus)
+        best = min(best, time.perf_counter() - t0)
+    return best, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chinese text normalization throughput benchmark")
+    parser.add_argument("--corpus", default=None, help="UTF-8 text file, one sentence per line")
+    parser.add_argument("--size", type=int, default=50000, help="Generated corpus size")
+    parser.add_argument("--duplicate_ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs")
+    args = parser.parse_args()
+
+    from text.zh_normalization.text_normlization import TextNormalizer
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = [line.strip() for line in f if line.strip()]
+    else:
+        corpus = build_corpus(args.size, args.duplicate_ratio, args.seed)
+    # 与TextNormalizer.normalize相同：先按标点切句，逐句规范化
+    splitter = TextNormalizer(cache_size=0)
+    sentences = [sentence for text in corpus for sentence in splitter._split(text)]
+    print(f"{len(corpus)} texts, {len(sentences)} sentences, {len(set(sentences))} unique")
+
+    def run_reference(sentences):
+        normalizer = TextNormalizer(cache_size=0)
+        return [normalizer.normalize_sentence_reference(sentence) for sentence in sentences]
+
+    def run_compiled(sentences):
+        normalizer = TextNormalizer(cache_size=0)
+        return [normalizer.normalize_sentence(sentence) for sentence in sentences]
+
+    def run_cached(sentences):
+        # 每次都新建实例，测的是从空缓存开始处理整份语料
+        normalizer = TextNormalizer()
+        return [normalizer.normalize_sentence(sentence) for sentence in sentences]
+
+    reference_time, reference = measure(run_reference, sentences, args.repeat)
+    print(f"{'implementation':<20}{'sentences/s':>14}{'speedup':>10}  output")
+    print(f"{'reference':<20}{len(sentences) / reference_time:>14.0f}{1.0:>9.2f}x")
+    for name, fn in [("compiled", run_compiled), ("compiled+cache", run_cached)]:
+        elapsed, outputs = measure(fn, sentences, args.repeat)
+        mismatches = [i for i, (a, b) in enumerate(zip(reference, outputs)) if a != b]
+        status = "identical" if not mismatches else f"{len(mismatches)} MISMATCHES"
+        print(f"{name:<20}{len(sentences) / elapsed:>14.0f}{reference_time / elapsed:>9.2f}x  {status}")
+        for i in mismatches[:5]:
+            print(f"    {sentences[i]!r}: {reference[i]!r} != {outputs[i]!r}")
+
+
+if __name__ == "__main__":
+    main()
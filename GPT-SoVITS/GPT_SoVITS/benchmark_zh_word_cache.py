@@ -0,0 +1,81 @@
+"""
+中文G2P词级缓存（text/word_pron_cache.py）的效果：关闭缓存 / 空缓存开始 / 缓存已热 三种情况下的G2P吞吐和命中率，
+并逐句校验输出与关闭缓存时完全一致
+
+python GPT_SoVITS/benchmark_zh_word_cache.py
+python GPT_SoVITS/benchmark_zh_word_cache.py --frontend chinese --corpus lines.txt
+
+语料与benchmark_zh_normalization.py相同（默认按固定种子生成）。文本规范化和G2PW推理在计时前完成
+（G2PW结果预取进它自己的缓存），计时只包含分词、读音转换、变调和儿化
+"""
+
+import argparse
+import os
+import sys
+import time
+
+now_dir = os.getcwd()
+sys.path.append(now_dir)
+sys.path.append(os.path.join(now_dir, "GPT_SoVITS"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chinese word-level pronunciation cache benchmark")
+    parser.add_argument(
+        "--frontend", default="chinese2", choices=["chinese2", "chinese"], help="chinese is the v1 frontend (no G2PW)"
+    )
+    parser.add_argument("--corpus", default=None, help="UTF-8 text file, one sentence per line")
+    parser.add_argument("--size", type=int, default=20000, help="Generated corpus size")
+    parser.add_argument("--duplicate_ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    # 预取的G2PW结果要全部留在缓存里
+    os.environ.setdefault("g2pw_cache_size", "1000000")
+    from benchmark_zh_normalization import build_corpus
+    from text.word_pron_cache import word_pron_cache
+
+    frontend = __import__("text." + args.frontend, fromlist=[args.frontend])
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = [line.strip() for line in f if line.strip()]
+    else:
+        corpus = build_corpus(args.size, args.duplicate_ratio, args.seed)
+    texts = [text for text in (frontend.text_normalize(line) for line in corpus) if text.strip()]
+    if hasattr(frontend, "prefetch_g2pw"):
+        frontend.prefetch_g2pw(texts, normalized=True)
+    frontend.g2p(texts[0])  # jieba等在第一次调用时加载
+    print(f"{args.frontend}: {len(texts)} texts")
+
+    def run():
+        t0 = time.perf_counter()
+        outputs = [frontend.g2p(text) for text in texts]
+        return time.perf_counter() - t0, outputs
+
+    max_entries = word_pron_cache.max_entries
+    word_pron_cache.max_entries = 0
+    word_pron_cache.clear()
+    reference_time, reference = run()
+
+    word_pron_cache.max_entries = max_entries or 65536
+    word_pron_cache.clear()
+    cold_time, cold = run()
+    cold_stats = word_pron_cache.stats()
+    word_pron_cache.hits = word_pron_cache.misses = 0
+    warm_time, warm = run()
+    warm_stats = word_pron_cache.stats()
+
+    print(f"{'cache':<12}{'texts/s':>10}{'speedup':>10}{'hit rate':>10}{'entries':>9}  output")
+    print(f"{'off':<12}{len(texts) / reference_time:>10.0f}{1.0:>9.2f}x{'-':>10}{'-':>9}")
+    for name, elapsed, outputs, stats in [("cold", cold_time, cold, cold_stats), ("warm", warm_time, warm, warm_stats)]:
+        mismatches = sum(1 for a, b in zip(reference, outputs) if a != b)
+        status = "identical" if mismatches == 0 else f"{mismatches} MISMATCHES"
+        print(
+            f"{name:<12}{len(texts) / elapsed:>10.0f}{reference_time / elapsed:>9.2f}x"
+            f"{stats['hit_rate']:>10.0%}{stats['entries']:>9}  {status}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+CPU部署用的动态int8量化：T2S transformer、BERT、SoVITS文本编码器
+权重离线量化为int8，激活在推理时动态量化，只对线性层（以及等价于线性层的1x1 Conv1d）生效
+"""
+
+import torch
+from torch import nn
+from torch.nn import functional as F
+
+from AR.models.t2s_model import T2SBlock, T2SMLP, T2STransformer
+
+
+def dynamic_int8_linear(weight: torch.Tensor, bias: torch.Tensor = None) -> nn.Module:
+    linear = nn.Linear(weight.shape[1], weight.shape[0], bias=bias is not None)
+    with torch.no_grad():
+        linear.weight.copy_(weight.detach().float().cpu())
+        if bias is not None:
+            linear.bias.copy_(bias.detach().float().cpu())
+    return torch.ao.quantization.quantize_dynamic(nn.Sequential(linear), {nn.Linear}, dtype=torch.qint8)[0]
+
+
+class QuantizedT2SMLP(T2SMLP):
+    def __init__(self, mlp: T2SMLP):
+        super().__init__(mlp.w1, mlp.b1, mlp.w2, mlp.b2)
+        self.linear1 = dynamic_int8_linear(mlp.w1, mlp.b1)
+        self.linear2 = dynamic_int8_linear(mlp.w2, mlp.b2)
+
+    def forward(self, x):
+        # 量化算子只接受fp32输入，bf16 autocast下需要先转回fp32
+        x = F.relu(self.linear1(x.float()))
+        x = self.linear2(x)
+        return x
+
+
+class QuantizedT2SBlock(T2SBlock):
+    def __init__(self, block: T2SBlock):
+        super().__init__(
+            block.num_heads,
+            block.hidden_dim,
+            QuantizedT2SMLP(block.mlp),
+            block.qkv_w,
+            block.qkv_b,
+            block.out_w,
+            block.out_b,
+            block.norm_w1,
+            block.norm_b1,
+            block.norm_eps1,
+            block.norm_w2,
+            block.norm_b2,
+            block.norm_eps2,
+        )
+        self.qkv = dynamic_int8_linear(block.qkv_w, block.qkv_b)
+        self.out = dynamic_int8_linear(block.out_w, block.out_b)
+
+    def qkv_proj(self, x: torch.Tensor):
+        return self.qkv(x.float())
+
+    def out_proj(self, x: torch.Tensor):
+        return self.out(x.float())
+
+
+def quantize_t2s_model(model):
+    """model: Text2SemanticDecoder (t2s_model.model)，原地替换推理用的transformer和输出/BERT投影层"""
+    blocks = [QuantizedT2SBlock(block) for block in model.t2s_transformer.blocks]
+    model.t2s_transformer = T2STransformer(len(blocks), blocks)
+    torch.ao.quantization.quantize_dynamic(model, {"ar_predict_layer", "bert_proj"}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def quantize_bert_model(bert_model):
+    return torch.ao.quantization.quantize_dynamic(bert_model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class Int8PointwiseConv1d(nn.Module):
+    """kernel_size=1的Conv1d等价于在通道维上的Linear，替换为动态int8量化的Linear"""
+
+    def __init__(self, conv: nn.Conv1d):
+        super().__init__()
+        self.linear = dynamic_int8_linear(conv.weight[:, :, 0], conv.bias)
+
+    def forward(self, x):
+        return self.linear(x.float().transpose(1, 2)).transpose(1, 2)
+
+
+def _is_pointwise_conv1d(module):
+    return (
+        isinstance(module, nn.Conv1d)
+        and module.kernel_size == (1,)
+        and module.stride == (1,)
+        and module.padding == (0,)
+        and module.dilation == (1,)
+        and module.groups == 1
+    )
+
+
+def quantize_text_encoder(vq_model):
+    """SoVITS的文本编码器(enc_p)：注意力的q/k/v/o、MRTE和投影层都是1x1 Conv1d；FFN的卷积核>1，保持fp32"""
+
+    def replace(parent):
+        for name, child in parent.named_children():
+            if _is_pointwise_conv1d(child):
+                setattr(parent, name, Int8PointwiseConv1d(child))
+            else:
+                replace(child)
+
+    replace(vq_model.enc_p)
+    return vq_model
+
+
+def cpu_autocast(enabled: bool):
+    return torch.autocast("cpu", dtype=torch.bfloat16, enabled=enabled)
@@ -331,6 +331,38 @@ class T2SBlock:
         )
         return x, k_cache, v_cache
 
+    def decode_next_token_static(self, x: torch.Tensor, k_cache: torch.Tensor, v_cache: torch.Tensor, pos: int):
+        # k_cache/v_cache are fixed-capacity buffers; the new key/value is written in place at pos
+        q, k, v = F.linear(x, self.qkv_w, self.qkv_b).chunk(3, dim=-1)
+
+        k_cache[:, pos : pos + 1] = k
+        v_cache[:, pos : pos + 1] = v
+
+        batch_size = q.shape[0]
+        q_len = q.shape[1]
+        kv_len = pos + 1
+
+        q = q.view(batch_size, q_len, self.num_heads, -1).transpose(1, 2)
+        k = k_cache[:, :kv_len].view(batch_size, kv_len, self.num_heads, -1).transpose(1, 2)
+        v = v_cache[:, :kv_len].view(batch_size, kv_len, self.num_heads, -1).transpose(1, 2)
+
+        attn = F.scaled_dot_product_attention(q, k, v)
+
+        attn = attn.transpose(1, 2).reshape(batch_size, q_len, -1)
+        attn = F.linear(attn, self.out_w, self.out_b)
+
+        x = x + attn
+        x = F.layer_norm(x, [self.hidden_dim], self.norm_w1, self.norm_b1, self.norm_eps1)
+        x = x + self.mlp.forward(x)
+        x = F.layer_norm(
+            x,
+            [self.hidden_dim],
+            self.norm_w2,
+            self.norm_b2,
+            self.norm_eps2,
+        )
+        return x, k_cache, v_cache
+
 
 @torch.jit.script
 class T2STransformer:
@@ -352,6 +384,25 @@ class T2STransformer:
             x, k_cache[i], v_cache[i] = self.blocks[i].decode_next_token(x, k_cache[i], v_cache[i])
         return x, k_cache, v_cache
 
+    def init_static_cache(self, k_cache: list[torch.Tensor], v_cache: list[torch.Tensor], capacity: int):
+        k_static: list[torch.Tensor] = []
+        v_static: list[torch.Tensor] = []
+        for i in range(self.num_blocks):
+            k = k_cache[i]
+            v = v_cache[i]
+            k_buf = torch.zeros((k.shape[0], capacity, k.shape[2]), dtype=k.dtype, device=k.device)
+            v_buf = torch.zeros((v.shape[0], capacity, v.shape[2]), dtype=v.dtype, device=v.device)
+            k_buf[:, : k.shape[1]] = k
+            v_buf[:, : v.shape[1]] = v
+            k_static.append(k_buf)
+            v_static.append(v_buf)
+        return k_static, v_static
+
+    def decode_next_token_static(self, x: torch.Tensor, k_cache: list[torch.Tensor], v_cache: list[torch.Tensor], pos: int):
+        for i in range(self.num_blocks):
+            x, k_cache[i], v_cache[i] = self.blocks[i].decode_next_token_static(x, k_cache[i], v_cache[i], pos)
+        return x, k_cache, v_cache
+
 
 class VitsModel(nn.Module):
     def __init__(self, vits_path, version=None, is_half=True, device="cpu"):
@@ -521,6 +572,9 @@ class T2SModel(nn.Module):
         top_k = int(top_k)
 
         xy_dec, k_cache, v_cache = self.t2s_transformer.process_prompt(xy_pos, xy_attn_mask, None)
+        # 预分配固定长度的kv cache，解码时按位置写入，避免每步torch.cat
+        max_steps = 1500
+        k_cache, v_cache = self.t2s_transformer.init_static_cache(k_cache, v_cache, src_len + max_steps)
 
         logits = self.ar_predict_layer(xy_dec[:, -1])
         logits = logits[:, :-1]
@@ -533,10 +587,12 @@ class T2SModel(nn.Module):
 
         stop = False
         # for idx in range(1, 50):
-        for idx in range(1, 1500):
+        for idx in range(1, max_steps):
             # [1, N] [N_layer, N, 1, 512] [N_layer, N, 1, 512] [1, N, 512] [1] [1, N, 512] [1, N]
             # y, k, v, y_emb, logits, samples = self.stage_decoder(y, k, v, y_emb, x_example)
-            xy_dec, k_cache, v_cache = self.t2s_transformer.decode_next_token(xy_pos, k_cache, v_cache)
+            xy_dec, k_cache, v_cache = self.t2s_transformer.decode_next_token_static(
+                xy_pos, k_cache, v_cache, src_len + idx - 1
+            )
             logits = self.ar_predict_layer(xy_dec[:, -1])
 
             if idx < 11:  ###至少预测出10个token不然不给停止（0.4s）
@@ -621,6 +677,8 @@ class ExportSSLModel(torch.nn.Module):
 
 def export_bert(output_path):
     tokenizer = AutoTokenizer.from_pretrained(bert_path)
+    # 与bert_model.pt放在一起，运行时不再依赖bert_path
+    tokenizer.save_pretrained(os.path.join(output_path, "tokenizer"))
 
     text = "叹息声一声接着一声传出,木兰对着房门织布.听不见织布机织布的声音,只听见木兰在叹息.问木兰在想什么?问木兰在惦记什么?木兰答道,我也没有在想什么,也没有在惦记什么."
     ref_bert_inputs = tokenizer(text, return_tensors="pt")
@@ -653,7 +711,16 @@ def export_bert(output_path):
     print("#### exported bert ####")
 
 
-def export(gpt_path, vits_path, ref_audio_path, ref_text, output_path, export_bert_and_ssl=False, device="cpu"):
+def write_bundle_config(output_path, version, sampling_rate, speed, is_half):
+    """运行时(TTS_infer_pack/TorchScriptTTS.py)读取的导出信息"""
+    config = {"version": version, "sampling_rate": sampling_rate, "speed": speed, "is_half": is_half}
+    with open(os.path.join(output_path, "bundle.json"), "w") as f:
+        json.dump(config, f, indent=4)
+
+
+def export(
+    gpt_path, vits_path, ref_audio_path, ref_text, output_path, export_bert_and_ssl=False, device="cpu", speed=1.0
+):
     if not os.path.exists(output_path):
         os.makedirs(output_path)
         print(f"目录已创建: {output_path}")
@@ -702,7 +769,7 @@ def export(gpt_path, vits_path, ref_audio_path, ref_text, output_path, export_be
     print("#### script t2s_m ####")
 
     print("vits.hps.data.sampling_rate:", vits.hps.data.sampling_rate)
-    gpt_sovits = GPT_SoVITS(t2s, vits).to(device)
+    gpt_sovits = GPT_SoVITS(t2s, vits, speed).to(device)
     gpt_sovits.eval()
 
     ref_audio_sr = s.resample(ref_audio, 16000, 32000).to(device)
@@ -724,6 +791,7 @@ def export(gpt_path, vits_path, ref_audio_path, ref_text, output_path, export_be
         gpt_sovits_path = os.path.join(output_path, "gpt_sovits_model.pt")
         gpt_sovits_export.save(gpt_sovits_path)
         print("#### exported gpt_sovits ####")
+    write_bundle_config(output_path, vits.hps.model.version, vits.hps.data.sampling_rate, speed, False)
 
 
 def export_prov2(
@@ -736,6 +804,7 @@ def export_prov2(
     export_bert_and_ssl=False,
     device="cpu",
     is_half=True,
+    speed=1.0,
 ):
     if sv_cn_model == None:
         init_sv_cn(device, is_half)
@@ -802,7 +871,7 @@ def export_prov2(
     print("#### script t2s_m ####")
 
     print("vits.hps.data.sampling_rate:", vits.hps.data.sampling_rate)
-    gpt_sovits = GPT_SoVITS_V2Pro(t2s, vits, sv_model).to(device)
+    gpt_sovits = GPT_SoVITS_V2Pro(t2s, vits, sv_model, speed).to(device)
     gpt_sovits.eval()
 
     ref_audio_sr = s.resample(ref_audio, 16000, 32000)
@@ -839,6 +908,7 @@ def export_prov2(
         gpt_sovits_path = os.path.join(output_path, "gpt_sovits_model.pt")
         gpt_sovits_export.save(gpt_sovits_path)
         print("#### exported gpt_sovits ####")
+        write_bundle_config(output_path, version, vits.hps.data.sampling_rate, speed, is_half)
         audio = gpt_sovits_export(ssl_content, ref_audio_sr, ref_seq, text_seq, ref_bert, text_bert, top_k)
         print("start write wav")
         soundfile.write("out.wav", audio.float().detach().cpu().numpy(), 32000)
@@ -857,10 +927,12 @@ def resamplex(ref_audio: torch.Tensor, src_sr: int, dst_sr: int) -> torch.Tensor
 
 
 class GPT_SoVITS(nn.Module):
-    def __init__(self, t2s: T2SModel, vits: VitsModel):
+    def __init__(self, t2s: T2SModel, vits: VitsModel, speed: float = 1.0):
         super().__init__()
         self.t2s = t2s
         self.vits = vits
+        # trace时speed会被固化，默认语速在构造时指定
+        self.speed = speed
 
     def forward(
         self,
@@ -871,8 +943,10 @@ class GPT_SoVITS(nn.Module):
         ref_bert: Tensor,
         text_bert: Tensor,
         top_k: LongTensor,
-        speed=1.0,
+        speed: Optional[float] = None,
     ):
+        if speed is None:
+            speed = self.speed
         codes = self.vits.vq_model.extract_latent(ssl_content)
         prompt_semantic = codes[0, 0]
         prompts = prompt_semantic.unsqueeze(0)
@@ -914,11 +988,12 @@ class ExportERes2NetV2(nn.Module):
 
 
 class GPT_SoVITS_V2Pro(nn.Module):
-    def __init__(self, t2s: T2SModel, vits: VitsModel, sv_model: ExportERes2NetV2):
+    def __init__(self, t2s: T2SModel, vits: VitsModel, sv_model: ExportERes2NetV2, speed: float = 1.0):
         super().__init__()
         self.t2s = t2s
         self.vits = vits
         self.sv_model = sv_model
+        self.speed = speed
 
     def forward(
         self,
@@ -929,8 +1004,10 @@ class GPT_SoVITS_V2Pro(nn.Module):
         ref_bert: Tensor,
         text_bert: Tensor,
         top_k: LongTensor,
-        speed=1.0,
+        speed: Optional[float] = None,
     ):
+        if speed is None:
+            speed = self.speed
         codes = self.vits.vq_model.extract_latent(ssl_content)
         prompt_semantic = codes[0, 0]
         prompts = prompt_semantic.unsqueeze(0)
@@ -1067,6 +1144,7 @@ def main():
     parser.add_argument("--device", help="Device to use")
     parser.add_argument("--version", help="version of the model", default="v2")
     parser.add_argument("--no-half", action="store_true", help="Do not use half precision for model weights")
+    parser.add_argument("--speed", type=float, default=1.0, help="Speech speed baked into the traced model")
 
     args = parser.parse_args()
     if args.version in ["v2Pro", "v2ProPlus"]:
@@ -1082,6 +1160,7 @@ def main():
             export_bert_and_ssl=args.export_common_model,
             device=args.device,
             is_half=is_half,
+            speed=args.speed,
         )
     else:
         export(
@@ -1092,6 +1171,7 @@ def main():
             output_path=args.output_path,
             device=args.device,
             export_bert_and_ssl=args.export_common_model,
+            speed=args.speed,
         )
 
 
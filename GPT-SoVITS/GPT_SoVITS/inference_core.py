@@ -0,0 +1,1133 @@
+"""
+GPT-SoVITS推理核心：get_tts_wav合成流程的唯一实现，可以作为库使用；inference_webui是它之上的gradio界面
+
+- import时不import gradio，不加载任何模型，不读写weight.json
+- 模型都挂在GPTSoVITSInference实例上，同一进程可以有多个实例
+- 相对路径（权重、pretrained_models）按GPT-SoVITS根目录解析，不需要os.chdir
+- GPT/SoVITS权重用load_gpt/load_sovits显式加载；BERT、cnhubert、SV、声码器在第一次用到时才加载，
+  也可以用load_bert/load_ssl提前加载，置为None后下次用到时会重新加载
+
+    tts = GPTSoVITSInference()
+    tts.load_gpt("GPT_weights_v2/xxx.ckpt")
+    tts.load_sovits("SoVITS_weights_v2/xxx.pth")
+    sr, audio = next(tts.get_tts_wav(ref_wav_path, prompt_text, i18n("中文"), text, i18n("日文")))
+"""
+
+import hashlib
+import os
+import random
+import re
+import sys
+import traceback
+from collections import OrderedDict
+from time import time as ttime
+
+now_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # GPT-SoVITS根目录
+for _path in (now_dir, os.path.join(now_dir, "GPT_SoVITS")):
+    if _path not in sys.path:
+        sys.path.append(_path)
+
+import librosa
+import numpy as np
+import torch
+import torchaudio
+
+from config import name2gpt_path, name2sovits_path, pretrained_sovits_name
+from cpu_quantize import cpu_autocast, quantize_bert_model, quantize_t2s_model, quantize_text_encoder
+from module.mel_processing import mel_spectrogram_torch, spectrogram_torch
+from process_ckpt import get_sovits_version_from_path_fast, load_sovits_new
+from text import cleaned_text_to_sequence
+from text.cleaner import clean_text
+from text.LangSegmenter import LangSegmenter
+from text_feature_cache import TextFeatureCache, bert_precision
+from tools.i18n.i18n import I18nAuto
+
+i18n = I18nAuto(language=os.environ.get("language", "Auto"))
+
+
+def resolve_path(path):
+    """相对路径优先按GPT-SoVITS根目录解析，根目录下不存在时保持原样（按当前目录）"""
+    if not path or os.path.isabs(path):
+        return path
+    candidate = os.path.join(now_dir, path)
+    return candidate if os.path.exists(candidate) else path
+
+
+def set_seed(seed):
+    if seed == -1:
+        seed = random.randint(0, 1000000)
+    seed = int(seed)
+    random.seed(seed)
+    os.environ["PYTHONHASHSEED"] = str(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    torch.cuda.manual_seed(seed)
+
+
+dict_language_v1 = {
+    i18n("中文"): "all_zh",  # 全部按中文识别
+    i18n("英文"): "en",  # 全部按英文识别#######不变
+    i18n("日文"): "all_ja",  # 全部按日文识别
+    i18n("中英混合"): "zh",  # 按中英混合识别####不变
+    i18n("日英混合"): "ja",  # 按日英混合识别####不变
+    i18n("多语种混合"): "auto",  # 多语种启动切分识别语种
+}
+dict_language_v2 = {
+    i18n("中文"): "all_zh",  # 全部按中文识别
+    i18n("英文"): "en",  # 全部按英文识别#######不变
+    i18n("日文"): "all_ja",  # 全部按日文识别
+    i18n("粤语"): "all_yue",  # 全部按中文识别
+    i18n("韩文"): "all_ko",  # 全部按韩文识别
+    i18n("中英混合"): "zh",  # 按中英混合识别####不变
+    i18n("日英混合"): "ja",  # 按日英混合识别####不变
+    i18n("粤英混合"): "yue",  # 按粤英混合识别####不变
+    i18n("韩英混合"): "ko",  # 按韩英混合识别####不变
+    i18n("多语种混合"): "auto",  # 多语种启动切分识别语种
+    i18n("多语种混合(粤语)"): "auto_yue",  # 多语种启动切分识别语种
+}
+
+v3v4set = {"v3", "v4"}
+v2pro_set = {"v2Pro", "v2ProPlus"}
+
+
+class DictToAttrRecursive(dict):
+    def __init__(self, input_dict):
+        super().__init__(input_dict)
+        for key, value in input_dict.items():
+            if isinstance(value, dict):
+                value = DictToAttrRecursive(value)
+            self[key] = value
+            setattr(self, key, value)
+
+    def __getattr__(self, item):
+        try:
+            return self[item]
+        except KeyError:
+            raise AttributeError(f"Attribute {item} not found")
+
+    def __setattr__(self, key, value):
+        if isinstance(value, dict):
+            value = DictToAttrRecursive(value)
+        super(DictToAttrRecursive, self).__setitem__(key, value)
+        super().__setattr__(key, value)
+
+    def __delattr__(self, item):
+        try:
+            del self[item]
+        except KeyError:
+            raise AttributeError(f"Attribute {item} not found")
+
+
+class SemanticTokenCache:
+    """LRU cache of T2S outputs keyed by content, so that re-running with only speed or
+    vocoder settings changed skips autoregressive decoding."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def make_key(prompt, prompt_phones, phones, norm_text, top_k, top_p, temperature, model_path):
+        prompt_hash = hashlib.sha1()
+        if prompt is not None:
+            prompt_hash.update(prompt.detach().cpu().numpy().tobytes())
+            prompt_hash.update(str(prompt_phones).encode("utf-8"))
+        # torch.initial_seed() is the seed of the RNG the sampler draws from
+        return (
+            prompt_hash.hexdigest(),
+            tuple(phones),
+            norm_text,
+            int(top_k),
+            float(top_p),
+            float(temperature),
+            torch.initial_seed(),
+            model_path,
+        )
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+punctuation = set(["!", "?", "…", ",", ".", "-", " "])
+splits = {
+    "，",
+    "。",
+    "？",
+    "！",
+    ",",
+    ".",
+    "?",
+    "!",
+    "~",
+    ":",
+    "：",
+    "—",
+    "…",
+}
+
+
+def get_first(text):
+    pattern = "[" + "".join(re.escape(sep) for sep in splits) + "]"
+    text = re.split(pattern, text)[0].strip()
+    return text
+
+
+def split(todo_text):
+    todo_text = todo_text.replace("……", "。").replace("——", "，")
+    if todo_text[-1] not in splits:
+        todo_text += "。"
+    i_split_head = i_split_tail = 0
+    len_text = len(todo_text)
+    todo_texts = []
+    while 1:
+        if i_split_head >= len_text:
+            break  # 结尾一定有标点，所以直接跳出即可，最后一段在上次已加入
+        if todo_text[i_split_head] in splits:
+            i_split_head += 1
+            todo_texts.append(todo_text[i_split_tail:i_split_head])
+            i_split_tail = i_split_head
+        else:
+            i_split_head += 1
+    return todo_texts
+
+
+def cut1(inp):
+    inp = inp.strip("\n")
+    inps = split(inp)
+    split_idx = list(range(0, len(inps), 4))
+    split_idx[-1] = None
+    if len(split_idx) > 1:
+        opts = []
+        for idx in range(len(split_idx) - 1):
+            opts.append("".join(inps[split_idx[idx] : split_idx[idx + 1]]))
+    else:
+        opts = [inp]
+    opts = [item for item in opts if not set(item).issubset(punctuation)]
+    return "\n".join(opts)
+
+
+def cut2(inp):
+    inp = inp.strip("\n")
+    inps = split(inp)
+    if len(inps) < 2:
+        return inp
+    opts = []
+    summ = 0
+    tmp_str = ""
+    for i in range(len(inps)):
+        summ += len(inps[i])
+        tmp_str += inps[i]
+        if summ > 50:
+            summ = 0
+            opts.append(tmp_str)
+            tmp_str = ""
+    if tmp_str != "":
+        opts.append(tmp_str)
+    # print(opts)
+    if len(opts) > 1 and len(opts[-1]) < 50:  ##如果最后一个太短了，和前一个合一起
+        opts[-2] = opts[-2] + opts[-1]
+        opts = opts[:-1]
+    opts = [item for item in opts if not set(item).issubset(punctuation)]
+    return "\n".join(opts)
+
+
+def cut3(inp):
+    inp = inp.strip("\n")
+    opts = ["%s" % item for item in inp.strip("。").split("。")]
+    opts = [item for item in opts if not set(item).issubset(punctuation)]
+    return "\n".join(opts)
+
+
+def cut4(inp):
+    inp = inp.strip("\n")
+    opts = re.split(r"(?<!\d)\.(?!\d)", inp.strip("."))
+    opts = [item for item in opts if not set(item).issubset(punctuation)]
+    return "\n".join(opts)
+
+
+# contributed by https://github.com/AI-Hobbyist/GPT-SoVITS/blob/main/GPT_SoVITS/inference_webui.py
+def cut5(inp):
+    inp = inp.strip("\n")
+    punds = {",", ".", ";", "?", "!", "、", "，", "。", "？", "！", ";", "：", "…"}
+    mergeitems = []
+    items = []
+
+    for i, char in enumerate(inp):
+        if char in punds:
+            if char == "." and i > 0 and i < len(inp) - 1 and inp[i - 1].isdigit() and inp[i + 1].isdigit():
+                items.append(char)
+            else:
+                items.append(char)
+                mergeitems.append("".join(items))
+                items = []
+        else:
+            items.append(char)
+
+    if items:
+        mergeitems.append("".join(items))
+
+    opt = [item for item in mergeitems if not set(item).issubset(punds)]
+    return "\n".join(opt)
+
+
+def cut_text(text, how_to_cut):
+    """按webui的切句选项（i18n后的名字）切分，不认识的选项不切"""
+    cut_methods = {
+        i18n("凑四句一切"): cut1,
+        i18n("凑50字一切"): cut2,
+        i18n("按中文句号。切"): cut3,
+        i18n("按英文句号.切"): cut4,
+        i18n("按标点符号切"): cut5,
+    }
+    if how_to_cut in cut_methods:
+        text = cut_methods[how_to_cut](text)
+    return text
+
+
+def merge_short_text_in_array(texts, threshold):
+    if (len(texts)) < 2:
+        return texts
+    result = []
+    text = ""
+    for ele in texts:
+        text += ele
+        if len(text) >= threshold:
+            result.append(text)
+            text = ""
+    if len(text) > 0:
+        if len(result) == 0:
+            result.append(text)
+        else:
+            result[len(result) - 1] += text
+    return result
+
+
+def process_text(texts):
+    _text = []
+    if all(text in [None, " ", "\n", ""] for text in texts):
+        raise ValueError(i18n("请输入有效文本"))
+    for text in texts:
+        if text in [None, " ", ""]:
+            pass
+        else:
+            _text.append(text)
+    return _text
+
+
+def split_target_text(text, text_language, how_to_cut):
+    """get_tts_wav的切句：返回之后逐句送入文本前端的句子（已补句末标点），text_language为dict_language转换后的语种"""
+    text = cut_text(text.strip("\n"), how_to_cut)
+    while "\n\n" in text:
+        text = text.replace("\n\n", "\n")
+    sentences = []
+    for text in merge_short_text_in_array(process_text(text.split("\n")), 5):
+        # 解决输入目标文本的空行导致报错的问题
+        if len(text.strip()) == 0:
+            continue
+        if text[-1] not in splits:
+            text += "。" if text_language != "en" else "."
+        sentences.append(text)
+    return sentences
+
+
+def clean_text_inf(text, language, version):
+    language = language.replace("all_", "")
+    phones, word2ph, norm_text = clean_text(text, language, version)
+    phones = cleaned_text_to_sequence(phones, version)
+    return phones, word2ph, norm_text
+
+
+spec_min = -12
+spec_max = 2
+
+
+def norm_spec(x):
+    return (x - spec_min) / (spec_max - spec_min) * 2 - 1
+
+
+def denorm_spec(x):
+    return (x + 1) / 2 * (spec_max - spec_min) + spec_min
+
+
+mel_fn = lambda x: mel_spectrogram_torch(
+    x,
+    **{
+        "n_fft": 1024,
+        "win_size": 1024,
+        "hop_size": 256,
+        "num_mels": 100,
+        "sampling_rate": 24000,
+        "fmin": 0,
+        "fmax": None,
+        "center": False,
+    },
+)
+mel_fn_v4 = lambda x: mel_spectrogram_torch(
+    x,
+    **{
+        "n_fft": 1280,
+        "win_size": 1280,
+        "hop_size": 320,
+        "num_mels": 100,
+        "sampling_rate": 32000,
+        "fmin": 0,
+        "fmax": None,
+        "center": False,
+    },
+)
+
+
+class GPTSoVITSInference:
+    def __init__(
+        self,
+        device=None,
+        is_half=None,
+        bert_path=None,
+        cnhubert_base_path=None,
+        cpu_int8=False,
+        cpu_bf16=False,
+        t2s_cache_size=256,
+        text_feature_cache=None,
+    ):
+        """
+        device: 默认有CUDA用cuda，否则cpu
+        is_half: 默认在CUDA上用fp16；cpu上总是fp32
+        bert_path/cnhubert_base_path: 默认取环境变量bert_path/cnhubert_base_path，再默认pretrained_models下的模型
+        cpu_int8/cpu_bf16: 只在cpu上生效，见cpu_quantize.py
+        text_feature_cache: get_phones_and_bert的结果缓存，默认按环境变量新建，见text_feature_cache.py
+        """
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        if is_half is None:
+            is_half = str(self.device).startswith("cuda")
+        self.is_half = bool(is_half) and str(self.device) != "cpu"
+        self.dtype = torch.float16 if self.is_half == True else torch.float32
+        self.cpu_int8 = cpu_int8 and str(self.device) == "cpu"
+        self.cpu_bf16 = cpu_bf16 and str(self.device) == "cpu"
+        self.bert_path = resolve_path(
+            bert_path or os.environ.get("bert_path", "GPT_SoVITS/pretrained_models/chinese-roberta-wwm-ext-large")
+        )
+        self.cnhubert_base_path = resolve_path(
+            cnhubert_base_path
+            or os.environ.get("cnhubert_base_path", "GPT_SoVITS/pretrained_models/chinese-hubert-base")
+        )
+        self.i18n = i18n
+
+        self.tokenizer = None
+        self.bert_model = None
+        self.ssl_model = None
+        self.t2s_model = None
+        self.t2s_model_path = None
+        self.config = None
+        self.hz = 50
+        self.max_sec = None
+        self.vq_model = None
+        self.sovits_path = None
+        self.hps = None
+        self.version = self.model_version = "v2"
+        self.if_lora_v3 = False
+        self.dict_language = dict_language_v2
+        self.bigvgan_model = None
+        self.hifigan_model = None
+        self.sv_cn_model = None
+        self.sr_model = None
+        self.cache = SemanticTokenCache(t2s_cache_size)
+        self.text_feature_cache = text_feature_cache if text_feature_cache is not None else TextFeatureCache()
+        self.resample_transform_dict = {}
+
+    # ---------------- 模型加载 ----------------
+
+    def load_bert(self):
+        from transformers import AutoModelForMaskedLM, AutoTokenizer
+
+        if self.tokenizer is None:
+            self.tokenizer = AutoTokenizer.from_pretrained(self.bert_path)
+        bert_model = AutoModelForMaskedLM.from_pretrained(self.bert_path)
+        if self.is_half == True:
+            bert_model = bert_model.half().to(self.device)
+        else:
+            bert_model = bert_model.to(self.device)
+        if self.cpu_int8:
+            bert_model = quantize_bert_model(bert_model.eval())
+        self.bert_model = bert_model
+
+    def load_ssl(self):
+        from feature_extractor.cnhubert import CNHubert
+
+        ssl_model = CNHubert(self.cnhubert_base_path).eval()
+        if self.is_half == True:
+            ssl_model = ssl_model.half().to(self.device)
+        else:
+            ssl_model = ssl_model.to(self.device)
+        self.ssl_model = ssl_model
+
+    def load_gpt(self, gpt_path):
+        from AR.models.t2s_lightning_module import Text2SemanticLightningModule
+
+        if "！" in gpt_path or "!" in gpt_path:
+            gpt_path = name2gpt_path[gpt_path]
+        gpt_path = resolve_path(gpt_path)
+        dict_s1 = torch.load(gpt_path, map_location="cpu", weights_only=False)
+        config = dict_s1["config"]
+        t2s_model = Text2SemanticLightningModule(config, "****", is_train=False)
+        t2s_model.load_state_dict(dict_s1["weight"])
+        if self.is_half == True:
+            t2s_model = t2s_model.half()
+        t2s_model = t2s_model.to(self.device)
+        t2s_model.eval()
+        if self.cpu_int8:
+            quantize_t2s_model(t2s_model.model)
+        self.t2s_model = t2s_model
+        self.t2s_model_path = gpt_path
+        self.config = config
+        self.hz = 50
+        self.max_sec = config["data"]["max_sec"]
+        self.cache.clear()
+
+    def load_sovits(self, sovits_path):
+        from GPT_SoVITS.module.models import SynthesizerTrn, SynthesizerTrnV3
+        from peft import LoraConfig, get_peft_model
+
+        if "！" in sovits_path or "!" in sovits_path:
+            sovits_path = name2sovits_path[sovits_path]
+        sovits_path = resolve_path(sovits_path)
+        version, model_version, if_lora_v3 = get_sovits_version_from_path_fast(sovits_path)
+        print(sovits_path, version, model_version, if_lora_v3)
+        path_sovits = resolve_path(pretrained_sovits_name["v3" if model_version == "v3" else "v4"])
+        if if_lora_v3 == True and not os.path.exists(path_sovits):
+            raise FileNotFoundError(path_sovits + "SoVITS %s" % model_version + i18n("底模缺失，无法加载相应 LoRA 权重"))
+
+        dict_s2 = load_sovits_new(sovits_path)
+        hps = DictToAttrRecursive(dict_s2["config"])
+        hps.model.semantic_frame_rate = "25hz"
+        if "enc_p.text_embedding.weight" not in dict_s2["weight"]:
+            hps.model.version = "v2"  # v3model,v2sybomls
+        elif dict_s2["weight"]["enc_p.text_embedding.weight"].shape[0] == 322:
+            hps.model.version = "v1"
+        else:
+            hps.model.version = "v2"
+        version = hps.model.version
+        if model_version not in v3v4set:
+            if "Pro" not in model_version:
+                model_version = version
+            else:
+                hps.model.version = model_version
+            vq_model = SynthesizerTrn(
+                hps.data.filter_length // 2 + 1,
+                hps.train.segment_size // hps.data.hop_length,
+                n_speakers=hps.data.n_speakers,
+                **hps.model,
+            )
+        else:
+            hps.model.version = model_version
+            vq_model = SynthesizerTrnV3(
+                hps.data.filter_length // 2 + 1,
+                hps.train.segment_size // hps.data.hop_length,
+                n_speakers=hps.data.n_speakers,
+                **hps.model,
+            )
+        if "pretrained" not in sovits_path:
+            try:
+                del vq_model.enc_q
+            except:
+                pass
+        if self.is_half == True:
+            vq_model = vq_model.half().to(self.device)
+        else:
+            vq_model = vq_model.to(self.device)
+        vq_model.eval()
+        if if_lora_v3 == False:
+            print("loading sovits_%s" % model_version, vq_model.load_state_dict(dict_s2["weight"], strict=False))
+        else:
+            print(
+                "loading sovits_%spretrained_G" % model_version,
+                vq_model.load_state_dict(load_sovits_new(path_sovits)["weight"], strict=False),
+            )
+            lora_rank = dict_s2["lora_rank"]
+            lora_config = LoraConfig(
+                target_modules=["to_k", "to_q", "to_v", "to_out.0"],
+                r=lora_rank,
+                lora_alpha=lora_rank,
+                init_lora_weights=True,
+            )
+            vq_model.cfm = get_peft_model(vq_model.cfm, lora_config)
+            print("loading sovits_%s_lora%s" % (model_version, lora_rank))
+            vq_model.load_state_dict(dict_s2["weight"], strict=False)
+            vq_model.cfm = vq_model.cfm.merge_and_unload()
+            vq_model.eval()
+        if self.cpu_int8 and model_version not in v3v4set:
+            vq_model = quantize_text_encoder(vq_model)
+
+        self.vq_model = vq_model
+        self.sovits_path = sovits_path
+        self.hps = hps
+        self.version = version
+        self.model_version = model_version
+        self.if_lora_v3 = if_lora_v3
+        self.dict_language = dict_language_v1 if version == "v1" else dict_language_v2
+        # 换模型后只保留新模型需要的声码器/SV
+        if model_version != "v3":
+            self.clean_bigvgan_model()
+        if model_version != "v4":
+            self.clean_hifigan_model()
+        if model_version not in v2pro_set:
+            self.clean_sv_cn_model()
+
+    def init_bigvgan(self):
+        from BigVGAN import bigvgan
+
+        bigvgan_model = bigvgan.BigVGAN.from_pretrained(
+            "%s/GPT_SoVITS/pretrained_models/models--nvidia--bigvgan_v2_24khz_100band_256x" % (now_dir,),
+            use_cuda_kernel=False,
+        )  # if True, RuntimeError: Ninja is required to load C++ extensions
+        # remove weight norm in the model and set to eval mode
+        bigvgan_model.remove_weight_norm()
+        bigvgan_model = bigvgan_model.eval()
+        self.clean_hifigan_model()
+        self.clean_sv_cn_model()
+        if self.is_half == True:
+            self.bigvgan_model = bigvgan_model.half().to(self.device)
+        else:
+            self.bigvgan_model = bigvgan_model.to(self.device)
+
+    def init_hifigan(self):
+        from GPT_SoVITS.module.models import Generator
+
+        hifigan_model = Generator(
+            initial_channel=100,
+            resblock="1",
+            resblock_kernel_sizes=[3, 7, 11],
+            resblock_dilation_sizes=[[1, 3, 5], [1, 3, 5], [1, 3, 5]],
+            upsample_rates=[10, 6, 2, 2, 2],
+            upsample_initial_channel=512,
+            upsample_kernel_sizes=[20, 12, 4, 4, 4],
+            gin_channels=0,
+            is_bias=True,
+        )
+        hifigan_model.eval()
+        hifigan_model.remove_weight_norm()
+        state_dict_g = torch.load(
+            "%s/GPT_SoVITS/pretrained_models/gsv-v4-pretrained/vocoder.pth" % (now_dir,),
+            map_location="cpu",
+            weights_only=False,
+        )
+        print("loading vocoder", hifigan_model.load_state_dict(state_dict_g))
+        self.clean_bigvgan_model()
+        self.clean_sv_cn_model()
+        if self.is_half == True:
+            self.hifigan_model = hifigan_model.half().to(self.device)
+        else:
+            self.hifigan_model = hifigan_model.to(self.device)
+
+    def init_sv_cn(self):
+        from sv import SV
+
+        self.sv_cn_model = SV(self.device, self.is_half)
+        self.clean_bigvgan_model()
+        self.clean_hifigan_model()
+
+    def clean_hifigan_model(self):
+        if self.hifigan_model:
+            self.hifigan_model = self.hifigan_model.cpu()
+            self.hifigan_model = None
+            try:
+                torch.cuda.empty_cache()
+            except:
+                pass
+
+    def clean_bigvgan_model(self):
+        if self.bigvgan_model:
+            self.bigvgan_model = self.bigvgan_model.cpu()
+            self.bigvgan_model = None
+            try:
+                torch.cuda.empty_cache()
+            except:
+                pass
+
+    def clean_sv_cn_model(self):
+        if self.sv_cn_model:
+            self.sv_cn_model.embedding_model = self.sv_cn_model.embedding_model.cpu()
+            self.sv_cn_model = None
+            try:
+                torch.cuda.empty_cache()
+            except:
+                pass
+
+    # ---------------- 前端 ----------------
+
+    def get_bert_feature(self, text, word2ph):
+        if self.bert_model is None:
+            self.load_bert()
+        with torch.no_grad(), cpu_autocast(self.cpu_bf16):
+            inputs = self.tokenizer(text, return_tensors="pt")
+            for i in inputs:
+                inputs[i] = inputs[i].to(self.device)
+            res = self.bert_model(**inputs, output_hidden_states=True)
+            res = torch.cat(res["hidden_states"][-3:-2], -1)[0].cpu()[1:-1].float()
+        assert len(word2ph) == len(text)
+        phone_level_feature = res.repeat_interleave(torch.tensor(word2ph), dim=0)
+        return phone_level_feature.T
+
+    def get_bert_inf(self, phones, word2ph, norm_text, language):
+        language = language.replace("all_", "")
+        if language == "zh":
+            bert = self.get_bert_feature(norm_text, word2ph).to(self.device)  # .to(dtype)
+        else:
+            bert = torch.zeros((1024, len(phones)), dtype=self.dtype).to(self.device)
+        return bert
+
+    def _feature_key(self, text, language, version):
+        return TextFeatureCache.make_key(
+            text, language, version, self.bert_path, bert_precision(self.dtype, self.cpu_int8, self.cpu_bf16)
+        )
+
+    def get_phones_and_bert(self, text, language, version, final=False):
+        if not self.text_feature_cache.enabled:
+            phones, word2ph, bert, norm_text = self.extract_phones_and_bert(text, language, version, final)
+            return phones, bert.to(self.dtype), norm_text
+        key = self._feature_key(text, language, version)
+        cached = self.text_feature_cache.get(key)
+        if cached is None:
+            phones, word2ph, bert, norm_text = self.extract_phones_and_bert(text, language, version, final)
+            cached = self.text_feature_cache.put(key, phones, word2ph, norm_text, bert)
+        return cached["phones"], cached["bert"].to(self.device, self.dtype), cached["norm_text"]
+
+    def prefetch_g2pw(self, texts, text_language, how_to_cut=i18n("不切"), version=None):
+        """
+        对之后要逐条传给get_tts_wav的一批文本（如同一说话人的所有台词）一次性做G2PW批量推理，
+        text_language/how_to_cut与get_tts_wav相同；version默认为已加载的SoVITS权重的版本
+        """
+        language = self.dict_language[text_language]
+        sentences = []
+        for text in texts:
+            if text.strip():
+                sentences.extend(split_target_text(text, language, how_to_cut))
+        self.prefetch_sentences(sentences, language, version or self.version)
+
+    def prefetch_sentences(self, sentences, language, version):
+        """
+        sentences是之后逐句传给get_phones_and_bert的句子，language为dict_language转换后的语种。
+        中文片段按extract_phones_and_bert的方式切分后一起交给G2PW，G2P时直接命中G2PW缓存；特征缓存已命中的句子跳过
+        """
+        # v1的zh走text.chinese，没有G2PW
+        if version == "v1":
+            return
+        zh_texts = []
+        cache = self.text_feature_cache
+        for text in sentences:
+            if cache.enabled and self._feature_key(text, language, version) in cache:
+                continue
+            textlist, langlist = self.segment_languages(re.sub(r" {2,}", " ", text), language)
+            zh_texts.extend(segment for segment, lang in zip(textlist, langlist) if lang.replace("all_", "") == "zh")
+        if len(zh_texts) > 1:
+            from text import chinese2
+
+            chinese2.prefetch_g2pw(zh_texts)
+
+    def segment_languages(self, text, language):
+        textlist = []
+        langlist = []
+        if language == "all_zh":
+            for tmp in LangSegmenter.getTexts(text, "zh"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_yue":
+            for tmp in LangSegmenter.getTexts(text, "zh"):
+                if tmp["lang"] == "zh":
+                    tmp["lang"] = "yue"
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_ja":
+            for tmp in LangSegmenter.getTexts(text, "ja"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_ko":
+            for tmp in LangSegmenter.getTexts(text, "ko"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "en":
+            langlist.append("en")
+            textlist.append(text)
+        elif language == "auto":
+            for tmp in LangSegmenter.getTexts(text):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "auto_yue":
+            for tmp in LangSegmenter.getTexts(text):
+                if tmp["lang"] == "zh":
+                    tmp["lang"] = "yue"
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        else:
+            for tmp in LangSegmenter.getTexts(text):
+                if langlist:
+                    if (tmp["lang"] == "en" and langlist[-1] == "en") or (tmp["lang"] != "en" and langlist[-1] != "en"):
+                        textlist[-1] += tmp["text"]
+                        continue
+                if tmp["lang"] == "en":
+                    langlist.append(tmp["lang"])
+                else:
+                    # 因无法区别中日韩文汉字,以用户输入为准
+                    langlist.append(language)
+                textlist.append(tmp["text"])
+        return textlist, langlist
+
+    def extract_phones_and_bert(self, text, language, version, final=False):
+        """不经过缓存的文本前端，返回phones, 每个语种片段的word2ph, bert, norm_text"""
+        text = re.sub(r" {2,}", " ", text)
+        textlist, langlist = self.segment_languages(text, language)
+        print(textlist)
+        print(langlist)
+        phones_list = []
+        word2ph_list = []
+        bert_list = []
+        norm_text_list = []
+        for i in range(len(textlist)):
+            lang = langlist[i]
+            phones, word2ph, norm_text = clean_text_inf(textlist[i], lang, version)
+            bert = self.get_bert_inf(phones, word2ph, norm_text, lang)
+            phones_list.append(phones)
+            word2ph_list.append(word2ph)
+            norm_text_list.append(norm_text)
+            bert_list.append(bert)
+        bert = torch.cat(bert_list, dim=1)
+        phones = sum(phones_list, [])
+        norm_text = "".join(norm_text_list)
+
+        if not final and len(phones) < 6:
+            return self.extract_phones_and_bert("." + text, language, version, final=True)
+
+        return phones, word2ph_list, bert, norm_text
+
+    def get_ssl_content(self, wav16k):
+        """wav16k: [T]的16k音频（已补静音），返回[1, 768, T']的cnhubert特征"""
+        if self.ssl_model is None:
+            self.load_ssl()
+        return self.ssl_model.model(wav16k.unsqueeze(0))["last_hidden_state"].transpose(1, 2)
+
+    def resample(self, audio_tensor, sr0, sr1, device):
+        key = "%s-%s-%s" % (sr0, sr1, str(device))
+        if key not in self.resample_transform_dict:
+            self.resample_transform_dict[key] = torchaudio.transforms.Resample(sr0, sr1).to(device)
+        return self.resample_transform_dict[key](audio_tensor)
+
+    def get_spepc(self, hps, filename, dtype, device, is_v2pro=False):
+        sr1 = int(hps.data.sampling_rate)
+        audio, sr0 = torchaudio.load(filename)
+        if sr0 != sr1:
+            audio = audio.to(device)
+            if audio.shape[0] == 2:
+                audio = audio.mean(0).unsqueeze(0)
+            audio = self.resample(audio, sr0, sr1, device)
+        else:
+            audio = audio.to(device)
+            if audio.shape[0] == 2:
+                audio = audio.mean(0).unsqueeze(0)
+
+        maxx = audio.abs().max()
+        if maxx > 1:
+            audio /= min(2, maxx)
+        spec = spectrogram_torch(
+            audio,
+            hps.data.filter_length,
+            hps.data.sampling_rate,
+            hps.data.hop_length,
+            hps.data.win_length,
+            center=False,
+        )
+        spec = spec.to(dtype)
+        if is_v2pro == True:
+            audio = self.resample(audio, sr1, 16000, device).to(dtype)
+        return spec, audio
+
+    def audio_sr(self, audio, sr):
+        if self.sr_model == None:
+            from tools.audio_sr import AP_BWE
+
+            try:
+                self.sr_model = AP_BWE(self.device, DictToAttrRecursive)
+            except FileNotFoundError:
+                print(i18n("你没有下载超分模型的参数，因此不进行超分。如想超分请先参照教程把文件下载好"))
+                return audio.cpu().detach().numpy(), sr
+        return self.sr_model(audio, sr)
+
+    # ---------------- 合成 ----------------
+
+    def get_tts_wav(
+        self,
+        ref_wav_path,
+        prompt_text,
+        prompt_language,
+        text,
+        text_language,
+        how_to_cut=i18n("不切"),
+        top_k=20,
+        top_p=0.6,
+        temperature=0.6,
+        ref_free=False,
+        speed=1,
+        if_freeze=False,
+        inp_refs=None,
+        sample_steps=8,
+        if_sr=False,
+        pause_second=0.3,
+        prompt_cache=None,
+    ):
+        """
+        参数与inference_webui.get_tts_wav相同，inp_refs可以是路径或带.name的文件对象。
+        prompt_cache: 调用方持有的dict，缓存同一参考音频的prompt特征（prompt_semantic、参考文本的phones/bert、refers、sv_emb）
+        """
+        if self.t2s_model is None or self.vq_model is None:
+            raise RuntimeError("GPT and SoVITS weights must be loaded with load_gpt/load_sovits before synthesis")
+        if not ref_wav_path:
+            raise ValueError(i18n("请上传参考音频"))
+        if not text:
+            raise ValueError(i18n("请填入推理文本"))
+        if prompt_cache is None:
+            prompt_cache = {}
+        device, dtype, hps, vq_model = self.device, self.dtype, self.hps, self.vq_model
+        model_version, version = self.model_version, self.version
+        t = []
+        if prompt_text is None or len(prompt_text) == 0:
+            ref_free = True
+        if model_version in v3v4set:
+            ref_free = False  # s2v3暂不支持ref_free
+        else:
+            if_sr = False
+        if model_version not in v3v4set | v2pro_set:
+            self.clean_bigvgan_model()
+            self.clean_hifigan_model()
+            self.clean_sv_cn_model()
+        t0 = ttime()
+        prompt_language = self.dict_language[prompt_language]
+        text_language = self.dict_language[text_language]
+
+        if not ref_free:
+            prompt_text = prompt_text.strip("\n")
+            if prompt_text[-1] not in splits:
+                prompt_text += "。" if prompt_language != "en" else "."
+            print(i18n("实际输入的参考文本:"), prompt_text)
+        text = text.strip("\n")
+
+        print(i18n("实际输入的目标文本:"), text)
+        zero_wav = np.zeros(
+            int(hps.data.sampling_rate * pause_second),
+            dtype=np.float16 if self.is_half == True else np.float32,
+        )
+        zero_wav_torch = torch.from_numpy(zero_wav)
+        if self.is_half == True:
+            zero_wav_torch = zero_wav_torch.half().to(device)
+        else:
+            zero_wav_torch = zero_wav_torch.to(device)
+        if not ref_free and "prompt_semantic" in prompt_cache:
+            prompt = prompt_cache["prompt_semantic"].to(device).unsqueeze(0)
+        elif not ref_free:
+            with torch.no_grad():
+                wav16k, sr = librosa.load(ref_wav_path, sr=16000)
+                if wav16k.shape[0] > 160000 or wav16k.shape[0] < 48000:
+                    raise OSError(i18n("参考音频在3~10秒范围外，请更换！"))
+                wav16k = torch.from_numpy(wav16k)
+                if self.is_half == True:
+                    wav16k = wav16k.half().to(device)
+                else:
+                    wav16k = wav16k.to(device)
+                wav16k = torch.cat([wav16k, zero_wav_torch])
+                ssl_content = self.get_ssl_content(wav16k)
+                codes = vq_model.extract_latent(ssl_content)
+                prompt_semantic = codes[0, 0]
+                prompt = prompt_semantic.unsqueeze(0).to(device)
+                prompt_cache["prompt_semantic"] = prompt_semantic
+
+        t1 = ttime()
+        t.append(t1 - t0)
+
+        texts = split_target_text(text, text_language, how_to_cut)
+        print(i18n("实际输入的目标文本(切句后):"), texts)
+        # 所有句子的中文片段一次批量做G2PW，逐句的前端直接命中缓存
+        self.prefetch_sentences(texts, text_language, version)
+        audio_opt = []
+        ###s2v3暂不支持ref_free
+        if not ref_free and "phones" in prompt_cache:
+            phones1, bert1, norm_text1 = prompt_cache["phones"], prompt_cache["bert"].to(device), prompt_cache["norm_text"]
+        elif not ref_free:
+            phones1, bert1, norm_text1 = self.get_phones_and_bert(prompt_text, prompt_language, version)
+            prompt_cache.update(phones=phones1, bert=bert1, norm_text=norm_text1)
+
+        for i_text, text in enumerate(texts):
+            print(i18n("实际输入的目标文本(每句):"), text)
+            phones2, bert2, norm_text2 = self.get_phones_and_bert(text, text_language, version)
+            print(i18n("前端处理后的文本(每句):"), norm_text2)
+            if not ref_free:
+                bert = torch.cat([bert1, bert2], 1)
+                all_phoneme_ids = torch.LongTensor(phones1 + phones2).to(device).unsqueeze(0)
+            else:
+                bert = bert2
+                all_phoneme_ids = torch.LongTensor(phones2).to(device).unsqueeze(0)
+
+            bert = bert.to(device).unsqueeze(0)
+            all_phoneme_len = torch.tensor([all_phoneme_ids.shape[-1]]).to(device)
+
+            t2 = ttime()
+            cache_key = SemanticTokenCache.make_key(
+                None if ref_free else prompt,
+                None if ref_free else phones1,
+                phones2,
+                norm_text2,
+                top_k,
+                top_p,
+                temperature,
+                self.t2s_model_path,
+            )
+            pred_semantic = self.cache.get(cache_key) if if_freeze == True else None
+            if pred_semantic is None:
+                with torch.no_grad(), cpu_autocast(self.cpu_bf16):
+                    pred_semantic, idx = self.t2s_model.model.infer_panel(
+                        all_phoneme_ids,
+                        all_phoneme_len,
+                        None if ref_free else prompt,
+                        bert,
+                        top_k=top_k,
+                        top_p=top_p,
+                        temperature=temperature,
+                        early_stop_num=self.hz * self.max_sec,
+                    )
+                    pred_semantic = pred_semantic[:, -idx:].unsqueeze(0)
+                    self.cache.put(cache_key, pred_semantic)
+            t3 = ttime()
+            is_v2pro = model_version in v2pro_set
+            ###v3不存在以下逻辑和inp_refs
+            if model_version not in v3v4set and "refers" in prompt_cache:
+                refers = [refer.to(device) for refer in prompt_cache["refers"]]
+                if is_v2pro:
+                    sv_emb = [emb.to(device) for emb in prompt_cache["sv_emb"]]
+            elif model_version not in v3v4set:
+                refers = []
+                if is_v2pro:
+                    sv_emb = []
+                    if self.sv_cn_model == None:
+                        self.init_sv_cn()
+                if inp_refs:
+                    for path in inp_refs:
+                        try:  #####这里加上提取sv的逻辑，要么一堆sv一堆refer，要么单个sv单个refer
+                            refer, audio_tensor = self.get_spepc(hps, getattr(path, "name", path), dtype, device, is_v2pro)
+                            refers.append(refer)
+                            if is_v2pro:
+                                sv_emb.append(self.sv_cn_model.compute_embedding3(audio_tensor))
+                        except:
+                            traceback.print_exc()
+                if len(refers) == 0:
+                    refers, audio_tensor = self.get_spepc(hps, ref_wav_path, dtype, device, is_v2pro)
+                    refers = [refers]
+                    if is_v2pro:
+                        sv_emb = [self.sv_cn_model.compute_embedding3(audio_tensor)]
+                prompt_cache["refers"] = refers
+                if is_v2pro:
+                    prompt_cache["sv_emb"] = sv_emb
+            if model_version not in v3v4set:
+                with cpu_autocast(self.cpu_bf16):
+                    if is_v2pro:
+                        audio = vq_model.decode(
+                            pred_semantic,
+                            torch.LongTensor(phones2).to(device).unsqueeze(0),
+                            refers,
+                            speed=speed,
+                            sv_emb=sv_emb,
+                        )[0][0]
+                    else:
+                        audio = vq_model.decode(
+                            pred_semantic, torch.LongTensor(phones2).to(device).unsqueeze(0), refers, speed=speed
+                        )[0][0]
+                if self.cpu_bf16:
+                    audio = audio.float()
+            else:
+                refer, audio_tensor = self.get_spepc(hps, ref_wav_path, dtype, device)
+                phoneme_ids0 = torch.LongTensor(phones1).to(device).unsqueeze(0)
+                phoneme_ids1 = torch.LongTensor(phones2).to(device).unsqueeze(0)
+                fea_ref, ge = vq_model.decode_encp(prompt.unsqueeze(0), phoneme_ids0, refer)
+                ref_audio, sr = torchaudio.load(ref_wav_path)
+                ref_audio = ref_audio.to(device).float()
+                if ref_audio.shape[0] == 2:
+                    ref_audio = ref_audio.mean(0).unsqueeze(0)
+                tgt_sr = 24000 if model_version == "v3" else 32000
+                if sr != tgt_sr:
+                    ref_audio = self.resample(ref_audio, sr, tgt_sr, device)
+                mel2 = mel_fn(ref_audio) if model_version == "v3" else mel_fn_v4(ref_audio)
+                mel2 = norm_spec(mel2)
+                T_min = min(mel2.shape[2], fea_ref.shape[2])
+                mel2 = mel2[:, :, :T_min]
+                fea_ref = fea_ref[:, :, :T_min]
+                Tref = 468 if model_version == "v3" else 500
+                Tchunk = 934 if model_version == "v3" else 1000
+                if T_min > Tref:
+                    mel2 = mel2[:, :, -Tref:]
+                    fea_ref = fea_ref[:, :, -Tref:]
+                    T_min = Tref
+                chunk_len = Tchunk - T_min
+                mel2 = mel2.to(dtype)
+                fea_todo, ge = vq_model.decode_encp(pred_semantic, phoneme_ids1, refer, ge, speed)
+                cfm_resss = []
+                idx = 0
+                while 1:
+                    fea_todo_chunk = fea_todo[:, :, idx : idx + chunk_len]
+                    if fea_todo_chunk.shape[-1] == 0:
+                        break
+                    idx += chunk_len
+                    fea = torch.cat([fea_ref, fea_todo_chunk], 2).transpose(2, 1)
+                    cfm_res = vq_model.cfm.inference(
+                        fea, torch.LongTensor([fea.size(1)]).to(fea.device), mel2, sample_steps, inference_cfg_rate=0
+                    )
+                    cfm_res = cfm_res[:, :, mel2.shape[2] :]
+                    mel2 = cfm_res[:, :, -T_min:]
+                    fea_ref = fea_todo_chunk[:, :, -T_min:]
+                    cfm_resss.append(cfm_res)
+                cfm_res = torch.cat(cfm_resss, 2)
+                cfm_res = denorm_spec(cfm_res)
+                if model_version == "v3":
+                    if self.bigvgan_model == None:
+                        self.init_bigvgan()
+                else:  # v4
+                    if self.hifigan_model == None:
+                        self.init_hifigan()
+                vocoder_model = self.bigvgan_model if model_version == "v3" else self.hifigan_model
+                with torch.inference_mode():
+                    wav_gen = vocoder_model(cfm_res)
+                    audio = wav_gen[0][0]
+            max_audio = torch.abs(audio).max()  # 简单防止16bit爆音
+            if max_audio > 1:
+                audio = audio / max_audio
+            audio_opt.append(audio)
+            audio_opt.append(zero_wav_torch)  # zero_wav
+            t4 = ttime()
+            t.extend([t2 - t1, t3 - t2, t4 - t3])
+            t1 = ttime()
+        print("%.3f\t%.3f\t%.3f\t%.3f" % (t[0], sum(t[1::3]), sum(t[2::3]), sum(t[3::3])))
+        audio_opt = torch.cat(audio_opt, 0)  # np.concatenate
+        if model_version in {"v1", "v2", "v2Pro", "v2ProPlus"}:
+            opt_sr = 32000
+        elif model_version == "v3":
+            opt_sr = 24000
+        else:
+            opt_sr = 48000  # v4
+        if if_sr == True and opt_sr == 24000:
+            print(i18n("音频超分中"))
+            audio_opt, opt_sr = self.audio_sr(audio_opt.unsqueeze(0), opt_sr)
+            max_audio = np.abs(audio_opt).max()
+            if max_audio > 1:
+                audio_opt /= max_audio
+        else:
+            audio_opt = audio_opt.cpu().detach().numpy()
+        yield opt_sr, (audio_opt * 32767).astype(np.int16)
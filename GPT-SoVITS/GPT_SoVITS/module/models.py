@@ -223,13 +223,29 @@ class TextEncoder(nn.Module):
         text = self.encoder_text(text * text_mask, text_mask)
         y = self.mrte(y, y_mask, text, text_mask, ge)
         y = self.encoder2(y * y_mask, y_mask)
-        if speed != 1:
+        if isinstance(speed, (list, tuple)):
+            y, y_mask = self.interpolate_batched(y, y_lengths, speed)
+        elif speed != 1:
             y = F.interpolate(y, size=int(y.shape[-1] / speed) + 1, mode="linear")
             y_mask = F.interpolate(y_mask, size=y.shape[-1], mode="nearest")
         stats = self.proj(y) * y_mask
         m, logs = torch.split(stats, self.out_channels, dim=1)
         return y, m, logs, y_mask
 
+    def interpolate_batched(self, y, y_lengths, speeds):
+        """按每条样本自己的语速拉伸有效部分，重新右侧补零并生成新的mask"""
+        items = []
+        for i, speed in enumerate(speeds):
+            item = y[i : i + 1, :, : int(y_lengths[i])]
+            if speed != 1:
+                item = F.interpolate(item, size=int(item.shape[-1] / speed) + 1, mode="linear")
+            items.append(item)
+        new_lengths = torch.LongTensor([item.shape[-1] for item in items]).to(y.device)
+        max_len = int(new_lengths.max())
+        y = torch.cat([F.pad(item, (0, max_len - item.shape[-1])) for item in items], 0)
+        y_mask = torch.unsqueeze(commons.sequence_mask(new_lengths, max_len), 1).to(y.dtype)
+        return y, y_mask
+
     def extract_latent(self, x):
         x = self.ssl_proj(x)
         quantized, codes, commit_loss, quantized_list = self.quantizer(x)
@@ -958,7 +974,7 @@ class SynthesizerTrn(nn.Module):
         return o, y_mask, (z, z_p, m_p, logs_p)
 
     @torch.no_grad()
-    def decode(self, codes, text, refer, noise_scale=0.5, speed=1, sv_emb=None):
+    def get_ge(self, refer, sv_emb=None):
         def get_ge(refer, sv_emb):
             ge = None
             if refer is not None:
@@ -982,6 +998,11 @@ class SynthesizerTrn(nn.Module):
             ge = torch.stack(ges, 0).mean(0)
         else:
             ge = get_ge(refer, sv_emb)
+        return ge
+
+    @torch.no_grad()
+    def decode(self, codes, text, refer, noise_scale=0.5, speed=1, sv_emb=None):
+        ge = self.get_ge(refer, sv_emb)
 
         y_lengths = torch.LongTensor([codes.size(2) * 2]).to(codes.device)
         text_lengths = torch.LongTensor([text.size(-1)]).to(text.device)
@@ -1004,6 +1025,41 @@ class SynthesizerTrn(nn.Module):
         o = self.dec((z * y_mask)[:, :, :], g=ge)
         return o
 
+    @torch.no_grad()
+    def batched_decode(self, codes, codes_lengths, text, text_lengths, refer, noise_scale=0.5, speed=1, sv_emb=None):
+        """
+        codes: [1, B, T] 右侧补零的semantic token, text: [B, L] 右侧补零的phone id
+        speed: 所有样本相同的语速，或每条样本一个语速的list
+        返回每条样本各自长度的音频片段list
+        """
+        ge = self.get_ge(refer, sv_emb)
+        batch_size = codes.size(1)
+        if not isinstance(speed, (list, tuple)):
+            speed = [speed] * batch_size
+
+        y_lengths = codes_lengths * 2
+        quantized = self.quantizer.decode(codes)
+        if self.semantic_frame_rate == "25hz":
+            quantized = F.interpolate(quantized, size=int(quantized.shape[-1] * 2), mode="nearest")
+        if ge is not None:
+            ge = ge.expand(batch_size, -1, -1)
+        x, m_p, logs_p, y_mask = self.enc_p(
+            quantized,
+            y_lengths,
+            text,
+            text_lengths,
+            self.ge_to512(ge.transpose(2, 1)).transpose(2, 1) if self.is_v2pro else ge,
+            list(speed),
+        )
+        z_p = m_p + torch.randn_like(m_p) * torch.exp(logs_p) * noise_scale
+
+        z = self.flow(z_p, y_mask, g=ge, reverse=True)
+
+        o = self.dec((z * y_mask)[:, :, :], g=ge)
+        upsample_rate = math.prod(self.upsample_rates)
+        frame_lengths = y_mask.sum(dim=(1, 2)).long().tolist()
+        return [o[i, 0, : frame_lengths[i] * upsample_rate] for i in range(batch_size)]
+
     def extract_latent(self, x):
         ssl = self.ssl_proj(x)
         quantized, codes, commit_loss, quantized_list = self.quantizer(ssl)
@@ -0,0 +1,567 @@
+"""
+v2Pro/v2ProPlus 导出ONNX，供onnx_runtime_v2pro.py推理使用（在GPT-SoVITS根目录下运行）
+
+python GPT_SoVITS/onnx_export_v2pro.py --gpt_model GPT_weights_v2Pro/xxx.ckpt \
+    --sovits_model SoVITS_weights_v2Pro/xxx.pth --output_dir onnx/xxx
+python GPT_SoVITS/onnx_export_v2pro.py ... --check      # 导出后与PyTorch推理路径逐模块对比
+
+导出的模型：
+    t2s_encoder     参考/目标phones+BERT+参考音频SSL特征 -> T2S输入x、参考semantic
+    t2s_first_step  首步（整个prompt），输出logits和KV cache
+    t2s_step        单步KV cache解码，输出logits和KV cache
+    sv              ERes2NetV2说话人向量（输入80维fbank）
+    vits_ref        参考音频+说话人向量 -> ge
+    vits            semantic+phones+ge -> 音频（speed、noise_scale为输入）
+采样（top_k/top_p/temperature/重复惩罚）不在图里，由runtime用numpy完成，采样参数不需要在导出时固定
+"""
+
+import argparse
+import json
+import os
+
+import torch
+from torch import nn
+from torch.nn import functional as F
+
+from AR.models.t2s_lightning_module_onnx import Text2SemanticLightningModule
+from module.models_onnx import SynthesizerTrn
+from process_ckpt import get_sovits_version_from_path_fast, load_sovits_new
+
+v2pro_set = {"v2Pro", "v2ProPlus"}
+
+
+class DictToAttrRecursive(dict):
+    def __init__(self, input_dict):
+        super().__init__(input_dict)
+        for key, value in input_dict.items():
+            if isinstance(value, dict):
+                value = DictToAttrRecursive(value)
+            self[key] = value
+            setattr(self, key, value)
+
+    def __getattr__(self, item):
+        try:
+            return self[item]
+        except KeyError:
+            raise AttributeError(f"Attribute {item} not found")
+
+    def __setattr__(self, key, value):
+        if isinstance(value, dict):
+            value = DictToAttrRecursive(value)
+        super(DictToAttrRecursive, self).__setitem__(key, value)
+        super().__setattr__(key, value)
+
+
+def spectrogram(y, window, n_fft, hop_size, win_size):
+    y = F.pad(y.unsqueeze(1), (int((n_fft - hop_size) / 2), int((n_fft - hop_size) / 2)), mode="reflect").squeeze(1)
+    spec = torch.stft(
+        y,
+        n_fft,
+        hop_length=hop_size,
+        win_length=win_size,
+        window=window,
+        center=False,
+        pad_mode="reflect",
+        normalized=False,
+        onesided=True,
+        return_complex=False,
+    )
+    return torch.sqrt(spec.pow(2).sum(-1) + 1e-8)
+
+
+def interpolate_linear(y, speed):
+    """等价于F.interpolate(y, size=int(T / speed) + 1, mode="linear")，speed==1时不变；speed是张量，导出后可变"""
+    speed = speed[0]
+    in_len = torch.ones_like(y[0, 0]).sum()
+    out_len = torch.where(speed == 1, in_len, torch.floor(in_len / speed) + 1)
+    dst = torch.arange(out_len.long()).to(y.dtype)
+    src = ((dst + 0.5) * in_len / out_len - 0.5).clamp(min=0)
+    i0 = src.floor()
+    lam = (src - i0).view(1, 1, -1)
+    i0 = i0.long()
+    i1 = torch.minimum(i0 + 1, (in_len - 1).long())
+    return torch.index_select(y, 2, i0) * (1 - lam) + torch.index_select(y, 2, i1) * lam
+
+
+class T2SEncoder(nn.Module):
+    def __init__(self, t2s, vq_model):
+        super().__init__()
+        self.encoder = t2s.onnx_encoder
+        self.vq_model = vq_model
+
+    def forward(self, ref_seq, text_seq, ref_bert, text_bert, ssl_content):
+        # [1,N] [1,N] [1024,N] [1024,N] [1,768,T]
+        codes = self.vq_model.extract_latent(ssl_content)
+        prompts = codes[0, 0].unsqueeze(0)
+        bert = torch.cat([ref_bert, text_bert], 1).unsqueeze(0)
+        all_phoneme_ids = torch.cat([ref_seq, text_seq], 1)
+        return self.encoder(all_phoneme_ids, bert), prompts
+
+
+class T2SFirstStep(nn.Module):
+    """同AR.models.t2s_model_onnx.T2SFirstStageDecoder，但只输出logits不采样"""
+
+    def __init__(self, t2s):
+        super().__init__()
+        self.ar_audio_embedding = t2s.ar_audio_embedding
+        self.ar_audio_position = t2s.ar_audio_position
+        self.h = t2s.h
+        self.ar_predict_layer = t2s.ar_predict_layer
+        self.num_layers = t2s.num_layers
+        self.model_dim = t2s.model_dim
+
+    def forward(self, x, prompts):
+        x_example = x[:, :, 0] * 0.0
+        cache = {
+            "all_stage": self.num_layers,
+            "k": None,
+            "v": None,
+            "y_emb": None,
+            "first_infer": 1,
+            "stage": 0,
+        }
+        y_emb = self.ar_audio_embedding(prompts)
+        y_pos = self.ar_audio_position(y_emb)
+        xy_pos = torch.concat([x, y_pos], dim=1)
+
+        y_example = y_pos[:, :, 0] * 0.0
+        x_attn_mask = torch.matmul(x_example.transpose(0, 1), x_example).bool()
+        y_attn_mask = torch.ones_like(torch.matmul(y_example.transpose(0, 1), y_example), dtype=torch.int64)
+        y_attn_mask = torch.cumsum(y_attn_mask, dim=1) - torch.cumsum(
+            torch.ones_like(y_example.transpose(0, 1), dtype=torch.int64), dim=0
+        )
+        y_attn_mask = y_attn_mask > 0
+        x_y_pad = torch.matmul(x_example.transpose(0, 1), y_example).bool()
+        y_x_pad = torch.matmul(y_example.transpose(0, 1), x_example).bool()
+        x_attn_mask_pad = torch.cat([x_attn_mask, torch.ones_like(x_y_pad)], dim=1)
+        y_attn_mask = torch.cat([y_x_pad, y_attn_mask], dim=1)
+        xy_attn_mask = torch.concat([x_attn_mask_pad, y_attn_mask], dim=0)
+        cache["k"] = (
+            torch.matmul(x_attn_mask_pad[0].float().unsqueeze(-1), torch.zeros((1, self.model_dim)))
+            .unsqueeze(1)
+            .repeat(self.num_layers, 1, 1, 1)
+        )
+        cache["v"] = (
+            torch.matmul(x_attn_mask_pad[0].float().unsqueeze(-1), torch.zeros((1, self.model_dim)))
+            .unsqueeze(1)
+            .repeat(self.num_layers, 1, 1, 1)
+        )
+
+        xy_dec = self.h(xy_pos, mask=xy_attn_mask, cache=cache)
+        logits = self.ar_predict_layer(xy_dec[:, -1])
+        return logits, cache["k"], cache["v"], y_emb, x_example
+
+
+class T2SStep(nn.Module):
+    """同AR.models.t2s_model_onnx.T2SStageDecoder，输入上一步的token，只输出logits不采样"""
+
+    def __init__(self, t2s):
+        super().__init__()
+        self.ar_audio_embedding = t2s.ar_audio_embedding
+        self.ar_audio_position = t2s.ar_audio_position
+        self.h = t2s.h
+        self.ar_predict_layer = t2s.ar_predict_layer
+        self.num_layers = t2s.num_layers
+
+    def forward(self, token, k, v, y_emb, x_example):
+        cache = {
+            "all_stage": self.num_layers,
+            "k": F.pad(k, (0, 0, 0, 0, 0, 1)),
+            "v": F.pad(v, (0, 0, 0, 0, 0, 1)),
+            "y_emb": y_emb,
+            "first_infer": 0,
+            "stage": 0,
+        }
+        y_emb = torch.cat([y_emb, self.ar_audio_embedding(token)], 1)
+        y_pos = self.ar_audio_position(y_emb)
+        xy_pos = y_pos[:, -1:]
+        y_example = y_pos[:, :, 0] * 0.0
+        xy_attn_mask = torch.zeros_like(torch.cat([x_example, y_example], dim=1), dtype=torch.bool)
+
+        xy_dec = self.h(xy_pos, mask=xy_attn_mask, cache=cache)
+        logits = self.ar_predict_layer(xy_dec[:, -1])
+        return logits, cache["k"], cache["v"], y_emb
+
+
+class SVEmbedding(nn.Module):
+    def __init__(self, embedding_model):
+        super().__init__()
+        self.embedding_model = embedding_model
+
+    def forward(self, fbank):
+        # [1,T,80]，fbank在runtime里算（kaldi.fbank），与sv.SV.compute_embedding3一致
+        return self.embedding_model.forward3(fbank)
+
+
+class VitsRefEncoder(nn.Module):
+    def __init__(self, vq_model, hps):
+        super().__init__()
+        self.vq_model = vq_model
+        self.filter_length = hps.data.filter_length
+        self.hop_length = hps.data.hop_length
+        self.win_length = hps.data.win_length
+        self.register_buffer("hann_window", torch.hann_window(hps.data.win_length), persistent=False)
+
+    def forward(self, ref_audio, sv_emb):
+        # [1,T]（hps.data.sampling_rate） [1,20480]
+        refer = spectrogram(ref_audio, self.hann_window, self.filter_length, self.hop_length, self.win_length)
+        refer_mask = torch.ones_like(refer[:1, :1, :])
+        ge = self.vq_model.ref_enc(refer[:, :704] * refer_mask, refer_mask)
+        ge = ge + self.vq_model.sv_emb(sv_emb).unsqueeze(-1)
+        return self.vq_model.prelu(ge)
+
+
+class VitsDecoder(nn.Module):
+    """module.models_onnx.SynthesizerTrn.forward去掉参考编码部分，speed和noise_scale作为输入"""
+
+    def __init__(self, vq_model):
+        super().__init__()
+        self.vq_model = vq_model
+
+    def forward(self, text_seq, pred_semantic, ge, speed, noise_scale):
+        # [1,N] [1,1,T] [1,gin,1] [1] [1]
+        vq_model = self.vq_model
+        enc_p = vq_model.enc_p
+        quantized = vq_model.quantizer.decode(pred_semantic)
+        quantized = torch.cat([quantized, quantized]).permute(1, 2, 0).contiguous().view(1, vq_model.ssl_dim, -1)
+        ge_512 = vq_model.ge_to512(ge.transpose(2, 1)).transpose(2, 1)
+
+        y = quantized
+        y_mask = torch.ones_like(y[:1, :1, :])
+        y = enc_p.ssl_proj(y * y_mask) * y_mask
+        y = enc_p.encoder_ssl(y * y_mask, y_mask)
+        text_mask = torch.ones_like(text_seq).to(y.dtype).unsqueeze(0)
+        text = enc_p.text_embedding(text_seq).transpose(1, 2)
+        text = enc_p.encoder_text(text * text_mask, text_mask)
+        y = enc_p.mrte(y, y_mask, text, text_mask, ge_512)
+        y = enc_p.encoder2(y * y_mask, y_mask)
+        y = interpolate_linear(y, speed)
+        y_mask = torch.ones_like(y[:1, :1, :])
+        stats = enc_p.proj(y) * y_mask
+        m_p, logs_p = torch.split(stats, enc_p.out_channels, dim=1)
+
+        z_p = m_p + torch.randn_like(m_p) * torch.exp(logs_p) * noise_scale
+        z = vq_model.flow(z_p, y_mask, g=ge, reverse=True)
+        o = vq_model.dec((z * y_mask)[:, :, :], g=ge)
+        return o[0, 0]
+
+
+def load_t2s(gpt_path):
+    dict_s1 = torch.load(gpt_path, map_location="cpu", weights_only=False)
+    config = dict_s1["config"]
+    t2s_model = Text2SemanticLightningModule(config, "****", is_train=False)
+    t2s_model.load_state_dict(dict_s1["weight"])
+    t2s_model.eval()
+    t2s = t2s_model.model
+    t2s.init_onnx()
+    return t2s, config
+
+
+def load_vits(sovits_path):
+    version, model_version, if_lora_v3 = get_sovits_version_from_path_fast(sovits_path)
+    if model_version not in v2pro_set:
+        raise ValueError(f"{sovits_path} is a {model_version} model, only v2Pro/v2ProPlus are supported")
+    dict_s2 = load_sovits_new(sovits_path)
+    hps = DictToAttrRecursive(dict_s2["config"])
+    hps.model.semantic_frame_rate = "25hz"
+    hps.model.version = model_version
+    vq_model = SynthesizerTrn(
+        hps.data.filter_length // 2 + 1,
+        hps.train.segment_size // hps.data.hop_length,
+        n_speakers=hps.data.n_speakers,
+        **hps.model,
+    )
+    vq_model.load_state_dict(dict_s2["weight"], strict=False)
+    vq_model.dec.remove_weight_norm()
+    vq_model.eval()
+    return vq_model, hps, version, model_version
+
+
+def export(gpt_path, sovits_path, output_dir, opset_version=17):
+    from sv import SV
+
+    os.makedirs(output_dir, exist_ok=True)
+    t2s, t2s_config = load_t2s(gpt_path)
+    vq_model, hps, version, model_version = load_vits(sovits_path)
+    sv_model = SV("cpu", False)
+
+    def path(name):
+        return os.path.join(output_dir, f"{name}.onnx")
+
+    torch.manual_seed(0)
+    ref_seq = torch.randint(1, 300, (1, 12))
+    text_seq = torch.randint(1, 300, (1, 20))
+    ref_bert = torch.randn(1024, 12)
+    text_bert = torch.randn(1024, 20)
+    ssl_content = torch.randn(1, 768, 150)
+
+    encoder = T2SEncoder(t2s, vq_model)
+    torch.onnx.export(
+        encoder,
+        (ref_seq, text_seq, ref_bert, text_bert, ssl_content),
+        path("t2s_encoder"),
+        input_names=["ref_seq", "text_seq", "ref_bert", "text_bert", "ssl_content"],
+        output_names=["x", "prompts"],
+        dynamic_axes={
+            "ref_seq": {1: "ref_length"},
+            "text_seq": {1: "text_length"},
+            "ref_bert": {1: "ref_length"},
+            "text_bert": {1: "text_length"},
+            "ssl_content": {2: "ssl_length"},
+            "x": {1: "x_length"},
+            "prompts": {1: "prompts_length"},
+        },
+        opset_version=opset_version,
+    )
+    print("#### exported t2s_encoder ####")
+    x, prompts = encoder(ref_seq, text_seq, ref_bert, text_bert, ssl_content)
+
+    first_step = T2SFirstStep(t2s)
+    torch.onnx.export(
+        first_step,
+        (x, prompts),
+        path("t2s_first_step"),
+        input_names=["x", "prompts"],
+        output_names=["logits", "k", "v", "y_emb", "x_example"],
+        dynamic_axes={
+            "x": {1: "x_length"},
+            "prompts": {1: "prompts_length"},
+            "k": {1: "kv_length"},
+            "v": {1: "kv_length"},
+            "y_emb": {1: "y_length"},
+            "x_example": {1: "x_length"},
+        },
+        opset_version=opset_version,
+    )
+    print("#### exported t2s_first_step ####")
+    logits, k, v, y_emb, x_example = first_step(x, prompts)
+
+    token = torch.argmax(logits, dim=-1, keepdim=True)
+    torch.onnx.export(
+        T2SStep(t2s),
+        (token, k, v, y_emb, x_example),
+        path("t2s_step"),
+        input_names=["token", "ik", "iv", "iy_emb", "x_example"],
+        output_names=["logits", "k", "v", "y_emb"],
+        dynamic_axes={
+            "ik": {1: "ikv_length"},
+            "iv": {1: "ikv_length"},
+            "iy_emb": {1: "iy_length"},
+            "x_example": {1: "x_length"},
+            "k": {1: "kv_length"},
+            "v": {1: "kv_length"},
+            "y_emb": {1: "y_length"},
+        },
+        opset_version=opset_version,
+    )
+    print("#### exported t2s_step ####")
+
+    fbank = torch.randn(1, 300, 80)
+    torch.onnx.export(
+        SVEmbedding(sv_model.embedding_model),
+        (fbank,),
+        path("sv"),
+        input_names=["fbank"],
+        output_names=["sv_emb"],
+        dynamic_axes={"fbank": {1: "frames"}},
+        opset_version=opset_version,
+    )
+    print("#### exported sv ####")
+
+    ref_audio = torch.randn(1, hps.data.sampling_rate * 5) * 0.1
+    sv_emb = torch.randn(1, 20480)
+    ref_encoder = VitsRefEncoder(vq_model, hps)
+    torch.onnx.export(
+        ref_encoder,
+        (ref_audio, sv_emb),
+        path("vits_ref"),
+        input_names=["ref_audio", "sv_emb"],
+        output_names=["ge"],
+        dynamic_axes={"ref_audio": {1: "audio_length"}},
+        opset_version=opset_version,
+    )
+    print("#### exported vits_ref ####")
+    ge = ref_encoder(ref_audio, sv_emb)
+
+    pred_semantic = torch.randint(0, 1024, (1, 1, 60))
+    torch.onnx.export(
+        VitsDecoder(vq_model),
+        (text_seq, pred_semantic, ge, torch.FloatTensor([1.1]), torch.FloatTensor([0.5])),
+        path("vits"),
+        input_names=["text_seq", "pred_semantic", "ge", "speed", "noise_scale"],
+        output_names=["audio"],
+        dynamic_axes={
+            "text_seq": {1: "text_length"},
+            "pred_semantic": {2: "pred_length"},
+            "audio": {0: "audio_length"},
+        },
+        opset_version=opset_version,
+    )
+    print("#### exported vits ####")
+
+    config = {
+        "version": version,
+        "model_version": model_version,
+        "sampling_rate": hps.data.sampling_rate,
+        "num_layers": t2s.num_layers,
+        "EOS": t2s.EOS,
+        "hz": 50,
+        "max_sec": t2s_config["data"]["max_sec"],
+        "gpt_model": os.path.abspath(gpt_path),
+        "sovits_model": os.path.abspath(sovits_path),
+    }
+    with open(os.path.join(output_dir, "config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+    print(f"exported to {output_dir}")
+
+
+def max_rel_diff(ref, out):
+    ref = torch.as_tensor(ref).float()
+    out = torch.as_tensor(out).float()
+    return ((ref - out).abs().max() / ref.abs().max().clamp(min=1e-6)).item()
+
+
+@torch.no_grad()
+def check_parity(gpt_path, sovits_path, output_dir, steps=30, tolerance=1e-3):
+    """
+    onnxruntime与PyTorch推理路径（inference_webui使用的AR.models.t2s_model / module.models / sv）对比：
+    T2S的解码步用ONNX的argmax token做teacher forcing，VITS用noise_scale=0去掉随机性
+    """
+    import numpy as np
+
+    from AR.models.t2s_lightning_module import Text2SemanticLightningModule as TorchT2SModule
+    from module.mel_processing import spectrogram_torch
+    from module.models import SynthesizerTrn as TorchSynthesizerTrn
+    from onnx_runtime_v2pro import OnnxV2ProRunner
+    from sv import SV
+
+    runner = OnnxV2ProRunner(output_dir, providers=["CPUExecutionProvider"])
+
+    dict_s1 = torch.load(gpt_path, map_location="cpu", weights_only=False)
+    t2s = TorchT2SModule(dict_s1["config"], "****", is_train=False)
+    t2s.load_state_dict(dict_s1["weight"])
+    t2s = t2s.eval().model
+    version, model_version, if_lora_v3 = get_sovits_version_from_path_fast(sovits_path)
+    dict_s2 = load_sovits_new(sovits_path)
+    hps = DictToAttrRecursive(dict_s2["config"])
+    hps.model.semantic_frame_rate = "25hz"
+    hps.model.version = model_version
+    vq_model = TorchSynthesizerTrn(
+        hps.data.filter_length // 2 + 1,
+        hps.train.segment_size // hps.data.hop_length,
+        n_speakers=hps.data.n_speakers,
+        **hps.model,
+    )
+    vq_model.load_state_dict(dict_s2["weight"], strict=False)
+    vq_model.eval()
+    sv_model = SV("cpu", False)
+
+    torch.manual_seed(0)
+    ref_seq = torch.randint(1, 300, (1, 15))
+    text_seq = torch.randint(1, 300, (1, 40))
+    ref_bert = torch.randn(1024, 15)
+    text_bert = torch.randn(1024, 40)
+    ssl_content = torch.randn(1, 768, 200)
+    ref_audio_16k = torch.randn(1, 16000 * 4) * 0.1
+    ref_audio = torch.nn.functional.interpolate(
+        ref_audio_16k.unsqueeze(0), scale_factor=hps.data.sampling_rate / 16000, mode="linear"
+    )[0]
+    results = []
+
+    # t2s_encoder
+    x, prompts = runner.encode(
+        ref_seq.numpy(), text_seq.numpy(), ref_bert.numpy(), text_bert.numpy(), ssl_content.numpy()
+    )
+    torch_prompts = vq_model.extract_latent(ssl_content)[0, 0].unsqueeze(0)
+    all_phoneme_ids = torch.cat([ref_seq, text_seq], 1)
+    bert = torch.cat([ref_bert, text_bert], 1).unsqueeze(0)
+    torch_x = t2s.ar_text_position(t2s.ar_text_embedding(all_phoneme_ids) + t2s.bert_proj(bert.transpose(1, 2)))
+    results.append(("t2s_encoder x", max_rel_diff(torch_x, x)))
+    results.append(("t2s_encoder prompts", float((torch_prompts != torch.from_numpy(prompts)).any())))
+
+    # t2s_first_step
+    logits, state = runner.first_step(x, torch_prompts.numpy())
+    x_len, y_len = torch_x.shape[1], torch_prompts.shape[1]
+    src_len = x_len + y_len
+    y_emb = t2s.ar_audio_embedding(torch_prompts)
+    xy_pos = torch.concat([torch_x, t2s.ar_audio_position(y_emb)], dim=1)
+    x_attn_mask_pad = F.pad(torch.zeros((x_len, x_len), dtype=torch.bool), (0, y_len), value=True)
+    y_attn_mask = F.pad(torch.triu(torch.ones(y_len, y_len, dtype=torch.bool), diagonal=1), (x_len, 0), value=False)
+    xy_attn_mask = (
+        torch.concat([x_attn_mask_pad, y_attn_mask], dim=0)
+        .unsqueeze(0)
+        .expand(t2s.num_head, -1, -1)
+        .view(1, t2s.num_head, src_len, src_len)
+    )
+    xy_dec, k_cache, v_cache = t2s.t2s_transformer.process_prompt(xy_pos, xy_attn_mask, None)
+    torch_logits = t2s.ar_predict_layer(xy_dec[:, -1])
+    results.append(("t2s_first_step logits", max_rel_diff(torch_logits, logits)))
+
+    # t2s_step (KV cache)
+    step_diff = 0.0
+    for idx in range(steps):
+        token = np.argmax(logits[:, :-1], axis=-1).reshape(1, 1).astype(np.int64)
+        logits, state = runner.step(token, state)
+        y_emb = t2s.ar_audio_embedding(torch.from_numpy(token))
+        xy_pos = y_emb * t2s.ar_audio_position.x_scale + t2s.ar_audio_position.alpha * t2s.ar_audio_position.pe[
+            :, y_len + idx
+        ].to(dtype=y_emb.dtype)
+        xy_dec, k_cache, v_cache = t2s.t2s_transformer.decode_next_token(xy_pos, k_cache, v_cache)
+        torch_logits = t2s.ar_predict_layer(xy_dec[:, -1])
+        step_diff = max(step_diff, max_rel_diff(torch_logits, logits))
+    results.append((f"t2s_step logits ({steps} steps)", step_diff))
+
+    # sv
+    sv_emb = runner.sv_embedding(ref_audio_16k[0].numpy())
+    torch_sv_emb = sv_model.compute_embedding3(ref_audio_16k)
+    results.append(("sv embedding", max_rel_diff(torch_sv_emb, sv_emb)))
+
+    # vits_ref
+    ge = runner.ref_ge(ref_audio.numpy(), torch_sv_emb.numpy())
+    refer = spectrogram_torch(
+        ref_audio, hps.data.filter_length, hps.data.sampling_rate, hps.data.hop_length, hps.data.win_length
+    )
+    torch_ge = vq_model.get_ge([refer], [torch_sv_emb])
+    results.append(("vits_ref ge", max_rel_diff(torch_ge, ge)))
+
+    # vits
+    pred_semantic = torch.randint(0, 1024, (1, 1, 80))
+    for speed in (1.0, 1.25):
+        audio = runner.decode(text_seq.numpy(), pred_semantic.numpy(), torch_ge.numpy(), speed=speed, noise_scale=0)
+        torch_audio = vq_model.decode(pred_semantic, text_seq, [refer], noise_scale=0, speed=speed, sv_emb=[torch_sv_emb])
+        torch_audio = torch_audio[0, 0]
+        if torch_audio.shape[0] != audio.shape[0]:
+            results.append((f"vits audio speed={speed} (length mismatch)", float("inf")))
+        else:
+            results.append((f"vits audio speed={speed}", max_rel_diff(torch_audio, audio)))
+
+    ok = True
+    for name, diff in results:
+        passed = diff <= tolerance
+        ok = ok and passed
+        print(f"{name:<36}{diff:>12.3e}  {'OK' if passed else 'FAIL'}")
+    print("parity check passed" if ok else "parity check FAILED")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export GPT-SoVITS v2Pro/v2ProPlus to ONNX")
+    parser.add_argument("--gpt_model", required=True, help="Path to the GPT model file")
+    parser.add_argument("--sovits_model", required=True, help="Path to the v2Pro/v2ProPlus SoVITS model file")
+    parser.add_argument("--output_dir", required=True, help="Directory for the exported .onnx files")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--check", action="store_true", help="Compare onnxruntime outputs with PyTorch after export")
+    parser.add_argument("--check_only", action="store_true", help="Only run the parity check on an existing export")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="Max relative diff allowed by the check")
+    args = parser.parse_args()
+
+    if not args.check_only:
+        with torch.no_grad():
+            export(args.gpt_model, args.sovits_model, args.output_dir, args.opset)
+    if args.check or args.check_only:
+        if not check_parity(args.gpt_model, args.sovits_model, args.output_dir, tolerance=args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+ONNX Runtime推理后端：运行onnx_export_v2pro.py导出的v2Pro/v2ProPlus模型
+
+OnnxV2ProRunner    各子模型的session池 + T2S自回归解码（采样在numpy里做） + SV/VITS
+OnnxV2ProTTS       与inference_webui.get_tts_wav参数一致的合成入口；文本前端（切句、G2P、BERT）和
+                   参考音频的SSL特征仍由inference_core.GPTSoVITSInference提供，T2S、SV、VITS走onnxruntime
+"""
+
+import json
+import os
+import queue
+import sys
+import traceback
+from contextlib import contextmanager
+from time import time as ttime
+
+import numpy as np
+import onnxruntime as ort
+
+MODEL_NAMES = ["t2s_encoder", "t2s_first_step", "t2s_step", "sv", "vits_ref", "vits"]
+
+
+def default_providers():
+    available = ort.get_available_providers()
+    return [provider for provider in ("CUDAExecutionProvider", "CPUExecutionProvider") if provider in available]
+
+
+def make_session_options(intra_op_num_threads=0, inter_op_num_threads=0):
+    """线程数为0时由onnxruntime自行决定"""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = intra_op_num_threads
+    options.inter_op_num_threads = inter_op_num_threads
+    if inter_op_num_threads > 1:
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    else:
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    return options
+
+
+class SessionPool:
+    """同一模型的多个InferenceSession，多线程同时推理时每个线程取一个，用完放回"""
+
+    def __init__(self, model_path, size=1, providers=None, session_options=None):
+        self.model_path = model_path
+        self.sessions = queue.Queue()
+        for _ in range(max(1, size)):
+            self.sessions.put(
+                ort.InferenceSession(model_path, sess_options=session_options, providers=providers or default_providers())
+            )
+
+    @contextmanager
+    def acquire(self):
+        session = self.sessions.get()
+        try:
+            yield session
+        finally:
+            self.sessions.put(session)
+
+    def run(self, feeds, output_names=None):
+        with self.acquire() as session:
+            return session.run(output_names, feeds)
+
+
+def softmax(x):
+    x = x - np.max(x)
+    e = np.exp(x)
+    return e / e.sum()
+
+
+def sample_token(logits, previous_tokens, top_k=None, top_p=None, temperature=1.0, repetition_penalty=1.0):
+    """numpy版AR.models.utils.sample（单条），logits: [V]"""
+    logits = np.array(logits, dtype=np.float32)
+    if previous_tokens is not None and repetition_penalty != 1.0:
+        previous_tokens = np.asarray(previous_tokens, dtype=np.int64)
+        score = logits[previous_tokens]
+        logits[previous_tokens] = np.where(score < 0, score * repetition_penalty, score / repetition_penalty)
+
+    if top_p is not None and top_p < 1.0:
+        sorted_indices = np.argsort(-logits, kind="stable")
+        cum_probs = np.cumsum(softmax(logits[sorted_indices]))
+        sorted_indices_to_remove = cum_probs > top_p
+        sorted_indices_to_remove[0] = False  # keep at least one option
+        logits[sorted_indices[sorted_indices_to_remove]] = -np.inf
+
+    logits = logits / max(temperature, 1e-5)
+
+    if top_k is not None:
+        top_k = min(top_k, logits.shape[-1])
+        pivot = np.partition(logits, -top_k)[-top_k]
+        logits = np.where(logits < pivot, -np.inf, logits)
+
+    probs = softmax(logits)
+    q = np.random.exponential(1.0, size=probs.shape)
+    return int(np.argmax(probs / q))
+
+
+class OnnxV2ProRunner:
+    def __init__(self, model_dir, pool_size=1, providers=None, intra_op_num_threads=0, inter_op_num_threads=0):
+        with open(os.path.join(model_dir, "config.json")) as f:
+            self.config = json.load(f)
+        self.sampling_rate = self.config["sampling_rate"]
+        self.EOS = self.config["EOS"]
+        self.early_stop_num = self.config["hz"] * self.config["max_sec"]
+        options = make_session_options(intra_op_num_threads, inter_op_num_threads)
+        self.pools = {
+            name: SessionPool(os.path.join(model_dir, f"{name}.onnx"), pool_size, providers, options)
+            for name in MODEL_NAMES
+        }
+
+    def encode(self, ref_seq, text_seq, ref_bert, text_bert, ssl_content):
+        """[1,N] [1,N] [1024,N] [1024,N] [1,768,T] -> x [1,N,512], prompts [1,T']"""
+        x, prompts = self.pools["t2s_encoder"].run(
+            {
+                "ref_seq": ref_seq.astype(np.int64),
+                "text_seq": text_seq.astype(np.int64),
+                "ref_bert": ref_bert.astype(np.float32),
+                "text_bert": text_bert.astype(np.float32),
+                "ssl_content": ssl_content.astype(np.float32),
+            }
+        )
+        return x, prompts
+
+    def first_step(self, x, prompts):
+        logits, k, v, y_emb, x_example = self.pools["t2s_first_step"].run(
+            {"x": x, "prompts": prompts.astype(np.int64)}
+        )
+        return logits, (k, v, y_emb, x_example)
+
+    def step(self, token, state):
+        k, v, y_emb, x_example = state
+        logits, k, v, y_emb = self.pools["t2s_step"].run(
+            {"token": token.astype(np.int64), "ik": k, "iv": v, "iy_emb": y_emb, "x_example": x_example}
+        )
+        return logits, (k, v, y_emb, x_example)
+
+    def infer_semantic(
+        self,
+        x,
+        prompts,
+        top_k=15,
+        top_p=1.0,
+        temperature=1.0,
+        repetition_penalty=1.35,
+        early_stop_num=None,
+        max_steps=1500,
+    ):
+        """与AR.models.t2s_model.Text2SemanticDecoder.infer_panel_naive一致的停止条件，返回pred_semantic [1,1,T]"""
+        if early_stop_num is None:
+            early_stop_num = self.early_stop_num
+        tokens = prompts[0].astype(np.int64).tolist()
+        prefix_len = len(tokens)
+        state = None
+        for idx in range(max_steps):
+            if state is None:
+                logits, state = self.first_step(x, prompts)
+            else:
+                logits, state = self.step(np.array([[tokens[-1]]], dtype=np.int64), state)
+            logits = logits[0]
+            if idx < 11:  ###至少预测出10个token不然不给停止（0.4s）
+                logits = logits[:-1]
+            token = sample_token(
+                logits,
+                tokens,
+                top_k=top_k,
+                top_p=top_p,
+                temperature=temperature,
+                repetition_penalty=repetition_penalty,
+            )
+            tokens.append(token)
+            stop = early_stop_num != -1 and (len(tokens) - prefix_len) > early_stop_num
+            if int(np.argmax(logits)) == self.EOS or token == self.EOS:
+                stop = True
+            if stop:
+                print(f"T2S Decoding EOS [{prefix_len} -> {len(tokens)}]")
+                break
+        return np.array(tokens[prefix_len:-1], dtype=np.int64).reshape(1, 1, -1)
+
+    def sv_embedding(self, audio_16k):
+        """audio_16k: [T] float32 -> [1,20480]"""
+        import torch
+
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "eres2net"))
+        import kaldi as Kaldi
+
+        wav = torch.from_numpy(np.ascontiguousarray(audio_16k, dtype=np.float32)).unsqueeze(0)
+        fbank = Kaldi.fbank(wav, num_mel_bins=80, sample_frequency=16000, dither=0).unsqueeze(0)
+        return self.pools["sv"].run({"fbank": fbank.numpy()})[0]
+
+    def ref_ge(self, ref_audio, sv_emb):
+        """ref_audio: [1,T] (sampling_rate), sv_emb: [1,20480] -> ge [1,gin,1]"""
+        return self.pools["vits_ref"].run(
+            {"ref_audio": ref_audio.astype(np.float32), "sv_emb": sv_emb.astype(np.float32)}
+        )[0]
+
+    def decode(self, text_seq, pred_semantic, ge, speed=1.0, noise_scale=0.5):
+        return self.pools["vits"].run(
+            {
+                "text_seq": text_seq.astype(np.int64),
+                "pred_semantic": pred_semantic.astype(np.int64),
+                "ge": ge.astype(np.float32),
+                "speed": np.array([speed], dtype=np.float32),
+                "noise_scale": np.array([noise_scale], dtype=np.float32),
+            }
+        )[0]
+
+
+class OnnxV2ProTTS:
+    """
+    frontend: inference_core.GPTSoVITSInference（用到其dict_language、device、is_half、get_phones_and_bert和get_ssl_content，不需要加载GPT/SoVITS权重）
+    prompt_cache的用法与get_tts_wav相同，存的是numpy数组，不要与PyTorch后端共用同一个dict
+    """
+
+    def __init__(self, runner: OnnxV2ProRunner, frontend):
+        self.runner = runner
+        self.frontend = frontend
+
+    def _ssl_content(self, ref_wav_path, pause_second):
+        import librosa
+        import torch
+        from inference_core import i18n
+
+        fe = self.frontend
+        wav16k, sr = librosa.load(ref_wav_path, sr=16000)
+        if wav16k.shape[0] > 160000 or wav16k.shape[0] < 48000:
+            raise OSError(i18n("参考音频在3~10秒范围外，请更换！"))
+        wav16k = np.concatenate([wav16k, np.zeros(int(self.runner.sampling_rate * pause_second), dtype=np.float32)])
+        wav16k = torch.from_numpy(wav16k).to(fe.device)
+        if fe.is_half == True:
+            wav16k = wav16k.half()
+        with torch.no_grad():
+            ssl_content = fe.get_ssl_content(wav16k)
+        return ssl_content.float().cpu().numpy()
+
+    def _ge(self, ref_wav_path, inp_refs):
+        import librosa
+
+        sr = self.runner.sampling_rate
+        ges = []
+        for path in [ref.name for ref in inp_refs] if inp_refs else []:
+            try:
+                ges.append(self._ref_ge(librosa, path, sr))
+            except:
+                traceback.print_exc()
+        if len(ges) == 0:
+            ges.append(self._ref_ge(librosa, ref_wav_path, sr))
+        return np.mean(np.stack(ges, 0), 0)
+
+    def _ref_ge(self, librosa, path, sr):
+        audio, _ = librosa.load(path, sr=sr)
+        maxx = np.abs(audio).max()
+        if maxx > 1:
+            audio /= min(2, maxx)
+        sv_emb = self.runner.sv_embedding(librosa.resample(audio, orig_sr=sr, target_sr=16000))
+        return self.runner.ref_ge(audio[None], sv_emb)
+
+    def prefetch_g2pw(self, texts, text_language, how_to_cut=None):
+        """见inference_core.GPTSoVITSInference.prefetch_g2pw，版本取导出模型的版本"""
+        self.frontend.prefetch_g2pw(texts, text_language, how_to_cut, version=self.runner.config["version"])
+
+    def get_tts_wav(
+        self,
+        ref_wav_path,
+        prompt_text,
+        prompt_language,
+        text,
+        text_language,
+        how_to_cut=None,
+        top_k=20,
+        top_p=0.6,
+        temperature=0.6,
+        ref_free=False,
+        speed=1,
+        if_freeze=False,
+        inp_refs=None,
+        sample_steps=8,
+        if_sr=False,
+        pause_second=0.3,
+        prompt_cache=None,
+    ):
+        # sample_steps/if_sr只对v3/v4有效，if_freeze（semantic缓存）ONNX后端不支持
+        from inference_core import i18n, split_target_text, splits
+
+        fe = self.frontend
+        if prompt_cache is None:
+            prompt_cache = {}
+        if ref_free or prompt_text is None or len(prompt_text) == 0:
+            raise ValueError("the ONNX backend needs a reference text (ref_free is not supported)")
+        version = self.runner.config["version"]
+        t = []
+        t0 = ttime()
+        prompt_language = fe.dict_language[prompt_language]
+        text_language = fe.dict_language[text_language]
+        prompt_text = prompt_text.strip("\n")
+        if prompt_text[-1] not in splits:
+            prompt_text += "。" if prompt_language != "en" else "."
+        print(i18n("实际输入的参考文本:"), prompt_text)
+        text = text.strip("\n")
+        print(i18n("实际输入的目标文本:"), text)
+        zero_wav = np.zeros(int(self.runner.sampling_rate * pause_second), dtype=np.float32)
+
+        if "ssl_content" not in prompt_cache:
+            prompt_cache["ssl_content"] = self._ssl_content(ref_wav_path, pause_second)
+        ssl_content = prompt_cache["ssl_content"]
+        t1 = ttime()
+        t.append(t1 - t0)
+
+        texts = split_target_text(text, text_language, how_to_cut)
+        print(i18n("实际输入的目标文本(切句后):"), texts)
+        fe.prefetch_sentences(texts, text_language, version)
+
+        if "phones" not in prompt_cache:
+            phones1, bert1, norm_text1 = fe.get_phones_and_bert(prompt_text, prompt_language, version)
+            prompt_cache.update(phones=phones1, bert=bert1.float().cpu().numpy(), norm_text=norm_text1)
+        phones1, bert1 = prompt_cache["phones"], prompt_cache["bert"]
+        if "ge" not in prompt_cache:
+            prompt_cache["ge"] = self._ge(ref_wav_path, inp_refs)
+        ge = prompt_cache["ge"]
+
+        audio_opt = []
+        for text in texts:
+            print(i18n("实际输入的目标文本(每句):"), text)
+            phones2, bert2, norm_text2 = fe.get_phones_and_bert(text, text_language, version)
+            print(i18n("前端处理后的文本(每句):"), norm_text2)
+            t2 = ttime()
+            x, prompts = self.runner.encode(
+                np.array([phones1]), np.array([phones2]), bert1, bert2.float().cpu().numpy(), ssl_content
+            )
+            pred_semantic = self.runner.infer_semantic(
+                x, prompts, top_k=top_k, top_p=top_p, temperature=temperature
+            )
+            t3 = ttime()
+            audio = self.runner.decode(np.array([phones2]), pred_semantic, ge, speed=speed)
+            max_audio = np.abs(audio).max()  # 简单防止16bit爆音
+            if max_audio > 1:
+                audio = audio / max_audio
+            audio_opt.append(audio)
+            audio_opt.append(zero_wav)
+            t4 = ttime()
+            t.extend([t2 - t1, t3 - t2, t4 - t3])
+            t1 = ttime()
+        print("%.3f\t%.3f\t%.3f\t%.3f" % (t[0], sum(t[1::3]), sum(t[2::3]), sum(t[3::3])))
+        audio_opt = np.concatenate(audio_opt, 0)
+        yield self.runner.sampling_rate, (audio_opt * 32767).astype(np.int16)
@@ -0,0 +1,285 @@
+"""
+API服务的推理调度：推理在专门的工作线程里运行，事件循环只负责收发请求，/control等接口不会被合成卡住
+
+请求先进有界队列（max_queue_size，满了抛SchedulerFull，API返回429），在max_wait_ms的窗口内
+把参考音频、提示文本和推理参数都相同的非流式请求合并成一次TTS.run（"texts"），所有句子一起进T2S批次，
+合成后按请求切回各自的音频
+
+不参与合并的请求单独运行：流式/分段返回的请求，以及固定了seed的请求（合并后随机数序列不同，结果不可复现）。
+流式请求的每一段由工作线程送进asyncio.Queue，API在事件循环里取
+
+取消（超时或客户端断开）：还在排队的请求直接丢弃；正在推理的请求等同批的请求都取消后调用pipeline.stop()，
+TTS.stop会把已经进入T2S连续批处理slot的句子一起取消，显卡马上空出来给下一个请求；流式请求在两段之间也检查取消
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+
+# 这些参数都相同的请求才能合并；text、batch_size、media_type等每个请求可以不同
+BATCH_KEY_FIELDS = (
+    "ref_audio_path",
+    "aux_ref_audio_paths",
+    "prompt_text",
+    "prompt_lang",
+    "text_lang",
+    "top_k",
+    "top_p",
+    "temperature",
+    "text_split_method",
+    "batch_threshold",
+    "split_bucket",
+    "speed_factor",
+    "fragment_interval",
+    "parallel_infer",
+    "continuous_batching",
+    "repetition_penalty",
+    "sample_steps",
+    "super_sampling",
+    "gpt_weights_path",
+    "sovits_weights_path",
+)
+
+# 流式输出结束的标记
+_END = object()
+
+
+class SchedulerFull(Exception):
+    pass
+
+
+class TTSJob:
+    def __init__(self, req, loop: asyncio.AbstractEventLoop = None):
+        """
+        loop不为None时是流式请求：pipeline.run(req)产生的每一项都送进self.chunks
+        """
+        self.req = req
+        self.future = Future()
+        self.cancelled = False
+        self.loop = loop
+        self.chunks = asyncio.Queue() if loop is not None else None
+
+    @property
+    def streaming(self) -> bool:
+        return self.chunks is not None
+
+    def emit(self, item):
+        """工作线程调用"""
+        try:
+            self.loop.call_soon_threadsafe(self.chunks.put_nowait, item)
+        except RuntimeError:
+            # 事件循环已经关闭（服务退出）
+            pass
+
+    async def next_chunk(self, timeout: float = None):
+        """
+        下一段输出；全部输出完后返回None，推理出错时抛出对应的异常，等待超过timeout秒抛出asyncio.TimeoutError
+        """
+        item = await asyncio.wait_for(self.chunks.get(), timeout)
+        if item is _END:
+            self.chunks.put_nowait(_END)
+            return None
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+
+class TTSRequestScheduler:
+    def __init__(self, tts_pipeline, max_batch_size: int = 8, max_wait_ms: float = 20.0, max_queue_size: int = 32):
+        """
+        tts_pipeline: 需要run(req)（返回生成器）和stop()
+        max_batch_size: 一次TTS.run最多合并的请求数，1为不合并
+        max_wait_ms: 收到第一个请求后最多等待多久来凑批
+        max_queue_size: 排队和正在推理的请求数上限，0为不限制
+        """
+        self.tts_pipeline = tts_pipeline
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_queue_size = max(0, int(max_queue_size))
+        # TTS实例不是线程安全的：推理和切换模型/参考音频都要持有这把锁
+        self.pipeline_lock = threading.Lock()
+        self.queue = queue.Queue()
+        # 已经取出、但和当时的批次不兼容的请求，下一轮优先处理
+        self.pending = []
+        # 正在推理的批次
+        self.running = []
+        self.state_lock = threading.Lock()
+        self.outstanding = 0
+        self.requests = 0
+        self.batches = 0
+        self.merged_requests = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.worker = threading.Thread(target=self._worker, daemon=True, name="tts-request-scheduler")
+        self.worker.start()
+
+    @staticmethod
+    def batch_key(req: dict):
+        """可合并请求的分组key；不能合并时返回None"""
+        if req.get("return_fragment") or req.get("streaming_mode"):
+            return None
+        if req.get("seed", -1) not in (-1, "", None):
+            return None
+        return tuple(repr(req.get(field)) for field in BATCH_KEY_FIELDS)
+
+    def submit(self, req: dict) -> TTSJob:
+        """job.future的结果为(sr, audio)，audio为np.int16"""
+        return self._enqueue(TTSJob(req))
+
+    def submit_stream(self, req) -> TTSJob:
+        """在事件循环里调用，用job.next_chunk()或iter_stream()取pipeline.run(req)的每一项"""
+        return self._enqueue(TTSJob(req, asyncio.get_running_loop()))
+
+    def _enqueue(self, job: TTSJob) -> TTSJob:
+        with self.state_lock:
+            if self.max_queue_size and self.outstanding >= self.max_queue_size:
+                self.rejected += 1
+                raise SchedulerFull(f"{self.outstanding} requests in flight (max_queue_size={self.max_queue_size})")
+            self.outstanding += 1
+        job.future.add_done_callback(self._release)
+        self.queue.put(job)
+        return job
+
+    def _release(self, future: Future):
+        with self.state_lock:
+            self.outstanding -= 1
+
+    def cancel(self, job: TTSJob):
+        # asyncio.wrap_future在等待方被取消时会先取消排队中的future
+        if job.cancelled or (job.future.done() and not job.future.cancelled()):
+            return
+        job.cancelled = True
+        cancelled_in_queue = job.future.cancel()
+        with self.state_lock:
+            self.cancelled += 1
+            # 合并的批次里还有请求在等结果时不能停。持锁调用，保证停的是这一批：
+            # 工作线程清空running之前这一批的run已经返回，下一次run开始时会重置停止标记
+            if not cancelled_in_queue and job in self.running and all(j.cancelled for j in self.running):
+                self.tts_pipeline.stop()
+
+    async def iter_stream(self, job: TTSJob, first_chunk=None, timeout: float = None):
+        """
+        StreamingResponse用的异步生成器：先给出已经取到的first_chunk，之后每段最多等timeout秒；
+        客户端断开、超时或出错时取消请求
+        """
+        finished = False
+        try:
+            chunk = first_chunk if first_chunk is not None else await job.next_chunk(timeout)
+            while chunk is not None:
+                yield chunk
+                chunk = await job.next_chunk(timeout)
+            finished = True
+        finally:
+            if not finished:
+                self.cancel(job)
+
+    def run_exclusive(self, fn, *args, **kwargs):
+        """在推理间隙运行fn（切换模型、参考音频等），从线程池调用"""
+        with self.pipeline_lock:
+            return fn(*args, **kwargs)
+
+    def _collect(self) -> list:
+        first = self.pending.pop(0) if self.pending else self.queue.get()
+        group = [first]
+        key = self._job_key(first)
+        if key is None or self.max_batch_size == 1:
+            return group
+
+        deadline = time.monotonic() + self.max_wait
+        skipped = []
+        while len(group) < self.max_batch_size:
+            if self.pending:
+                job = self.pending.pop(0)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if self._job_key(job) == key:
+                group.append(job)
+            else:
+                skipped.append(job)
+        self.pending = skipped + self.pending
+        return group
+
+    def _job_key(self, job: TTSJob):
+        return None if job.streaming else self.batch_key(job.req)
+
+    def _worker(self):
+        while True:
+            jobs = [job for job in self._collect() if job.future.set_running_or_notify_cancel()]
+            if len(jobs) == 0:
+                continue
+            with self.state_lock:
+                self.running = jobs
+            try:
+                with self.pipeline_lock:
+                    # 取出后、开始推理前（比如在等切换模型）就全部取消了：TTS.run开始时会重置停止标记，
+                    # 这时的stop()不起作用，所以在这里拦下
+                    if all(job.cancelled for job in jobs):
+                        raise CancelledError()
+                    if jobs[0].streaming:
+                        results = self._run_stream(jobs[0])
+                    else:
+                        results = self._run(jobs)
+            except Exception as e:
+                for job in jobs:
+                    job.future.set_exception(e)
+            else:
+                for job, result in zip(jobs, results):
+                    job.future.set_result(result)
+            finally:
+                with self.state_lock:
+                    self.running = []
+            if jobs[0].streaming:
+                # future先完成，取到结束标记后cancel()不会再误停下一个请求
+                error = jobs[0].future.exception()
+                jobs[0].emit(error if error is not None else _END)
+
+    def _run_stream(self, job: TTSJob) -> list:
+        self.requests += 1
+        self.batches += 1
+        generator = self.tts_pipeline.run(job.req)
+        try:
+            for item in generator:
+                if job.cancelled:
+                    break
+                job.emit(item)
+        finally:
+            generator.close()
+        return [None]
+
+    def _run(self, jobs: list) -> list:
+        reqs = [job.req for job in jobs]
+        self.requests += len(reqs)
+        self.batches += 1
+        if len(reqs) == 1:
+            return [next(self.tts_pipeline.run(reqs[0]))]
+
+        self.merged_requests += len(reqs)
+        inputs = dict(reqs[0])
+        inputs.pop("text", None)
+        inputs["texts"] = [req["text"] for req in reqs]
+        # 每个请求带来自己的batch_size个T2S slot
+        inputs["batch_size"] = sum(int(req.get("batch_size", 1)) for req in reqs)
+        sr, audio = next(self.tts_pipeline.run(inputs))
+        if not isinstance(audio, list):
+            # 推理失败或被stop时TTS.run只返回一段静音
+            audio = [audio] * len(reqs)
+        return [(sr, request_audio) for request_audio in audio]
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "merged_requests": self.merged_requests,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "in_flight": self.outstanding,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+        }
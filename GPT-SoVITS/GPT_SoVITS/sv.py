@@ -2,8 +2,9 @@ import sys
 import os
 import torch
 
-sys.path.append(f"{os.getcwd()}/GPT_SoVITS/eres2net")
-sv_path = "GPT_SoVITS/pretrained_models/sv/pretrained_eres2netv2w24s4ep4.ckpt"
+now_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(now_dir, "eres2net"))
+sv_path = os.path.join(now_dir, "pretrained_models", "sv", "pretrained_eres2netv2w24s4ep4.ckpt")
 from ERes2NetV2 import ERes2NetV2
 import kaldi as Kaldi
 
@@ -1 +1,10 @@
-from .langsegmenter import LangSegmenter
+class _LazyLangSegmenter:
+    """jieba、fast_langdetect、split_lang导入较慢、占内存，第一次切分时才导入langsegmenter"""
+
+    def __getattr__(self, name):
+        from .langsegmenter import LangSegmenter
+
+        return getattr(LangSegmenter, name)
+
+
+LangSegmenter = _LazyLangSegmenter()
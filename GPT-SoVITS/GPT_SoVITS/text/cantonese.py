@@ -92,20 +92,24 @@ rep_map = {
 }
 
 
+# 规则在导入时编译一次；text_normalize对每句都要调用
+RE_REP_MAP = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
+RE_NON_ZH = re.compile(r"[^\u4e00-\u9fa5" + "".join(punctuation) + r"]+")
+text_normalizer = TextNormalizer()
+
+
 def replace_punctuation(text):
     # text = text.replace("嗯", "恩").replace("呣", "母")
-    pattern = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
 
-    replaced_text = pattern.sub(lambda x: rep_map[x.group()], text)
+    replaced_text = RE_REP_MAP.sub(lambda x: rep_map[x.group()], text)
 
-    replaced_text = re.sub(r"[^\u4e00-\u9fa5" + "".join(punctuation) + r"]+", "", replaced_text)
+    replaced_text = RE_NON_ZH.sub("", replaced_text)
 
     return replaced_text
 
 
 def text_normalize(text):
-    tx = TextNormalizer()
-    sentences = tx.normalize(text)
+    sentences = text_normalizer.normalize(text)
     dest_text = ""
     for sentence in sentences:
         dest_text += replace_punctuation(sentence)
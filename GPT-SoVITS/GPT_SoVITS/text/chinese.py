@@ -6,6 +6,7 @@ from pypinyin import lazy_pinyin, Style
 
 from text.symbols import punctuation
 from text.tone_sandhi import ToneSandhi
+from text.word_pron_cache import word_pron_cache
 from text.zh_normalization.text_normlization import TextNormalizer
 
 normalizer = lambda x: cn2an.transform(x, "an2cn")
@@ -91,6 +92,12 @@ def _get_initials_finals(word):
     return initials, finals
 
 
+def _word_initials_finals(word, pos):
+    sub_initials, sub_finals = _get_initials_finals(word)
+    sub_finals = tone_modifier.modified_tone(word, pos, sub_finals)
+    return sub_initials, sub_finals
+
+
 def _g2p(segments):
     phones_list = []
     word2ph = []
@@ -105,8 +112,9 @@ def _g2p(segments):
         for word, pos in seg_cut:
             if pos == "eng":
                 continue
-            sub_initials, sub_finals = _get_initials_finals(word)
-            sub_finals = tone_modifier.modified_tone(word, pos, sub_finals)
+            sub_initials, sub_finals = word_pron_cache.lookup(
+                ("chinese", word, pos), lambda: _word_initials_finals(word, pos)
+            )
             initials.append(sub_initials)
             finals.append(sub_finals)
 
@@ -7,6 +7,7 @@ from pypinyin.contrib.tone_convert import to_finals_tone3, to_initials
 
 from text.symbols import punctuation
 from text.tone_sandhi import ToneSandhi
+from text.word_pron_cache import word_pron_cache
 from text.zh_normalization.text_normlization import TextNormalizer
 
 normalizer = lambda x: cn2an.transform(x, "an2cn")
@@ -32,21 +33,40 @@ if is_g2pw:
 
     parent_directory = os.path.dirname(current_file_path)
     
-    # Global variable to hold the g2pw instance (lazy-loaded)
+    # Global variable to hold the g2pw instance (lazy-loaded, then resident until cleanup_g2pw)
     g2pw = None
     
     def get_g2pw_instance():
         """Get or create G2PW instance (lazy loading)"""
         global g2pw
         if g2pw is None:
+            g2pw_gpu_mem_limit = int(os.environ.get("g2pw_gpu_mem_limit", "1024"))  # MB，0为不限制
             g2pw = G2PWPinyin(
                 model_dir="GPT_SoVITS/text/G2PWModel",
-                model_source=os.environ.get("bert_path", "GPT_SoVITS/pretrained_models/chinese-roberta-wwm-ext-large"),
+                model_source=os.environ.get(
+                    "bert_path", os.path.join(parent_directory, "pretrained_models", "chinese-roberta-wwm-ext-large")
+                ),
                 v_to_u=False,
                 neutral_tone_with_five=True,
+                max_batch_size=int(os.environ.get("g2pw_max_batch_size", "64")),
+                gpu_mem_limit_mb=g2pw_gpu_mem_limit or None,
+                cache_size=int(os.environ.get("g2pw_cache_size", "4096")),
+                use_cuda=os.environ.get("g2pw_device", "cuda") != "cpu",
             )
         return g2pw
     
+    def prefetch_g2pw(texts, normalized=False):
+        """
+        对一批文本一次性做G2PW批量推理，之后逐句g2p时直接命中缓存。
+        G2PW缓存的key是每句去掉英文后的汉字片段，所以texts必须和之后传给clean_text的文本完全相同
+        （语种切分后的中文片段，如FrontendPool的一批）；normalized=True时texts是传给g2p的已规范化文本
+        """
+        sentences = []
+        for text in texts:
+            sentences.extend(_split_sentences(text if normalized else text_normalize(text)))
+        if sentences:
+            get_g2pw_instance()(_g2pw_inputs(sentences))
+    
     def cleanup_g2pw():
         """Clean up G2PW instance to free GPU memory"""
         global g2pw
@@ -80,21 +100,36 @@ rep_map = {
 
 tone_modifier = ToneSandhi()
 
+# 规则在导入时编译一次；text_normalize对每句都要调用
+RE_REP_MAP = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
+RE_NON_ZH = re.compile(r"[^\u4e00-\u9fa5" + "".join(punctuation) + r"]+")
+RE_NON_ZH_EN = re.compile(r"[^\u4e00-\u9fa5A-Za-z" + "".join(punctuation) + r"]+")
+RE_CONSECUTIVE_PUNCTUATION = re.compile("([{0}])([{0}])+".format("".join(re.escape(p) for p in punctuation)))
+RE_SENTENCE_END = re.compile(r"(?<=[{0}])\s*".format("".join(punctuation)))
+text_normalizer = TextNormalizer()
+
 
 def replace_punctuation(text):
     text = text.replace("嗯", "恩").replace("呣", "母")
-    pattern = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
 
-    replaced_text = pattern.sub(lambda x: rep_map[x.group()], text)
+    replaced_text = RE_REP_MAP.sub(lambda x: rep_map[x.group()], text)
 
-    replaced_text = re.sub(r"[^\u4e00-\u9fa5" + "".join(punctuation) + r"]+", "", replaced_text)
+    replaced_text = RE_NON_ZH.sub("", replaced_text)
 
     return replaced_text
 
 
+def _split_sentences(text):
+    return [i for i in RE_SENTENCE_END.split(text) if i.strip() != ""]
+
+
+def _g2pw_inputs(segments):
+    # Replace all English words in the sentence
+    return [re.sub("[a-zA-Z]+", "", seg) for seg in segments]
+
+
 def g2p(text):
-    pattern = r"(?<=[{0}])\s*".format("".join(punctuation))
-    sentences = [i for i in re.split(pattern, text) if i.strip() != ""]
+    sentences = _split_sentences(text)
     phones, word2ph = _g2p(sentences)
     return phones, word2ph
 
@@ -199,13 +234,42 @@ def _merge_erhua(initials: list[str], finals: list[str], word: str, pos: str) ->
     return new_initials, new_finals
 
 
+def _word_initials_finals(word, pos):
+    """pypinyin读音 + 变调 + 儿化"""
+    sub_initials, sub_finals = _get_initials_finals(word)
+    sub_finals = tone_modifier.modified_tone(word, pos, sub_finals)
+    return _merge_erhua(sub_initials, sub_finals, word, pos)
+
+
+def _g2pw_word_initials_finals(word, pos, word_pinyins):
+    """G2PW读音 + 多音字修正 + 变调 + 儿化"""
+    sub_initials = []
+    sub_finals = []
+    # 多音字消歧
+    word_pinyins = correct_pronunciation(word, list(word_pinyins))
+
+    for pinyin in word_pinyins:
+        if pinyin[0].isalpha():
+            sub_initials.append(to_initials(pinyin))
+            sub_finals.append(to_finals_tone3(pinyin, neutral_tone_with_five=True))
+        else:
+            sub_initials.append(pinyin)
+            sub_finals.append(pinyin)
+
+    sub_finals = tone_modifier.modified_tone(word, pos, sub_finals)
+    # 儿化
+    return _merge_erhua(sub_initials, sub_finals, word, pos)
+
+
 def _g2p(segments):
     phones_list = []
     word2ph = []
-    for seg in segments:
+    segments = _g2pw_inputs(segments)
+    if is_g2pw:
+        # g2pw采用整句推理，所有句子一次批量推理
+        segments_pinyins = get_g2pw_instance()(segments, neutral_tone_with_five=True, style=Style.TONE3)
+    for seg_idx, seg in enumerate(segments):
         pinyins = []
-        # Replace all English words in the sentence
-        seg = re.sub("[a-zA-Z]+", "", seg)
         seg_cut = psg.lcut(seg)
         seg_cut = tone_modifier.pre_merge_for_modify(seg_cut)
         initials = []
@@ -215,10 +279,9 @@ def _g2p(segments):
             for word, pos in seg_cut:
                 if pos == "eng":
                     continue
-                sub_initials, sub_finals = _get_initials_finals(word)
-                sub_finals = tone_modifier.modified_tone(word, pos, sub_finals)
-                # 儿化
-                sub_initials, sub_finals = _merge_erhua(sub_initials, sub_finals, word, pos)
+                sub_initials, sub_finals = word_pron_cache.lookup(
+                    ("chinese2", word, pos), lambda: _word_initials_finals(word, pos)
+                )
                 initials.append(sub_initials)
                 finals.append(sub_finals)
                 # assert len(sub_initials) == len(sub_finals) == len(word)
@@ -226,37 +289,23 @@ def _g2p(segments):
             finals = sum(finals, [])
             print("pypinyin结果", initials, finals)
         else:
-            # g2pw采用整句推理
-            g2pw_instance = get_g2pw_instance()
-            pinyins = g2pw_instance.lazy_pinyin(seg, neutral_tone_with_five=True, style=Style.TONE3)
+            pinyins = segments_pinyins[seg_idx]
 
             pre_word_length = 0
             for word, pos in seg_cut:
-                sub_initials = []
-                sub_finals = []
                 now_word_length = pre_word_length + len(word)
 
                 if pos == "eng":
                     pre_word_length = now_word_length
                     continue
 
-                word_pinyins = pinyins[pre_word_length:now_word_length]
-
-                # 多音字消歧
-                word_pinyins = correct_pronunciation(word, word_pinyins)
-
-                for pinyin in word_pinyins:
-                    if pinyin[0].isalpha():
-                        sub_initials.append(to_initials(pinyin))
-                        sub_finals.append(to_finals_tone3(pinyin, neutral_tone_with_five=True))
-                    else:
-                        sub_initials.append(pinyin)
-                        sub_finals.append(pinyin)
-
+                # G2PW的读音随上下文变化，和词、词性一起作为key
+                word_pinyins = tuple(pinyins[pre_word_length:now_word_length])
                 pre_word_length = now_word_length
-                sub_finals = tone_modifier.modified_tone(word, pos, sub_finals)
-                # 儿化
-                sub_initials, sub_finals = _merge_erhua(sub_initials, sub_finals, word, pos)
+                sub_initials, sub_finals = word_pron_cache.lookup(
+                    ("chinese2-g2pw", word, pos, word_pinyins),
+                    lambda: _g2pw_word_initials_finals(word, pos, word_pinyins),
+                )
                 initials.append(sub_initials)
                 finals.append(sub_finals)
 
@@ -320,26 +369,22 @@ def _g2p(segments):
 
 def replace_punctuation_with_en(text):
     text = text.replace("嗯", "恩").replace("呣", "母")
-    pattern = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
 
-    replaced_text = pattern.sub(lambda x: rep_map[x.group()], text)
+    replaced_text = RE_REP_MAP.sub(lambda x: rep_map[x.group()], text)
 
-    replaced_text = re.sub(r"[^\u4e00-\u9fa5A-Za-z" + "".join(punctuation) + r"]+", "", replaced_text)
+    replaced_text = RE_NON_ZH_EN.sub("", replaced_text)
 
     return replaced_text
 
 
 def replace_consecutive_punctuation(text):
-    punctuations = "".join(re.escape(p) for p in punctuation)
-    pattern = f"([{punctuations}])([{punctuations}])+"
-    result = re.sub(pattern, r"\1", text)
+    result = RE_CONSECUTIVE_PUNCTUATION.sub(r"\1", text)
     return result
 
 
 def text_normalize(text):
     # https://github.com/PaddlePaddle/PaddleSpeech/tree/develop/paddlespeech/t2s/frontend/zh_normalization
-    tx = TextNormalizer()
-    sentences = tx.normalize(text)
+    sentences = text_normalizer.normalize(text)
     dest_text = ""
     for sentence in sentences:
         dest_text += replace_punctuation(sentence)
@@ -1,9 +1,13 @@
 import pickle
 import os
 import re
+from collections import OrderedDict
+
+import numpy as np
 import wordsegment
 from g2p_en import G2p
 
+from text.pron_dict import MmapPronDict
 from text.symbols import punctuation
 
 from text.symbols2 import symbols
@@ -19,8 +23,10 @@ current_file_path = os.path.dirname(__file__)
 CMU_DICT_PATH = os.path.join(current_file_path, "cmudict.rep")
 CMU_DICT_FAST_PATH = os.path.join(current_file_path, "cmudict-fast.rep")
 CMU_DICT_HOT_PATH = os.path.join(current_file_path, "engdict-hot.rep")
-CACHE_PATH = os.path.join(current_file_path, "engdict_cache.pickle")
 NAMECACHE_PATH = os.path.join(current_file_path, "namedict_cache.pickle")
+# 由上面的源文件生成的内存映射索引，源文件更新后自动重建，见pron_dict.py
+ENGDICT_INDEX_PATH = os.path.join(current_file_path, "engdict_index.bin")
+NAMEDICT_INDEX_PATH = os.path.join(current_file_path, "namedict_index.bin")
 
 
 # 适配中文及 g2p_en 标点
@@ -202,25 +208,16 @@ def hot_reload_hot(g2p_dict):
     return g2p_dict
 
 
-def cache_dict(g2p_dict, file_path):
-    with open(file_path, "wb") as pickle_file:
-        pickle.dump(g2p_dict, pickle_file)
-
-
 def get_dict():
-    if os.path.exists(CACHE_PATH):
-        with open(CACHE_PATH, "rb") as pickle_file:
-            g2p_dict = pickle.load(pickle_file)
-    else:
-        g2p_dict = read_dict_new()
-        cache_dict(g2p_dict, CACHE_PATH)
+    g2p_dict = MmapPronDict.open_or_build(ENGDICT_INDEX_PATH, [CMU_DICT_PATH, CMU_DICT_FAST_PATH], read_dict_new)
 
+    # 热词只覆盖当前进程，修改engdict-hot.rep不需要重建索引
     g2p_dict = hot_reload_hot(g2p_dict)
 
     return g2p_dict
 
 
-def get_namedict():
+def read_namedict():
     if os.path.exists(NAMECACHE_PATH):
         with open(NAMECACHE_PATH, "rb") as pickle_file:
             name_dict = pickle.load(pickle_file)
@@ -230,6 +227,10 @@ def get_namedict():
     return name_dict
 
 
+def get_namedict():
+    return MmapPronDict.open_or_build(NAMEDICT_INDEX_PATH, [NAMECACHE_PATH], read_namedict)
+
+
 def text_normalize(text):
     # todo: eng text normalize
 
@@ -246,11 +247,15 @@ def text_normalize(text):
 
 
 class en_G2p(G2p):
-    def __init__(self):
+    def __init__(self, oov_cache_size=20000):
         super().__init__()
         # 分词初始化
         wordsegment.load()
 
+        # 神经网络预测的OOV词结果，跨调用复用（人名、自造词在字幕里反复出现）
+        self.oov_cache_size = oov_cache_size
+        self.oov_cache = OrderedDict()
+
         # 扩展过时字典, 添加姓名字典
         self.cmu = get_dict()
         self.namedict = get_namedict()
@@ -306,7 +311,72 @@ class en_G2p(G2p):
 
         return prons[:-1]
 
-    def qryword(self, o_word):
+    def predict(self, word):
+        if word not in self.oov_cache:
+            self.predict_batch([word])
+        self.oov_cache.move_to_end(word)
+        return list(self.oov_cache[word])
+
+    def predict_batch(self, words):
+        """
+        g2p_en.predict的批量版：编码器把所有词padding到最长一起跑，解码器对整批贪心解码，
+        每个词的结果与逐词predict相同，写入oov_cache
+        """
+        words = [word for word in dict.fromkeys(words) if word not in self.oov_cache][: self.oov_cache_size]
+        if len(words) == 0:
+            return
+        batch = len(words)
+        lengths = np.array([len(word) for word in words])
+        steps = int(lengths.max()) + 1
+        x = np.full((batch, steps), self.g2idx["<pad>"], dtype=np.int64)
+        for b, word in enumerate(words):
+            x[b, : len(word) + 1] = [self.g2idx.get(char, self.g2idx["<unk>"]) for char in word] + [self.g2idx["</s>"]]
+
+        # encoder：GRU是因果的，取每个词自己的</s>位置的隐状态，后面的padding不影响结果
+        enc = np.take(self.enc_emb, x, axis=0)
+        h0 = np.zeros((batch, self.enc_w_hh.shape[-1]), np.float32)
+        enc = self.gru(enc, steps, self.enc_w_ih, self.enc_w_hh, self.enc_b_ih, self.enc_b_hh, h0=h0)
+        h = enc[np.arange(batch), lengths, :]
+
+        # decoder
+        dec = np.take(self.dec_emb, np.full(batch, 2), axis=0)  # 2: <s>
+        finished = np.zeros(batch, dtype=bool)
+        preds = [[] for _ in range(batch)]
+        for _ in range(20):
+            h = self.grucell(dec, h, self.dec_w_ih, self.dec_w_hh, self.dec_b_ih, self.dec_b_hh)
+            logits = np.matmul(h, self.fc_w.T) + self.fc_b
+            pred = logits.argmax(axis=1)
+            finished |= pred == 3  # 3: </s>
+            if finished.all():
+                break
+            for b in np.flatnonzero(~finished):
+                preds[b].append(int(pred[b]))
+            dec = np.take(self.dec_emb, pred, axis=0)
+
+        for word, word_preds in zip(words, preds):
+            self.oov_cache[word] = [self.idx2p.get(idx, "<unk>") for idx in word_preds]
+        while len(self.oov_cache) > self.oov_cache_size:
+            self.oov_cache.popitem(last=False)
+
+    def prefetch(self, texts):
+        """把一批已规范化的句子里所有要走神经网络预测的OOV词一次批量预测"""
+        oov_words = []
+
+        def collect(word):
+            oov_words.append(word)
+            return ["AH0"]  # 收集阶段只关心哪些词需要预测，读音用占位
+
+        for text in texts:
+            for o_word in word_tokenize(text):
+                word = o_word.lower()
+                # 与__call__相同：无字母、单字母、多音字不查词典
+                if re.search("[a-z]", word) is None or len(word) == 1 or word in self.homograph2features:
+                    continue
+                self.qryword(o_word, predict=collect)
+        self.predict_batch(oov_words)
+
+    def qryword(self, o_word, predict=None):
+        predict = predict or self.predict
         word = o_word.lower()
 
         # 查字典, 单字母除外
@@ -332,7 +402,7 @@ class en_G2p(G2p):
 
         # 尝试分离所有格
         if re.match(r"^([a-z]+)('s)$", word):
-            phones = self.qryword(word[:-2])[:]
+            phones = self.qryword(word[:-2], predict)[:]
             # P T K F TH HH 无声辅音结尾 's 发 ['S']
             if phones[-1] in ["P", "T", "K", "F", "TH", "HH"]:
                 phones.extend(["S"])
@@ -351,15 +421,20 @@ class en_G2p(G2p):
 
         # 无法分词的送回去预测
         if len(comps) == 1:
-            return self.predict(word)
+            return predict(word)
 
         # 可以分词的递归处理
-        return [phone for comp in comps for phone in self.qryword(comp)]
+        return [phone for comp in comps for phone in self.qryword(comp, predict)]
 
 
 _g2p = en_G2p()
 
 
+def prefetch_oov(texts):
+    """texts: 未规范化的英文片段；之后对这些片段调用g2p时OOV词直接命中缓存"""
+    _g2p.prefetch([text_normalize(text) for text in texts])
+
+
 def g2p(text):
     # g2p_en 整段推理，剔除不存在的arpa返回
     phone_list = _g2p(text)
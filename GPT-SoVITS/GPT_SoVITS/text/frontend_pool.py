@@ -0,0 +1,202 @@
+"""
+多进程G2P：ja(pyopenjtalk)、en(g2p_en + nltk pos_tag)、ko等语种的文本规范化和G2P是纯CPU计算且受GIL限制，
+长文本时按进程并行。输入(text, language, version)列表，按原顺序返回(phones, word2ph, norm_text)
+同一批里的英文片段先一起把OOV词送进g2p_en的神经网络批量预测，中文片段先一起做G2PW批量推理
+（主进程和每个子进程的每个分块都是如此）
+
+进程池默认关闭，按需开启；所有TextPreprocessor共用get_pool()返回的一个进程池。
+子进程意外退出（被OOM kill等）时这一批在主进程里处理，下一次重建进程池，连续失败多次后关闭进程池
+
+环境变量：
+    g2p_processes       进程数，默认0；<=1时关闭进程池。开启时建议设为min(4, CPU核数-1)
+    g2p_start_method    子进程的启动方式，默认fork（没有fork的平台为spawn）。主进程已经有CUDA、onnxruntime
+                        等的线程，fork出的子进程偶尔会卡死，这时可以改为forkserver或spawn，
+                        但启动脚本需要有if __name__ == "__main__"保护，否则子进程会重新执行模块顶层（加载模型等）
+    g2p_pool_languages  交给进程池的语种，默认en,ja,ko。zh/yue默认留在主进程：
+                        它们的G2PW在主进程常驻且用GPU批量推理，子进程里只能各自在CPU上再加载一份
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from text import cleaned_text_to_sequence
+from text.cleaner import clean_text
+
+warmup_texts = {
+    "en": "Hello world.",
+    "ja": "こんにちは。",
+    "ko": "안녕하세요.",
+    "zh": "你好。",
+    "yue": "你好。",
+}
+
+# fork出来的子进程里继承自父进程的G2PW（CUDA会话）不能用也不能释放，只保留引用避免被回收
+_inherited_g2pw = []
+
+
+def clean_text_inf(text: str, language: str, version: str):
+    language = language.replace("all_", "")
+    phones, word2ph, norm_text = clean_text(text, language, version)
+    phones = cleaned_text_to_sequence(phones, version)
+    return phones, word2ph, norm_text
+
+
+def clean_items(items):
+    en_texts = [text for text, language, _ in items if language.replace("all_", "") == "en"]
+    if len(en_texts) > 1:
+        from text import english
+
+        english.prefetch_oov(en_texts)
+    # v1的zh走text.chinese，没有G2PW
+    zh_texts = [text for text, language, version in items if language.replace("all_", "") == "zh" and version != "v1"]
+    if len(zh_texts) > 1:
+        from text import chinese2
+
+        chinese2.prefetch_g2pw(zh_texts)
+    return [clean_text_inf(*item) for item in items]
+
+
+def _init_worker(sys_path, languages, version):
+    for path in sys_path:
+        if path not in sys.path:
+            sys.path.append(path)
+    os.environ["g2pw_device"] = "cpu"
+    chinese2 = sys.modules.get("text.chinese2")
+    if chinese2 is not None and getattr(chinese2, "g2pw", None) is not None:
+        _inherited_g2pw.append(chinese2.g2pw)
+        chinese2.g2pw = None
+
+    import torch
+
+    torch.set_num_threads(1)
+    # 每个进程只在启动时加载一次各语种的词典和模型
+    for language in languages:
+        if language in warmup_texts:
+            clean_text_inf(warmup_texts[language], language, version)
+
+
+def default_processes() -> int:
+    return int(os.environ.get("g2p_processes", 0))
+
+
+def default_start_method() -> str:
+    methods = multiprocessing.get_all_start_methods()
+    method = os.environ.get("g2p_start_method", "fork" if "fork" in methods else "spawn")
+    return method if method in methods else "spawn"
+
+
+class FrontendPool:
+    def __init__(self, processes: int = None, languages=None, min_items: int = 8, max_failures: int = 3):
+        """
+        processes/languages: 默认取环境变量g2p_processes/g2p_pool_languages
+        min_items: 少于这么多条时在调用方线程里直接处理，不值得跨进程
+        max_failures: 进程池连续崩溃这么多次后关闭，之后都在主进程里处理
+        """
+        self.processes = default_processes() if processes is None else processes
+        if languages is None:
+            languages = os.environ.get("g2p_pool_languages", "en,ja,ko").split(",")
+        self.languages = set(language.strip() for language in languages if language.strip())
+        self.min_items = min_items
+        self.max_failures = max_failures
+        self.failures = 0
+        self.executor = None
+        self.version = None
+        # 共用的进程池可能被多个线程同时使用，创建、重建和关闭executor时持锁
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 1 and len(self.languages) > 0
+
+    def handles(self, language: str) -> bool:
+        return self.enabled and language.replace("all_", "") in self.languages
+
+    def _get_executor(self, version: str) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None or self.version != version:
+                self._shutdown(wait=True)
+                # fork不会在子进程里重新执行主脚本（api_v2等在模块顶层加载模型），见模块说明
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context(default_start_method()),
+                    initializer=_init_worker,
+                    initargs=(list(sys.path), sorted(self.languages), version),
+                )
+                self.version = version
+            return self.executor
+
+    def _on_broken(self, executor: ProcessPoolExecutor, error: Exception):
+        with self.lock:
+            # 别的线程可能已经重建过了
+            if self.executor is not executor:
+                return
+            self._shutdown(wait=False)
+            self.failures += 1
+            print(f"G2P process pool crashed ({error}), falling back to in-process G2P")
+            if self.failures >= self.max_failures:
+                print(f"G2P process pool crashed {self.failures} times in a row, disabling it")
+                self.processes = 0
+
+    def clean(self, items):
+        """
+        items: [(text, language, version)]，返回与items一一对应的(phones, word2ph, norm_text)
+        进程池负责的语种分块交给子进程，其余语种在调用方线程里同时处理
+        """
+        items = list(items)
+        if len(items) == 0:
+            return []
+        remote = []
+        if self.enabled and len(items) >= self.min_items:
+            remote = [i for i, item in enumerate(items) if self.handles(item[1])]
+        remote_set = set(remote)
+        local = [i for i in range(len(items)) if i not in remote_set]
+
+        results = [None] * len(items)
+        if remote:
+            executor = self._get_executor(items[remote[0]][2])
+            chunksize = max(1, len(remote) // (self.processes * 4))
+            chunks = [remote[start : start + chunksize] for start in range(0, len(remote), chunksize)]
+            try:
+                remote_results = executor.map(clean_items, [[items[i] for i in chunk] for chunk in chunks])
+            except BrokenProcessPool as e:
+                self._on_broken(executor, e)
+                local, remote = list(range(len(items))), []
+        for i, result in zip(local, clean_items([items[i] for i in local])):
+            results[i] = result
+        if remote:
+            try:
+                for chunk, chunk_results in zip(chunks, remote_results):
+                    for i, result in zip(chunk, chunk_results):
+                        results[i] = result
+                self.failures = 0
+            except BrokenProcessPool as e:
+                self._on_broken(executor, e)
+                for i, result in zip(remote, clean_items([items[i] for i in remote])):
+                    results[i] = result
+        return results
+
+    def _shutdown(self, wait: bool):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+
+    def shutdown(self):
+        with self.lock:
+            self._shutdown(wait=True)
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_pool() -> FrontendPool:
+    """所有TextPreprocessor共用的进程池（按环境变量配置），第一次调用时创建"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = FrontendPool()
+        return _shared_pool
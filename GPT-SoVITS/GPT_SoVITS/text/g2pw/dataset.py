@@ -37,7 +37,14 @@ def prepare_onnx_input(
     use_mask: bool = False,
     window_size: int = None,
     max_len: int = 512,
+    token_cache: dict = None,
 ) -> Dict[str, np.array]:
+    """
+    token_cache: 句子 -> 分词结果。同一句里的每个多音字各是一条query，传入同一个dict时每句只分词一次，
+    可跨多次调用（一篇文本分成多个ONNX批次时）复用
+    """
+    if token_cache is None:
+        token_cache = {}
     if window_size is not None:
         truncated_texts, truncated_query_ids = _truncate_texts(
             window_size=window_size, texts=texts, query_ids=query_ids
@@ -53,19 +60,33 @@ def prepare_onnx_input(
         text = (truncated_texts if window_size else texts)[idx].lower()
         query_id = (truncated_query_ids if window_size else query_ids)[idx]
 
-        try:
-            tokens, text2token, token2text = tokenize_and_map(tokenizer=tokenizer, text=text)
-        except Exception:
-            print(f'warning: text "{text}" is invalid')
-            return {}
+        if text not in token_cache:
+            try:
+                tokens, text2token, token2text = tokenize_and_map(tokenizer=tokenizer, text=text)
+            except Exception:
+                print(f'warning: text "{text}" is invalid')
+                return {}
+            token_cache[text] = (tokens, text2token, token2text, None)
+        full_tokens, text2token, token2text, full_input_id = token_cache[text]
 
         text, query_id, tokens, text2token, token2text = _truncate(
-            max_len=max_len, text=text, query_id=query_id, tokens=tokens, text2token=text2token, token2text=token2text
+            max_len=max_len,
+            text=text,
+            query_id=query_id,
+            tokens=full_tokens,
+            text2token=text2token,
+            token2text=token2text,
         )
 
+        if tokens is full_tokens:
+            # 未截断时整句的token id只转换一次
+            if full_input_id is None:
+                full_input_id = tokenizer.convert_tokens_to_ids(["[CLS]"] + tokens + ["[SEP]"])
+                token_cache[text] = (full_tokens, text2token, token2text, full_input_id)
+            input_id = list(full_input_id)
+        else:
+            input_id = tokenizer.convert_tokens_to_ids(["[CLS]"] + tokens + ["[SEP]"])
         processed_tokens = ["[CLS]"] + tokens + ["[SEP]"]
-
-        input_id = list(np.array(tokenizer.convert_tokens_to_ids(processed_tokens)))
         token_type_id = list(np.zeros((len(processed_tokens),), dtype=int))
         attention_mask = list(np.ones((len(processed_tokens),), dtype=int))
 
@@ -83,6 +104,12 @@ def prepare_onnx_input(
         char_ids.append(char_id)
         position_ids.append(position_id)
 
+    # 不同句子的token数不同，补齐到批内最大长度（padding位置attention_mask为0）
+    max_tokens = max((len(input_id) for input_id in input_ids), default=0)
+    for seqs in (input_ids, token_type_ids, attention_masks):
+        for seq in seqs:
+            seq.extend([0] * (max_tokens - len(seq)))
+
     outputs = {
         "input_ids": np.array(input_ids).astype(np.int64),
         "token_type_ids": np.array(token_type_ids).astype(np.int64),
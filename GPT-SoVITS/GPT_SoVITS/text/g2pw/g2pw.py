@@ -2,6 +2,7 @@
 
 import pickle
 import os
+from collections import OrderedDict
 
 from pypinyin.constants import RE_HANS
 from pypinyin.core import Pinyin, Style
@@ -25,6 +26,10 @@ class G2PWPinyin(Pinyin):
         v_to_u=False,
         neutral_tone_with_five=False,
         tone_sandhi=False,
+        max_batch_size=64,
+        gpu_mem_limit_mb=None,
+        cache_size=4096,
+        use_cuda=True,
         **kwargs,
     ):
         self._g2pw = G2PWOnnxConverter(
@@ -32,25 +37,68 @@ class G2PWPinyin(Pinyin):
             style="pinyin",
             model_source=model_source,
             enable_non_tradional_chinese=enable_non_tradional_chinese,
+            max_batch_size=max_batch_size,
+            gpu_mem_limit_mb=gpu_mem_limit_mb,
+            use_cuda=use_cuda,
         )
         self._converter = Converter(
             self._g2pw,
             v_to_u=v_to_u,
             neutral_tone_with_five=neutral_tone_with_five,
             tone_sandhi=tone_sandhi,
+            cache_size=cache_size,
         )
 
     def get_seg(self, **kwargs):
         return simple_seg
 
+    def __call__(self, sentences, style=Style.TONE3, neutral_tone_with_five=True):
+        """
+        批量版lazy_pinyin：所有句子里的汉字片段合并成一次G2PW推理，结果进入缓存后再逐句转换，
+        返回与sentences一一对应的拼音列表
+        """
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        self._converter.prefetch([words for sent in sentences for words in self.seg(sent) if RE_HANS.match(words)])
+        return [
+            self.lazy_pinyin(sent, neutral_tone_with_five=neutral_tone_with_five, style=style) for sent in sentences
+        ]
+
 
 class Converter(UltimateConverter):
-    def __init__(self, g2pw_instance, v_to_u=False, neutral_tone_with_five=False, tone_sandhi=False, **kwargs):
+    def __init__(
+        self, g2pw_instance, v_to_u=False, neutral_tone_with_five=False, tone_sandhi=False, cache_size=4096, **kwargs
+    ):
         super(Converter, self).__init__(
             v_to_u=v_to_u, neutral_tone_with_five=neutral_tone_with_five, tone_sandhi=tone_sandhi, **kwargs
         )
 
         self._g2pw = g2pw_instance
+        # 汉字片段 -> G2PW结果，LRU，最多cache_size条
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def _cache_put(self, han, result):
+        self._cache[han] = result
+        self._cache.move_to_end(han)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def prefetch(self, hans_list):
+        """对未缓存的汉字片段做一次批量G2PW推理（超出cache_size的部分留到用时再推理，避免预取结果被自己挤出缓存）"""
+        missing = list(dict.fromkeys(han for han in hans_list if han not in self._cache))[: self.cache_size]
+        if missing:
+            for han, result in zip(missing, self._g2pw(missing)):
+                self._cache_put(han, result)
+
+    def _predict(self, han):
+        result = self._cache.get(han)
+        if result is None:
+            result = self._g2pw(han)[0]
+            self._cache_put(han, result)
+        else:
+            self._cache.move_to_end(han)
+        return result
 
     def convert(self, words, style, heteronym, errors, strict, **kwargs):
         pys = []
@@ -72,12 +120,12 @@ class Converter(UltimateConverter):
     def _to_pinyin(self, han, style, heteronym, errors, strict, **kwargs):
         pinyins = []
 
-        g2pw_pinyin = self._g2pw(han)
+        g2pw_pinyin = self._predict(han)
 
         if not g2pw_pinyin:  # g2pw 不支持的汉字改为使用 pypinyin 原有逻辑
             return super(Converter, self).convert(han, Style.TONE, heteronym, errors, strict, **kwargs)
 
-        for i, item in enumerate(g2pw_pinyin[0]):
+        for i, item in enumerate(g2pw_pinyin):
             if item is None:  # g2pw 不支持的汉字改为使用 pypinyin 原有逻辑
                 py = super(Converter, self).convert(han[i], Style.TONE, heteronym, errors, strict, **kwargs)
                 pinyins.extend(py)
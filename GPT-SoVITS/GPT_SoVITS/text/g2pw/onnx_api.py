@@ -30,20 +30,29 @@ warnings.filterwarnings("ignore")
 model_version = "1.1"
 
 
-def predict(session, onnx_input: Dict[str, Any], labels: List[str]) -> Tuple[List[str], List[float]]:
+def predict(
+    session, onnx_input: Dict[str, Any], labels: List[str], io_binding: bool = False
+) -> Tuple[List[str], List[float]]:
+    """io_binding: CUDA会话上用IO binding，输入一次性拷到显存、输出留在显存上的预分配缓冲，不经过run()的逐次分配"""
     all_preds = []
     all_confidences = []
-    probs = session.run(
-        [],
-        {
-            "input_ids": onnx_input["input_ids"],
-            "token_type_ids": onnx_input["token_type_ids"],
-            "attention_mask": onnx_input["attention_masks"],
-            "phoneme_mask": onnx_input["phoneme_masks"],
-            "char_ids": onnx_input["char_ids"],
-            "position_ids": onnx_input["position_ids"],
-        },
-    )[0]
+    feeds = {
+        "input_ids": onnx_input["input_ids"],
+        "token_type_ids": onnx_input["token_type_ids"],
+        "attention_mask": onnx_input["attention_masks"],
+        "phoneme_mask": onnx_input["phoneme_masks"],
+        "char_ids": onnx_input["char_ids"],
+        "position_ids": onnx_input["position_ids"],
+    }
+    if io_binding:
+        binding = session.io_binding()
+        for name, value in feeds.items():
+            binding.bind_cpu_input(name, np.ascontiguousarray(value))
+        binding.bind_output(session.get_outputs()[0].name, "cuda")
+        session.run_with_iobinding(binding)
+        probs = binding.copy_outputs_to_cpu()[0]
+    else:
+        probs = session.run([], feeds)[0]
 
     preds = np.argmax(probs, axis=1).tolist()
     max_probs = []
@@ -106,18 +115,30 @@ class G2PWOnnxConverter:
         style: str = "bopomofo",
         model_source: str = None,
         enable_non_tradional_chinese: bool = False,
+        max_batch_size: int = 64,
+        gpu_mem_limit_mb: int = None,
+        use_cuda: bool = True,
     ):
+        """
+        max_batch_size: 单次ONNX推理最多处理的多音字数，限制激活显存/内存的峰值
+        gpu_mem_limit_mb: CUDA显存池上限(MB)，None为不限制；显存池按需增长，不会按倍数预留
+        use_cuda: False时只用CPUExecutionProvider（如G2P子进程中）
+        """
         uncompress_path = download_and_decompress(model_dir)
+        self.max_batch_size = max(1, int(max_batch_size))
 
         sess_options = onnxruntime.SessionOptions()
         sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
         sess_options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
         sess_options.intra_op_num_threads = 2 if torch.cuda.is_available() else 0
-        if "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+        if use_cuda and "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+            cuda_options = {"arena_extend_strategy": "kSameAsRequested"}
+            if gpu_mem_limit_mb:
+                cuda_options["gpu_mem_limit"] = int(gpu_mem_limit_mb) * 1024 * 1024
             self.session_g2pW = onnxruntime.InferenceSession(
                 os.path.join(uncompress_path, "g2pW.onnx"),
                 sess_options=sess_options,
-                providers=["CUDAExecutionProvider", "CPUExecutionProvider"],
+                providers=[("CUDAExecutionProvider", cuda_options), "CPUExecutionProvider"],
             )
         else:
             self.session_g2pW = onnxruntime.InferenceSession(
@@ -125,6 +146,7 @@ class G2PWOnnxConverter:
                 sess_options=sess_options,
                 providers=["CPUExecutionProvider"],
             )
+        self.io_binding = "CUDAExecutionProvider" in self.session_g2pW.get_providers()
         self.config = load_config(config_path=os.path.join(uncompress_path, "config.py"), use_default=True)
 
         self.model_source = model_source if model_source else self.config.model_source
@@ -188,6 +210,8 @@ class G2PWOnnxConverter:
             "bopomofo": lambda x: x,
             "pinyin": self._convert_bopomofo_to_pinyin,
         }[style]
+        # 预测标签 -> 输出风格，标签只有几百个，每个只转换一次
+        self._style_cache = {}
 
         with open(os.path.join(uncompress_path, "char_bopomofo_dict.json"), "r", encoding="utf-8") as fr:
             self.char_bopomofo_dict = json.load(fr)
@@ -253,7 +277,16 @@ class G2PWOnnxConverter:
             print(f'Warning: "{bopomofo}" cannot convert to pinyin')
             return None
 
+    def _convert_style(self, label: str) -> str:
+        if label not in self._style_cache:
+            self._style_cache[label] = self.style_convert_func(label)
+        return self._style_cache[label]
+
     def __call__(self, sentences: List[str]) -> List[List[str]]:
+        """
+        sentences可以是一整篇文本的所有句子：所有句子的多音字汇总后按句长排序，分成padding后的ONNX批次推理，
+        开销随批次数而不是句子数增长；返回与sentences一一对应的逐字结果
+        """
         if isinstance(sentences, str):
             sentences = [sentences]
 
@@ -270,24 +303,32 @@ class G2PWOnnxConverter:
             # sentences no polyphonic words
             return partial_results
 
-        onnx_input = prepare_onnx_input(
-            tokenizer=self.tokenizer,
-            labels=self.labels,
-            char2phonemes=self.char2phonemes,
-            chars=self.chars,
-            texts=texts,
-            query_ids=query_ids,
-            use_mask=self.config.use_mask,
-            window_size=None,
-        )
+        # 多句的多音字一起推理：按句长排序减少padding，每批不超过max_batch_size
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        results = partial_results
+        token_cache = {}
+        for start in range(0, len(order), self.max_batch_size):
+            batch = order[start : start + self.max_batch_size]
+            onnx_input = prepare_onnx_input(
+                tokenizer=self.tokenizer,
+                labels=self.labels,
+                char2phonemes=self.char2phonemes,
+                chars=self.chars,
+                texts=[texts[i] for i in batch],
+                query_ids=[query_ids[i] for i in batch],
+                use_mask=self.config.use_mask,
+                window_size=None,
+                token_cache=token_cache,
+            )
 
-        preds, confidences = predict(session=self.session_g2pW, onnx_input=onnx_input, labels=self.labels)
-        if self.config.use_char_phoneme:
-            preds = [pred.split(" ")[1] for pred in preds]
+            preds, confidences = predict(
+                session=self.session_g2pW, onnx_input=onnx_input, labels=self.labels, io_binding=self.io_binding
+            )
+            if self.config.use_char_phoneme:
+                preds = [pred.split(" ")[1] for pred in preds]
 
-        results = partial_results
-        for sent_id, query_id, pred in zip(sent_ids, query_ids, preds):
-            results[sent_id][query_id] = self.style_convert_func(pred)
+            for i, pred in zip(batch, preds):
+                results[sent_ids[i]][query_ids[i]] = self._convert_style(pred)
 
         return results
 
@@ -304,7 +345,7 @@ class G2PWOnnxConverter:
                     query_ids.append(i)
                     sent_ids.append(sent_id)
                 elif char in self.monophonic_chars_dict:
-                    partial_result[i] = self.style_convert_func(self.monophonic_chars_dict[char])
+                    partial_result[i] = self._convert_style(self.monophonic_chars_dict[char])
                 elif char in self.char_bopomofo_dict:
                     partial_result[i] = pypinyin_result[i][0]
                     # partial_result[i] =  self.style_convert_func(self.char_bopomofo_dict[char][0])
@@ -0,0 +1,170 @@
+"""
+内存映射的发音词典：按字节排序的单词 + 压缩的音素id数组，文件只读mmap，同一台机器上的多个进程共享page cache，
+打开几乎不花时间，也不会在每个进程里各自展开成几十万个Python list
+
+对外表现得像原来的 {word: [[phone, ...], ...]} 字典（in / [] / get / del / 赋值），
+赋值和删除只作用于当前进程的覆盖层（如engdict-hot.rep热词、en_G2p剔除的缩写），不写回文件
+
+文件格式（本机字节序，索引是本机生成的缓存文件）：
+    b"GSPD" | u32 格式版本 | u32 单词数 | u32 读音数 | u32 音素数 | u32 音素表json长度 | 音素表json
+    u32[单词数+1]  单词在key区的偏移      | key区（utf-8，按字节排序）| 补齐到4字节
+    u32[单词数+1]  单词对应的读音区间
+    u32[读音数+1]  读音对应的音素区间
+    u16[音素数]    音素id
+"""
+
+import json
+import mmap
+import os
+import struct
+from array import array
+from functools import lru_cache
+
+MAGIC = b"GSPD"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("=4sIIIII")
+
+
+def write_index(entries: dict, path: str):
+    """entries: {word: [[phone, ...], ...]}，原子写入path"""
+    words = sorted(entries, key=lambda word: word.encode("utf-8"))
+    phone_table = sorted({phone for word in words for pron in entries[word] for phone in pron})
+    phone_to_id = {phone: i for i, phone in enumerate(phone_table)}
+
+    key_blob = bytearray()
+    key_offsets = [0]
+    word_prons = [0]
+    pron_phones = [0]
+    phone_ids = []
+    for word in words:
+        key_blob += word.encode("utf-8")
+        key_offsets.append(len(key_blob))
+        for pron in entries[word]:
+            phone_ids.extend(phone_to_id[phone] for phone in pron)
+            pron_phones.append(len(phone_ids))
+        word_prons.append(len(pron_phones) - 1)
+    key_blob += b"\0" * (-len(key_blob) % 4)
+
+    table = json.dumps(phone_table).encode("utf-8")
+    table += b" " * (-(_HEADER.size + len(table)) % 4)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(words), len(pron_phones) - 1, len(phone_ids), len(table)))
+        f.write(table)
+        f.write(array("I", key_offsets).tobytes())
+        f.write(bytes(key_blob))
+        f.write(array("I", word_prons).tobytes())
+        f.write(array("I", pron_phones).tobytes())
+        f.write(array("H", phone_ids).tobytes())
+    os.replace(tmp_path, path)
+
+
+class MmapPronDict:
+    def __init__(self, path: str, cache_size: int = 65536):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_words, n_prons, n_phones, table_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a pronunciation index (version {FORMAT_VERSION})")
+        offset = _HEADER.size
+        self.phone_table = json.loads(self._mm[offset : offset + table_len])
+        offset += table_len
+        # 各数组都是mmap上的零拷贝视图
+        buffer = memoryview(self._mm)
+        self._key_offsets = buffer[offset : offset + 4 * (n_words + 1)].cast("I")
+        offset += 4 * (n_words + 1)
+        self._keys_start = offset
+        offset += self._key_offsets[-1] + (-self._key_offsets[-1] % 4)
+        self._word_prons = buffer[offset : offset + 4 * (n_words + 1)].cast("I")
+        offset += 4 * (n_words + 1)
+        self._pron_phones = buffer[offset : offset + 4 * (n_prons + 1)].cast("I")
+        offset += 4 * (n_prons + 1)
+        self._phone_ids = buffer[offset : offset + 2 * n_phones].cast("H")
+        self._n_words = n_words
+        self._overlay = {}
+        self._removed = set()
+        self._lookup = lru_cache(maxsize=cache_size)(self._lookup_index)
+
+    @classmethod
+    def open_or_build(cls, path: str, sources: list, load_entries):
+        """
+        path不存在或比任一源文件旧时用load_entries()重建；目录不可写时退回load_entries()得到的普通dict
+        """
+        sources = [source for source in sources if os.path.exists(source)]
+        newest_source = max((os.path.getmtime(source) for source in sources), default=0)
+        if not os.path.exists(path) or os.path.getmtime(path) < newest_source:
+            entries = load_entries()
+            try:
+                write_index(entries, path)
+            except OSError as e:
+                print(f"Could not write pronunciation index {path}, using an in-memory dict: {e}")
+                return entries
+        return cls(path)
+
+    def _find(self, word: str) -> int:
+        target = word.encode("utf-8")
+        lo, hi = 0, self._n_words
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._keys_start + self._key_offsets[mid]
+            end = self._keys_start + self._key_offsets[mid + 1]
+            if self._mm[start:end] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n_words:
+            start = self._keys_start + self._key_offsets[lo]
+            end = self._keys_start + self._key_offsets[lo + 1]
+            if self._mm[start:end] == target:
+                return lo
+        return -1
+
+    def _lookup_index(self, word: str):
+        index = self._find(word)
+        if index < 0:
+            return None
+        prons = []
+        for pron in range(self._word_prons[index], self._word_prons[index + 1]):
+            ids = self._phone_ids[self._pron_phones[pron] : self._pron_phones[pron + 1]]
+            prons.append(tuple(self.phone_table[i] for i in ids))
+        return tuple(prons)
+
+    def _get(self, word: str):
+        if word in self._overlay:
+            return self._overlay[word]
+        if word in self._removed:
+            return None
+        prons = self._lookup(word)
+        # 每次返回新的list，调用方修改结果不会影响缓存
+        return None if prons is None else [list(pron) for pron in prons]
+
+    def __contains__(self, word) -> bool:
+        if word in self._overlay:
+            return True
+        return word not in self._removed and self._lookup(word) is not None
+
+    def __getitem__(self, word):
+        prons = self._get(word)
+        if prons is None:
+            raise KeyError(word)
+        return prons
+
+    def get(self, word, default=None):
+        prons = self._get(word)
+        return default if prons is None else prons
+
+    def __setitem__(self, word, prons):
+        self._removed.discard(word)
+        self._overlay[word] = prons
+
+    def __delitem__(self, word):
+        if word not in self:
+            raise KeyError(word)
+        self._overlay.pop(word, None)
+        self._removed.add(word)
+
+    def __len__(self) -> int:
+        added = sum(1 for word in self._overlay if self._lookup(word) is None)
+        removed = sum(1 for word in self._removed if self._lookup(word) is not None)
+        return self._n_words + added - removed
@@ -0,0 +1,69 @@
+"""
+中文前端的词级缓存：一个词的声母/韵母、变调和儿化结果只取决于(词, 词性)以及G2PW给出的逐字读音，
+一季剧本里的常用词要重复计算上百万次。进程内所有中文前端（chinese、chinese2）共用一个有界LRU，
+key的第一项区分前端
+
+环境变量：g2p_word_cache_size（条数，默认65536，0为关闭）
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class WordPronCache:
+    def __init__(self, max_entries: int = None):
+        if max_entries is None:
+            max_entries = int(os.environ.get("g2p_word_cache_size", "65536"))
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: tuple, compute):
+        """
+        compute() -> (initials, finals)，未命中时调用；返回新的list，调用方可以原地修改
+        """
+        value = None
+        if self.max_entries > 0:
+            with self.lock:
+                value = self.entries.get(key)
+                if value is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+        if value is None:
+            initials, finals = compute()
+            value = (tuple(initials), tuple(finals))
+            with self.lock:
+                self.misses += 1
+                if self.max_entries > 0:
+                    self.entries[key] = value
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+        return list(value[0]), list(value[1])
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+        }
+
+    def report(self) -> str:
+        stats = self.stats()
+        return (
+            f"Word pronunciation cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries)"
+        )
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+word_pron_cache = WordPronCache()
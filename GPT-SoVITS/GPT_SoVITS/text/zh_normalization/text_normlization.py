@@ -12,8 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import re
+from functools import lru_cache
 from typing import List
 
+from .char_convert import t2s_dict
 from .char_convert import tranditional_to_simplified
 from .chronology import RE_DATE
 from .chronology import RE_DATE2
@@ -58,9 +60,90 @@ from .quantifier import replace_measure
 from .quantifier import replace_temperature
 
 
+RE_DIGIT = re.compile(r"\d")
+RE_ZH_SPECIAL = re.compile(r"[——《》【】<>{}()（）#&@“”^_|\\]")
+RE_SENTENCE_BREAKS = re.compile(r"\n+")
+RE_POST_SPECIAL = re.compile(r"[-——《》【】<=>{}()（）#&@“”^_|\\]")
+
+
+def _basic_conversion(char: str) -> str:
+    return char.translate(F2H_ASCII_LETTERS).translate(F2H_DIGITS).translate(F2H_SPACE)
+
+
+# 繁转简 + 全角转半角合成一张逐字映射表，一次translate完成（与依次转换结果相同）
+BASIC_TABLE = {}
+for _char in set(t2s_dict) | {chr(code) for code in F2H_ASCII_LETTERS} | {chr(code) for code in F2H_DIGITS}:
+    _converted = _basic_conversion(tranditional_to_simplified(_char))
+    if _converted != _char:
+        BASIC_TABLE[ord(_char)] = _converted
+
+# _post_replace里的逐字替换；替换结果里不含任何待替换字符，一次translate与依次replace结果相同
+POST_REPLACE_TABLE = str.maketrans(
+    {
+        "/": "每",
+        "①": "一",
+        "②": "二",
+        "③": "三",
+        "④": "四",
+        "⑤": "五",
+        "⑥": "六",
+        "⑦": "七",
+        "⑧": "八",
+        "⑨": "九",
+        "⑩": "十",
+        "α": "阿尔法",
+        "β": "贝塔",
+        "γ": "伽玛",
+        "Γ": "伽玛",
+        "δ": "德尔塔",
+        "Δ": "德尔塔",
+        "ε": "艾普西龙",
+        "ζ": "捷塔",
+        "η": "依塔",
+        "θ": "西塔",
+        "Θ": "西塔",
+        "ι": "艾欧塔",
+        "κ": "喀帕",
+        "λ": "拉姆达",
+        "Λ": "拉姆达",
+        "μ": "缪",
+        "ν": "拗",
+        "ξ": "克西",
+        "Ξ": "克西",
+        "ο": "欧米克伦",
+        "π": "派",
+        "Π": "派",
+        "ρ": "肉",
+        "ς": "西格玛",
+        "Σ": "西格玛",
+        "σ": "西格玛",
+        "τ": "套",
+        "υ": "宇普西龙",
+        "φ": "服艾",
+        "Φ": "服艾",
+        "χ": "器",
+        "ψ": "普赛",
+        "Ψ": "普赛",
+        "ω": "欧米伽",
+        "Ω": "欧米伽",
+        "+": "加",
+        "-": "减",
+        "×": "乘",
+        "÷": "除",
+        "=": "等",
+    }
+)
+
+
 class TextNormalizer:
-    def __init__(self):
+    def __init__(self, cache_size: int = 8192):
+        """
+        cache_size: 按句缓存规范化结果的条数，剧本台词里重复的句子（语气词、称呼、口头禅）直接命中，0为不缓存
+        """
         self.SENTENCE_SPLITOR = re.compile(r"([：、，；。？！,;?!][”’]?)")
+        self.normalize_sentence = (
+            lru_cache(maxsize=cache_size)(self._normalize_sentence) if cache_size > 0 else self._normalize_sentence
+        )
 
     def _split(self, text: str, lang="zh") -> List[str]:
         """Split long text into sentences with sentence-splitting punctuations.
@@ -73,13 +156,18 @@ class TextNormalizer:
         if lang == "zh":
             text = text.replace(" ", "")
             # 过滤掉特殊字符
-            text = re.sub(r"[——《》【】<>{}()（）#&@“”^_|\\]", "", text)
+            text = RE_ZH_SPECIAL.sub("", text)
         text = self.SENTENCE_SPLITOR.sub(r"\1\n", text)
         text = text.strip()
-        sentences = [sentence.strip() for sentence in re.split(r"\n+", text)]
+        sentences = [sentence.strip() for sentence in RE_SENTENCE_BREAKS.split(text)]
         return sentences
 
     def _post_replace(self, sentence: str) -> str:
+        sentence = sentence.translate(POST_REPLACE_TABLE)
+        # re filter special characters, have one more character "-" than line 68
+        return RE_POST_SPECIAL.sub("", sentence)
+
+    def _post_replace_reference(self, sentence: str) -> str:
         sentence = sentence.replace("/", "每")
         # sentence = sentence.replace('~', '至')
         # sentence = sentence.replace('～', '至')
@@ -127,7 +215,46 @@ class TextNormalizer:
         sentence = re.sub(r"[-——《》【】<=>{}()（）#&@“”^_|\\]", "", sentence)
         return sentence
 
-    def normalize_sentence(self, sentence: str) -> str:
+    def _normalize_sentence(self, sentence: str) -> str:
+        """
+        与normalize_sentence_reference的规则和顺序相同，结果逐字一致：
+        字符级转换各合成一次translate；只在含数字的句子上跑只能匹配数字的规则
+        （这些规则都不会产生数字，只有RE_POWER会，所以在它之后重新判断一次）
+        """
+        sentence = sentence.translate(BASIC_TABLE)
+
+        if RE_DIGIT.search(sentence):
+            sentence = RE_DATE.sub(replace_date, sentence)
+            sentence = RE_DATE2.sub(replace_date2, sentence)
+            sentence = RE_TIME_RANGE.sub(replace_time, sentence)
+            sentence = RE_TIME.sub(replace_time, sentence)
+            sentence = RE_TO_RANGE.sub(replace_to_range, sentence)
+            sentence = RE_TEMPERATURE.sub(replace_temperature, sentence)
+        # 单位符号不需要数字也会替换
+        sentence = replace_measure(sentence)
+
+        # 处理数学运算（字母也可以是操作数）
+        while RE_ASMD.search(sentence):
+            sentence = RE_ASMD.sub(replace_asmd, sentence)
+        sentence = RE_POWER.sub(replace_power, sentence)
+
+        if RE_DIGIT.search(sentence):
+            sentence = RE_FRAC.sub(replace_frac, sentence)
+            sentence = RE_PERCENTAGE.sub(replace_percentage, sentence)
+            sentence = RE_MOBILE_PHONE.sub(replace_mobile, sentence)
+            sentence = RE_TELEPHONE.sub(replace_phone, sentence)
+            sentence = RE_NATIONAL_UNIFORM_NUMBER.sub(replace_phone, sentence)
+            sentence = RE_RANGE.sub(replace_range, sentence)
+            sentence = RE_INTEGER.sub(replace_negative_num, sentence)
+            sentence = RE_VERSION_NUM.sub(replace_vrsion_num, sentence)
+            sentence = RE_DECIMAL_NUM.sub(replace_number, sentence)
+            sentence = RE_POSITIVE_QUANTIFIERS.sub(replace_positive_quantifier, sentence)
+            sentence = RE_DEFAULT_NUM.sub(replace_default_num, sentence)
+            sentence = RE_NUMBER.sub(replace_number, sentence)
+        return self._post_replace(sentence)
+
+    def normalize_sentence_reference(self, sentence: str) -> str:
+        """逐条依次替换的原始实现，用于校验_normalize_sentence（见GPT_SoVITS/benchmark_zh_normalization.py）"""
         # basic character conversions
         sentence = tranditional_to_simplified(sentence)
         sentence = sentence.translate(F2H_ASCII_LETTERS).translate(F2H_DIGITS).translate(F2H_SPACE)
@@ -165,7 +292,7 @@ class TextNormalizer:
         sentence = RE_POSITIVE_QUANTIFIERS.sub(replace_positive_quantifier, sentence)
         sentence = RE_DEFAULT_NUM.sub(replace_default_num, sentence)
         sentence = RE_NUMBER.sub(replace_number, sentence)
-        sentence = self._post_replace(sentence)
+        sentence = self._post_replace_reference(sentence)
 
         return sentence
 
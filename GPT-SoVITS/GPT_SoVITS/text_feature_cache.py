@@ -0,0 +1,137 @@
+"""
+文本前端结果缓存：语种切分、G2P、文本规范化和BERT特征只取决于(文本, 语种, 版本, BERT模型, BERT精度, 前端版本)，
+同一说话人的参考文本每句都要重算，剧集台词也大量重复，缓存后直接复用
+
+修改语种切分、G2P或文本规范化（text/下的前端）的输出时要增加FRONTEND_VERSION，让落盘的旧结果失效
+
+内存里是LRU；指定cache_dir时同时写入磁盘（每条一个.pt），进程重启后仍可命中
+环境变量：text_feature_cache_size（内存条数，默认1024，0为关闭）、text_feature_cache_dir（默认不落盘）
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+
+FRONTEND_VERSION = "1"
+
+
+def bert_precision(dtype: torch.dtype, cpu_int8: bool = False, cpu_bf16: bool = False) -> str:
+    """缓存key里的BERT精度：int8量化和bf16 autocast算出的特征与fp32/fp16不同，不能混用"""
+    if cpu_int8:
+        return "int8"
+    if cpu_bf16:
+        return "bf16"
+    return str(dtype).replace("torch.", "")
+
+
+class TextFeatureCache:
+    def __init__(self, max_entries: int = None, cache_dir: str = None):
+        if max_entries is None:
+            max_entries = int(os.environ.get("text_feature_cache_size", "1024"))
+        if cache_dir is None:
+            cache_dir = os.environ.get("text_feature_cache_dir") or None
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or bool(self.cache_dir)
+
+    @staticmethod
+    def make_key(text: str, language: str, version: str, bert_id: str, bert_precision: str = "float32") -> str:
+        fields = [text, language, version, str(bert_id), bert_precision, FRONTEND_VERSION]
+        return hashlib.sha1("\x00".join(fields).encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".pt")
+
+    def get(self, key: str):
+        """
+        返回{"phones", "word2ph", "norm_text", "bert"}，bert为cpu上的float32 [1024, len(phones)]，
+        使用前转换成推理的dtype；未命中返回None
+        """
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+        if self.cache_dir:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                try:
+                    value = torch.load(path, map_location="cpu", weights_only=True)
+                except Exception as e:
+                    print(f"text feature cache: ignoring unreadable {path}: {e}")
+                else:
+                    with self.lock:
+                        self.disk_hits += 1
+                        self._put_memory(key, value)
+                    return value
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def __contains__(self, key: str) -> bool:
+        """只判断是否已缓存（如预取前跳过已命中的句子），不计入命中统计，不改变LRU顺序"""
+        with self.lock:
+            if key in self.entries:
+                return True
+        return bool(self.cache_dir) and os.path.exists(self._disk_path(key))
+
+    def put(self, key: str, phones: list, word2ph: list, norm_text: str, bert: torch.Tensor):
+        value = {
+            "phones": list(phones),
+            "word2ph": word2ph,
+            "norm_text": norm_text,
+            "bert": bert.detach().float().cpu(),
+        }
+        with self.lock:
+            self._put_memory(key, value)
+        if self.cache_dir:
+            path = self._disk_path(key)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                torch.save(value, tmp_path)
+                os.replace(tmp_path, path)
+        return value
+
+    def _put_memory(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+        }
+
+    def report(self) -> str:
+        stats = self.stats()
+        return (
+            f"Text feature cache: {stats['hits']} memory hits, {stats['disk_hits']} disk hits, "
+            f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries)"
+        )
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
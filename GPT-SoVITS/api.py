@@ -26,6 +26,11 @@
 `-hb` - `cnhubert路径`
 `-b` - `bert路径`
 
+`-mq` - `排队和正在推理的请求数上限, 超过时返回429, 默认32, 0为不限制`
+`-to` - `推理超时时间(秒), 流式返回时为每一段的等待时间, 超时返回504并停止推理, 默认300, 0为不限制`
+
+推理在单独的工作线程里按顺序执行, 推理期间其他接口仍可正常响应, 见GPT_SoVITS/request_scheduler.py
+
 ## 调用:
 
 ### 推理
@@ -95,6 +100,8 @@ POST:
 RESP:
 成功: 直接返回 wav 音频流， http code 200
 失败: 返回包含错误信息的 json, http code 400
+排队的请求已满: http code 429
+超时: http code 504
 
 
 ### 更换默认参考音频
@@ -138,12 +145,21 @@ POST:
 
 RESP: 无
 
+
+### 服务状态
+
+endpoint: `/health`
+
+RESP: 排队、拒绝、取消的请求数等调度统计, json, http code 200
+
 """
 
 import argparse
+import asyncio
 import os
 import re
 import sys
+import threading
 
 now_dir = os.getcwd()
 sys.path.append(now_dir)
@@ -157,12 +173,14 @@ import torchaudio
 import librosa
 import soundfile as sf
 from fastapi import FastAPI, Request, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse, JSONResponse
 import uvicorn
 from transformers import AutoModelForMaskedLM, AutoTokenizer
 import numpy as np
 from feature_extractor import cnhubert
 from io import BytesIO
+from request_scheduler import SchedulerFull, TTSRequestScheduler
 from module.models import Generator, SynthesizerTrn, SynthesizerTrnV3
 from peft import LoraConfig, get_peft_model
 from AR.models.t2s_lightning_module import Text2SemanticLightningModule
@@ -539,9 +557,6 @@ def get_bert_inf(phones, word2ph, norm_text, language):
     return bert
 
 
-from text import chinese
-
-
 def get_phones_and_bert(text, language, version, final=False):
     text = re.sub(r' {2,}', ' ', text)
     textlist = []
@@ -827,6 +842,10 @@ splits = {
 }
 
 
+# 置位后get_tts_wav在下一段文本开始前停止（请求超时或客户端断开）
+tts_stop_event = threading.Event()
+
+
 def get_tts_wav(
     ref_wav_path,
     prompt_text,
@@ -917,6 +936,8 @@ def get_tts_wav(
     audio_bytes = BytesIO()
 
     for text in texts:
+        if tts_stop_event.is_set():
+            break
         # 简单防止纯符号引发参考音频泄露
         if only_punc(text):
             continue
@@ -1068,6 +1089,17 @@ def get_tts_wav(
         yield audio_bytes.getvalue()
 
 
+class TTSWorker:
+    """让TTSRequestScheduler在工作线程里运行get_tts_wav"""
+
+    def run(self, req):
+        tts_stop_event.clear()
+        return get_tts_wav(**req)
+
+    def stop(self):
+        tts_stop_event.set()
+
+
 def handle_control(command):
     if command == "restart":
         os.execl(g_config.python_exec, g_config.python_exec, *sys.argv)
@@ -1097,7 +1129,7 @@ def handle_change(path, text, language):
     return JSONResponse({"code": 0, "message": "Success"}, status_code=200)
 
 
-def handle(
+async def handle(
     refer_wav_path,
     prompt_text,
     prompt_language,
@@ -1133,21 +1165,41 @@ def handle(
     else:
         text = cut_text(text, cut_punc)
 
+    req = dict(
+        ref_wav_path=refer_wav_path,
+        prompt_text=prompt_text,
+        prompt_language=prompt_language,
+        text=text,
+        text_language=text_language,
+        top_k=top_k,
+        top_p=top_p,
+        temperature=temperature,
+        speed=speed,
+        inp_refs=inp_refs,
+        sample_steps=sample_steps,
+        if_sr=if_sr,
+    )
+    # 推理在工作线程里运行，这里只等待输出，不阻塞事件循环
+    try:
+        job = tts_scheduler.submit_stream(req)
+    except SchedulerFull as e:
+        return JSONResponse({"code": 429, "message": f"服务繁忙, 请稍后重试: {e}"}, status_code=429)
+
+    try:
+        # 第一段出来之前出错或超时还能返回错误码
+        first_chunk = await job.next_chunk(request_timeout)
+    except asyncio.TimeoutError:
+        tts_scheduler.cancel(job)
+        return JSONResponse({"code": 504, "message": f"推理超时({request_timeout}s)"}, status_code=504)
+    except asyncio.CancelledError:
+        # 客户端断开
+        tts_scheduler.cancel(job)
+        raise
+    except Exception as e:
+        return JSONResponse({"code": 400, "message": str(e)}, status_code=400)
+
     return StreamingResponse(
-        get_tts_wav(
-            refer_wav_path,
-            prompt_text,
-            prompt_language,
-            text,
-            text_language,
-            top_k,
-            top_p,
-            temperature,
-            speed,
-            inp_refs,
-            sample_steps,
-            if_sr,
-        ),
+        tts_scheduler.iter_stream(job, first_chunk, request_timeout),
         media_type="audio/" + media_type,
     )
 
@@ -1213,6 +1265,8 @@ parser.add_argument("-cp", "--cut_punc", type=str, default="", help="文本切
 # 切割常用分句符为 `python ./api.py -cp ".?!。？！"`
 parser.add_argument("-hb", "--hubert_path", type=str, default=g_config.cnhubert_path, help="覆盖config.cnhubert_path")
 parser.add_argument("-b", "--bert_path", type=str, default=g_config.bert_path, help="覆盖config.bert_path")
+parser.add_argument("-mq", "--max_queue_size", type=int, default=32, help="排队的最大请求数, 超过返回429, 0为不限制")
+parser.add_argument("-to", "--request_timeout", type=float, default=300, help="推理超时时间(秒), 0为不限制")
 
 args = parser.parse_args()
 sovits_path = args.sovits_path
@@ -1223,6 +1277,7 @@ host = args.bind_addr
 cnhubert_base_path = args.hubert_path
 bert_path = args.bert_path
 default_cut_punc = args.cut_punc
+request_timeout = args.request_timeout if args.request_timeout > 0 else None
 
 # 应用参数配置
 default_refer = DefaultRefer(args.default_refer_path, args.default_refer_text, args.default_refer_language)
@@ -1290,6 +1345,8 @@ else:
     bert_model = bert_model.to(device)
     ssl_model = ssl_model.to(device)
 change_gpt_sovits_weights(gpt_path=gpt_path, sovits_path=sovits_path)
+# get_tts_wav用的是模块级的模型，请求不合并，逐个执行
+tts_scheduler = TTSRequestScheduler(TTSWorker(), max_batch_size=1, max_queue_size=args.max_queue_size)
 
 
 # --------------------------------
@@ -1301,8 +1358,11 @@ app = FastAPI()
 @app.post("/set_model")
 async def set_model(request: Request):
     json_post_raw = await request.json()
-    return change_gpt_sovits_weights(
-        gpt_path=json_post_raw.get("gpt_model_path"), sovits_path=json_post_raw.get("sovits_model_path")
+    return await run_in_threadpool(
+        tts_scheduler.run_exclusive,
+        change_gpt_sovits_weights,
+        gpt_path=json_post_raw.get("gpt_model_path"),
+        sovits_path=json_post_raw.get("sovits_model_path"),
     )
 
 
@@ -1311,7 +1371,9 @@ async def set_model(
     gpt_model_path: str = None,
     sovits_model_path: str = None,
 ):
-    return change_gpt_sovits_weights(gpt_path=gpt_model_path, sovits_path=sovits_model_path)
+    return await run_in_threadpool(
+        tts_scheduler.run_exclusive, change_gpt_sovits_weights, gpt_path=gpt_model_path, sovits_path=sovits_model_path
+    )
 
 
 @app.post("/control")
@@ -1325,6 +1387,11 @@ async def control(command: str = None):
     return handle_control(command)
 
 
+@app.get("/health")
+async def health():
+    return JSONResponse({"code": 0, "message": "ok", "scheduler": tts_scheduler.stats()}, status_code=200)
+
+
 @app.post("/change_refer")
 async def change_refer(request: Request):
     json_post_raw = await request.json()
@@ -1341,7 +1408,7 @@ async def change_refer(refer_wav_path: str = None, prompt_text: str = None, prom
 @app.post("/")
 async def tts_endpoint(request: Request):
     json_post_raw = await request.json()
-    return handle(
+    return await handle(
         json_post_raw.get("refer_wav_path"),
         json_post_raw.get("prompt_text"),
         json_post_raw.get("prompt_language"),
@@ -1374,7 +1441,7 @@ async def tts_endpoint(
     sample_steps: int = 32,
     if_sr: bool = False,
 ):
-    return handle(
+    return await handle(
         refer_wav_path,
         prompt_text,
         prompt_language,
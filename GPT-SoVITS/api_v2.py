@@ -7,6 +7,18 @@
     `-a` - `绑定地址, 默认"127.0.0.1"`
     `-p` - `绑定端口, 默认9880`
     `-c` - `TTS配置文件路径, 默认"GPT_SoVITS/configs/tts_infer.yaml"`
+    `--max_batch_requests` - `最多合并成一次推理的/tts请求数, 默认8, 1为不合并`
+    `--max_batch_wait_ms` - `收到请求后最多等待多少毫秒来凑批, 默认20`
+    `--max_queue_size` - `排队和正在推理的/tts请求数上限, 超过时返回429, 默认32, 0为不限制`
+    `--request_timeout` - `/tts请求的超时时间(秒), 流式请求为每一段的等待时间, 超时返回504并停止推理, 默认300, 0为不限制`
+    `--max_resident_weights` - `最多同时常驻的(GPT, SoVITS)权重组数, 默认4`
+    `--weights_memory_mb` - `常驻权重的总大小上限(MB), 超过时按LRU淘汰, 默认0为只按组数限制`
+
+并发的非流式/tts请求中，参考音频、提示文本和推理参数都相同（且seed为-1）的请求会在等待窗口内合并成一批推理，
+见GPT_SoVITS/request_scheduler.py
+
+/tts请求可以用gpt_weights_path、sovits_weights_path指定这次使用的权重（不指定时用默认权重），
+用过的权重组常驻显存，BERT和cnhubert共用，见GPT_SoVITS/TTS_infer_pack/weight_registry.py
 
 ## 调用:
 
@@ -38,15 +50,22 @@ POST:
     "streaming_mode": False,      # bool. whether to return a streaming response.
     "seed": -1,                   # int. random seed for reproducibility.
     "parallel_infer": True,       # bool. whether to use parallel inference.
+    "continuous_batching": True,  # bool. refill finished T2S batch slots with the remaining sentences.
     "repetition_penalty": 1.35,   # float. repetition penalty for T2S model.
     "sample_steps": 32,           # int. number of sampling steps for VITS model V3.
-    "super_sampling": False       # bool. whether to use super-sampling for audio when using VITS model V3.
+    "super_sampling": False,      # bool. whether to use super-sampling for audio when using VITS model V3.
+    "gpt_weights_path": "",       # str.(optional) GPT weights for this request, default if empty.
+    "sovits_weights_path": ""     # str.(optional) SoVITS weights for this request, default if empty.
 }
 ```
 
 RESP:
 成功: 直接返回 wav 音频流， http code 200
 失败: 返回包含错误信息的 json, http code 400
+排队的请求已满: http code 429
+超时: http code 504
+
+服务状态、调度统计和常驻权重（加载、淘汰次数）: `/health`
 
 ### 命令控制
 
@@ -72,6 +91,8 @@ RESP: 无
 
 ### 切换GPT模型
 
+修改默认权重组的GPT权重，不影响指定了gpt_weights_path的请求
+
 endpoint: `/set_gpt_weights`
 
 GET:
@@ -85,6 +106,8 @@ RESP:
 
 ### 切换Sovits模型
 
+修改默认权重组的SoVITS权重，不影响指定了sovits_weights_path的请求
+
 endpoint: `/set_sovits_weights`
 
 GET:
@@ -98,10 +121,10 @@ RESP:
 
 """
 
+import asyncio
 import os
 import sys
 import traceback
-from typing import Generator
 
 now_dir = os.getcwd()
 sys.path.append(now_dir)
@@ -114,12 +137,15 @@ import signal
 import numpy as np
 import soundfile as sf
 from fastapi import FastAPI, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse, JSONResponse
 import uvicorn
 from io import BytesIO
 from tools.i18n.i18n import I18nAuto
 from GPT_SoVITS.TTS_infer_pack.TTS import TTS, TTS_Config
+from GPT_SoVITS.request_scheduler import SchedulerFull, TTSRequestScheduler
 from GPT_SoVITS.TTS_infer_pack.text_segmentation_method import get_method_names as get_cut_method_names
+from GPT_SoVITS.TTS_infer_pack.weight_registry import TTSWeightRegistry
 from pydantic import BaseModel
 
 # print(sys.path)
@@ -130,6 +156,12 @@ parser = argparse.ArgumentParser(description="GPT-SoVITS api")
 parser.add_argument("-c", "--tts_config", type=str, default="GPT_SoVITS/configs/tts_infer.yaml", help="tts_infer路径")
 parser.add_argument("-a", "--bind_addr", type=str, default="127.0.0.1", help="default: 127.0.0.1")
 parser.add_argument("-p", "--port", type=int, default="9880", help="default: 9880")
+parser.add_argument("--max_batch_requests", type=int, default=8, help="合并成一次推理的最大请求数, 1为不合并")
+parser.add_argument("--max_batch_wait_ms", type=float, default=20, help="凑批的最长等待时间(毫秒)")
+parser.add_argument("--max_queue_size", type=int, default=32, help="排队的最大请求数, 超过返回429, 0为不限制")
+parser.add_argument("--request_timeout", type=float, default=300, help="请求超时时间(秒), 0为不限制")
+parser.add_argument("--max_resident_weights", type=int, default=4, help="最多常驻的权重组数")
+parser.add_argument("--weights_memory_mb", type=float, default=0, help="常驻权重的总大小上限(MB), 0为不限制")
 args = parser.parse_args()
 config_path = args.tts_config
 # device = args.device
@@ -143,6 +175,16 @@ if config_path in [None, ""]:
 tts_config = TTS_Config(config_path)
 print(tts_config)
 tts_pipeline = TTS(tts_config)
+weight_registry = TTSWeightRegistry(
+    tts_pipeline, max_entries=args.max_resident_weights, memory_budget_mb=args.weights_memory_mb
+)
+tts_scheduler = TTSRequestScheduler(
+    weight_registry,
+    max_batch_size=args.max_batch_requests,
+    max_wait_ms=args.max_batch_wait_ms,
+    max_queue_size=args.max_queue_size,
+)
+request_timeout = args.request_timeout if args.request_timeout > 0 else None
 
 APP = FastAPI()
 
@@ -167,9 +209,12 @@ class TTS_Request(BaseModel):
     media_type: str = "wav"
     streaming_mode: bool = False
     parallel_infer: bool = True
+    continuous_batching: bool = True
     repetition_penalty: float = 1.35
     sample_steps: int = 32
     super_sampling: bool = False
+    gpt_weights_path: str = None
+    sovits_weights_path: str = None
 
 
 ### modify from https://github.com/RVC-Boss/GPT-SoVITS/pull/894/files
@@ -265,6 +310,8 @@ def check_params(req: dict):
     media_type: str = req.get("media_type", "wav")
     prompt_lang: str = req.get("prompt_lang", "")
     text_split_method: str = req.get("text_split_method", "cut5")
+    gpt_weights_path: str = req.get("gpt_weights_path", None)
+    sovits_weights_path: str = req.get("sovits_weights_path", None)
 
     if ref_audio_path in [None, ""]:
         return JSONResponse(status_code=400, content={"message": "ref_audio_path is required"})
@@ -293,6 +340,9 @@ def check_params(req: dict):
         return JSONResponse(
             status_code=400, content={"message": f"text_split_method:{text_split_method} is not supported"}
         )
+    for weights_path in [gpt_weights_path, sovits_weights_path]:
+        if weights_path not in [None, ""] and not os.path.exists(weights_path):
+            return JSONResponse(status_code=400, content={"message": f"weights path not found: {weights_path}"})
 
     return None
 
@@ -323,9 +373,12 @@ async def tts_handle(req: dict):
                 "media_type": "wav",          # str. media type of the output audio, support "wav", "raw", "ogg", "aac".
                 "streaming_mode": False,      # bool. whether to return a streaming response.
                 "parallel_infer": True,       # bool.(optional) whether to use parallel inference.
+                "continuous_batching": True,  # bool.(optional) refill finished T2S batch slots with the remaining sentences.
                 "repetition_penalty": 1.35    # float.(optional) repetition penalty for T2S model.
                 "sample_steps": 32,           # int. number of sampling steps for VITS model V3.
                 "super_sampling": False,       # bool. whether to use super-sampling for audio when using VITS model V3.
+                "gpt_weights_path": "",       # str.(optional) GPT weights for this request, default if empty.
+                "sovits_weights_path": "",    # str.(optional) SoVITS weights for this request, default if empty.
             }
     returns:
         StreamingResponse: audio stream response.
@@ -342,34 +395,47 @@ async def tts_handle(req: dict):
     if streaming_mode or return_fragment:
         req["return_fragment"] = True
 
+    # 推理在调度线程里运行，这里只等结果，不阻塞事件循环
     try:
-        tts_generator = tts_pipeline.run(req)
+        job = tts_scheduler.submit_stream(req) if streaming_mode else tts_scheduler.submit(req)
+    except SchedulerFull as e:
+        return JSONResponse(status_code=429, content={"message": "server busy, retry later", "Exception": str(e)})
 
+    try:
         if streaming_mode:
+            # 第一段出来之前出错或超时还能返回错误码
+            first_chunk = await job.next_chunk(request_timeout)
 
-            def streaming_generator(tts_generator: Generator, media_type: str):
+            async def streaming_generator(media_type: str):
                 if_frist_chunk = True
-                for sr, chunk in tts_generator:
+                async for sr, chunk in tts_scheduler.iter_stream(job, first_chunk, request_timeout):
                     if if_frist_chunk and media_type == "wav":
                         yield wave_header_chunk(sample_rate=sr)
                         media_type = "raw"
                         if_frist_chunk = False
-                    yield pack_audio(BytesIO(), chunk, sr, media_type).getvalue()
+                    yield (await run_in_threadpool(pack_audio, BytesIO(), chunk, sr, media_type)).getvalue()
 
             # _media_type = f"audio/{media_type}" if not (streaming_mode and media_type in ["wav", "raw"]) else f"audio/x-{media_type}"
             return StreamingResponse(
                 streaming_generator(
-                    tts_generator,
                     media_type,
                 ),
                 media_type=f"audio/{media_type}",
             )
 
         else:
-            sr, audio_data = next(tts_generator)
-            audio_data = pack_audio(BytesIO(), audio_data, sr, media_type).getvalue()
+            sr, audio_data = await asyncio.wait_for(asyncio.wrap_future(job.future), request_timeout)
+            audio_data = (await run_in_threadpool(pack_audio, BytesIO(), audio_data, sr, media_type)).getvalue()
             return Response(audio_data, media_type=f"audio/{media_type}")
+    except asyncio.TimeoutError:
+        tts_scheduler.cancel(job)
+        return JSONResponse(status_code=504, content={"message": f"tts timed out after {request_timeout}s"})
+    except asyncio.CancelledError:
+        # 客户端断开
+        tts_scheduler.cancel(job)
+        raise
     except Exception as e:
+        tts_scheduler.cancel(job)
         return JSONResponse(status_code=400, content={"message": "tts failed", "Exception": str(e)})
 
 
@@ -380,6 +446,14 @@ async def control(command: str = None):
     handle_control(command)
 
 
+@APP.get("/health")
+async def health():
+    return JSONResponse(
+        status_code=200,
+        content={"message": "ok", "scheduler": tts_scheduler.stats(), "weights": weight_registry.stats()},
+    )
+
+
 @APP.get("/tts")
 async def tts_get_endpoint(
     text: str = None,
@@ -401,9 +475,12 @@ async def tts_get_endpoint(
     media_type: str = "wav",
     streaming_mode: bool = False,
     parallel_infer: bool = True,
+    continuous_batching: bool = True,
     repetition_penalty: float = 1.35,
     sample_steps: int = 32,
     super_sampling: bool = False,
+    gpt_weights_path: str = None,
+    sovits_weights_path: str = None,
 ):
     req = {
         "text": text,
@@ -425,9 +502,12 @@ async def tts_get_endpoint(
         "media_type": media_type,
         "streaming_mode": streaming_mode,
         "parallel_infer": parallel_infer,
+        "continuous_batching": continuous_batching,
         "repetition_penalty": float(repetition_penalty),
         "sample_steps": int(sample_steps),
         "super_sampling": super_sampling,
+        "gpt_weights_path": gpt_weights_path,
+        "sovits_weights_path": sovits_weights_path,
     }
     return await tts_handle(req)
 
@@ -438,10 +518,16 @@ async def tts_post_endpoint(request: TTS_Request):
     return await tts_handle(req)
 
 
+def set_default_refer_audio(refer_audio_path: str):
+    # 参考音频的缓存是每组权重各自的，这里设置默认权重组的
+    weight_registry.activate()
+    tts_pipeline.set_ref_audio(refer_audio_path)
+
+
 @APP.get("/set_refer_audio")
 async def set_refer_aduio(refer_audio_path: str = None):
     try:
-        tts_pipeline.set_ref_audio(refer_audio_path)
+        await run_in_threadpool(tts_scheduler.run_exclusive, set_default_refer_audio, refer_audio_path)
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": "set refer audio failed", "Exception": str(e)})
     return JSONResponse(status_code=200, content={"message": "success"})
@@ -471,7 +557,7 @@ async def set_gpt_weights(weights_path: str = None):
     try:
         if weights_path in ["", None]:
             return JSONResponse(status_code=400, content={"message": "gpt weight path is required"})
-        tts_pipeline.init_t2s_weights(weights_path)
+        await run_in_threadpool(tts_scheduler.run_exclusive, weight_registry.set_default, gpt_path=weights_path)
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": "change gpt weight failed", "Exception": str(e)})
 
@@ -483,7 +569,7 @@ async def set_sovits_weights(weights_path: str = None):
     try:
         if weights_path in ["", None]:
             return JSONResponse(status_code=400, content={"message": "sovits weight path is required"})
-        tts_pipeline.init_vits_weights(weights_path)
+        await run_in_threadpool(tts_scheduler.run_exclusive, weight_registry.set_default, sovits_path=weights_path)
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": "change sovits weight failed", "Exception": str(e)})
     return JSONResponse(status_code=200, content={"message": "success"})
@@ -2,7 +2,7 @@ import json
 import locale
 import os
 
-I18N_JSON_DIR: os.PathLike = os.path.join(os.path.dirname(os.path.relpath(__file__)), "locale")
+I18N_JSON_DIR: os.PathLike = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locale")
 
 
 def load_language_list(language):
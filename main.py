@@ -5,10 +5,11 @@ from extract_segments import SegmentExtractor
 from transcribe_audio_segments import AudioTranscriber
 from translate_segments import SegmentsTranslator
 from sample_segments import SegmentsSampler
-from synthensize_translations import TranslationsSynthensizer, force_cleanup_gpt_sovits
+from voice_library import VoiceLibrary
+from synthensize_translations import TranslationsSynthensizer
 from assemble_translations import AudioAssembler
 from apply_video_no_vocals import VideoNoVocalsApplier
-from utils import comprehensive_final_cleanup, clear_output_directories
+from utils import cleanup_gpu_memory, comprehensive_final_cleanup, clear_output_directories
 import os
 
 
@@ -44,13 +45,15 @@ def main():
     segments_translator = SegmentsTranslator()
     # Translate audio segments
     translated_segments = segments_translator.translate_segments(transcribed_segments=transcribed_segments,diarization_essensials=diarization , source_lang="en", target_lang="ja", read_from_cache=False, cache_path="caches/translation.pkl")
+    # Persistent voice library shared across episodes of a series
+    voice_library = VoiceLibrary("caches/voice_library")
     # Initialize segments sampler
-    segments_sampler = SegmentsSampler("outputs/audio_segments", "outputs/voice_samples")
+    segments_sampler = SegmentsSampler("outputs/audio_segments", "outputs/voice_samples", voice_library=voice_library)
     # Get a sample per speaker for voice-cloning
     audio_samples = segments_sampler.merge(transcribed_data=translated_segments, read_from_cache=False, cache_path="caches/voice_samples.pkl")
     
     # Initialize translations synthesizer
-    translations_synthesizer = TranslationsSynthensizer()
+    translations_synthesizer = TranslationsSynthensizer(voice_library=voice_library, segment_cache_dir="caches/synthesis_segments")
     # Synthensize translated texts
     synthesis_results = translations_synthesizer.synthesize_translations(
         transcribed_segments=transcribed_segments,
@@ -64,13 +67,12 @@ def main():
         prompt_language="en",
         target_language="ja",
         read_from_cache=False,
-        cache_path="caches/synthesis_results.pkl")
+        cache_path="caches/synthesis_results.pkl",
+        voice_samples=audio_samples)
     
-    # Explicitly delete synthesizer to ensure GPU cleanup
+    # Explicitly delete synthesizer (and its GPT-SoVITS models) to ensure GPU cleanup
     del translations_synthesizer
-    
-    # Force cleanup of GPT-SoVITS models
-    force_cleanup_gpt_sovits()
+    cleanup_gpu_memory()
     
     # Initialize audio assembler
     audio_assembler = AudioAssembler("inputs/input_video.mp4")
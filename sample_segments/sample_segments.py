@@ -1,22 +1,27 @@
 import os
+import shutil
 import ffmpeg
 from glob import glob
 from collections import defaultdict
 import librosa
 import numpy as np
-import torch
 from pydub import AudioSegment
 from utils import save_cache, read_cache
-from transcribe_audio_segments import AudioTranscriber
 
 class SegmentsSampler:
-    def __init__(self, input_folder, output_folder):
+    def __init__(self, input_folder, output_folder, transcriber=None, retranscribe=False, voice_library=None):
         self.input_folder = input_folder
         self.output_folder = output_folder
         self.min_duration = 3.0  # minimum 3 seconds
         self.max_duration = 10.0  # maximum 10 seconds
         self.max_segments = 5  # maximum number of segments to combine
-        self.transcriber = AudioTranscriber()  # Initialize AudioTranscriber
+        # Reference transcripts are composed from the upstream transcription records.
+        # Re-transcribing the merged sample is an opt-in fallback that reuses the
+        # caller's resident AudioTranscriber instead of loading a second Whisper model.
+        self.transcriber = transcriber
+        self.retranscribe = retranscribe
+        # Optional cross-episode VoiceLibrary: known speakers reuse their stored reference
+        self.voice_library = voice_library
 
     def _get_audio_features(self, filepath):
         """Extract audio features for quality analysis and smart segment selection"""
@@ -276,6 +281,64 @@ class SegmentsSampler:
 
         return speaker_segments
     
+    def _fit_segments(self, segments):
+        """Keep the segments that fit within max_duration (including the 200ms gaps), in order.
+
+        Returns (segments, needs_trim); needs_trim is True only when the first segment alone is too long.
+        """
+        if not segments:
+            return segments, False
+        if segments[0]['features']['duration'] > self.max_duration:
+            return segments[:1], True
+        fitted = []
+        total = 0.0
+        for segment in segments:
+            duration = segment['features']['duration'] + (0.2 if fitted else 0.0)
+            if total + duration > self.max_duration:
+                print(f"   ⏭️  Skipping {segment['filename']} ({segment['features']['duration']:.1f}s), it would exceed {self.max_duration}s")
+                continue
+            fitted.append(segment)
+            total += duration
+        return fitted, False
+
+    def _compose_transcription(self, segment_details):
+        """Build the reference transcript from the per-segment transcription records"""
+        return " ".join(seg['transcription'].strip() for seg in segment_details if seg['transcription'].strip())
+
+    def _retranscribe_sample(self, sample_path, fallback_text):
+        """Opt-in: re-transcribe the merged sample with the shared Whisper model"""
+        if self.transcriber is None or getattr(self.transcriber, 'model', None) is None:
+            print("⚠️  Re-transcription requested but no resident transcriber available, using segment transcripts")
+            return fallback_text
+        print(f"Re-transcribing voice sample...")
+        try:
+            transcribed_text = self.transcriber.transcribe_file(sample_path)
+            return transcribed_text or fallback_text
+        except Exception as e:
+            print(f"⚠️  Transcription error: {e}")
+            return fallback_text
+    
+    def _use_library_voice(self, speaker_id, voice_id):
+        """Copy a stored library voice into the output folder in place of a freshly sampled one"""
+        entry = self.voice_library.get(voice_id)
+        output_path = os.path.join(self.output_folder, f"{speaker_id}_voice_sample.wav")
+        transcription_path = os.path.join(self.output_folder, f"{speaker_id}_transcription.txt")
+        shutil.copyfile(entry['reference_wav'], output_path)
+        with open(transcription_path, 'w', encoding='utf-8') as f:
+            f.write(entry['transcript'])
+        self.voice_library.mark_used(voice_id)
+        return {
+            'library_id': voice_id,
+            'audio_path': output_path,
+            'duration': len(AudioSegment.from_wav(output_path)) / 1000.0,
+            'segments_count': 0,
+            'transcription': entry['transcript'],
+            'translation': '',
+            'transcription_file': transcription_path,
+            'translation_file': None,
+            'segment_details': []
+        }
+    
     def merge(self, transcribed_data=None, read_from_cache=False, cache_path=None):
         # Try loading from cache first
         merged_files = read_cache(read_from_cache, cache_path)
@@ -289,6 +352,15 @@ class SegmentsSampler:
         for speaker_id, files in speaker_segments.items():
             print(f"🔍 Processing {speaker_id} with {len(files)} segments...")
             
+            speaker_embedding = None
+            if self.voice_library is not None:
+                speaker_embedding = self.voice_library.embed_speaker(files)
+                voice_id, similarity = self.voice_library.match(speaker_embedding)
+                if voice_id:
+                    print(f"📚 {speaker_id} matches library voice {voice_id} (similarity {similarity:.2f}), skipping sampling")
+                    merged_files[speaker_id] = self._use_library_voice(speaker_id, voice_id)
+                    continue
+            
             # Select diverse segments for voice cloning with transcription data
             selected_segments = self._select_diverse_segments(files, transcribed_data)
             
@@ -298,6 +370,15 @@ class SegmentsSampler:
             
             print(f"✅ Selected {len(selected_segments)} diverse segments for {speaker_id}")
             
+            # Concatenate in original segment order so the composed transcript matches the audio
+            selected_segments = sorted(selected_segments, key=lambda seg: seg['segment_num'])
+            
+            # Drop segments that don't fit instead of cutting the audio, so every transcript belongs to the sample
+            selected_segments, needs_trim = self._fit_segments(selected_segments)
+            if needs_trim and (self.transcriber is None or getattr(self.transcriber, 'model', None) is None):
+                print(f"❌ Only segment for {speaker_id} exceeds {self.max_duration}s and no transcriber is available to re-transcribe the trimmed sample")
+                continue
+            
             # Create concatenated audio from selected segments with gaps for variety
             combined_audio = AudioSegment.empty()
             total_duration = 0
@@ -344,8 +425,8 @@ class SegmentsSampler:
                     'quality_score': segment['features']['quality_score']
                 })
             
-            # Ensure we're within the max duration limit
-            if total_duration > self.max_duration:
+            # A single segment longer than the limit is the only case that still needs cutting
+            if needs_trim:
                 max_ms = int(self.max_duration * 1000)
                 combined_audio = combined_audio[:max_ms]
                 total_duration = self.max_duration
@@ -359,21 +440,12 @@ class SegmentsSampler:
             transcription_path = os.path.join(self.output_folder, f"{speaker_id}_transcription.txt")
             translation_path = os.path.join(self.output_folder, f"{speaker_id}_translation.txt")
             
-            # Simple transcription using Whisper directly
-            print(f"Transcribing voice sample...")
-            try:
-                # Use the transcriber's Whisper model directly
-                result = self.transcriber.model.transcribe(output_path)
-                transcribed_text = result.get('text', '').strip()
-                
-                # Write simple text to file
-                with open(transcription_path, 'w', encoding='utf-8') as f:
-                    f.write(transcribed_text)
-                        
-            except Exception as e:
-                print(f"⚠️  Transcription error: {e}")
-                with open(transcription_path, 'w', encoding='utf-8') as f:
-                    f.write("Transcription failed")
+            transcribed_text = self._compose_transcription(segment_details)
+            if self.retranscribe or needs_trim:
+                transcribed_text = self._retranscribe_sample(output_path, transcribed_text)
+            
+            with open(transcription_path, 'w', encoding='utf-8') as f:
+                f.write(transcribed_text)
             
             # Write simple translation file (just the combined translation)
             with open(translation_path, 'w', encoding='utf-8') as f:
@@ -384,11 +456,16 @@ class SegmentsSampler:
                 else:
                     f.write(f"[No translation available for {speaker_id}]")
             
+            library_id = None
+            if self.voice_library is not None and speaker_embedding is not None and total_duration >= self.min_duration:
+                library_id = self.voice_library.add_speaker(speaker_embedding, output_path, transcribed_text)
+            
             merged_files[speaker_id] = {
+                'library_id': library_id,
                 'audio_path': output_path,
                 'duration': total_duration,
                 'segments_count': len(selected_segments),
-                'transcription': " ".join([seg['transcription'] for seg in segment_details if seg['transcription']]),
+                'transcription': transcribed_text,
                 'translation': " ".join([seg['translation'] for seg in segment_details if seg['translation']]),
                 'transcription_file': transcription_path,
                 'translation_file': translation_path,
@@ -409,19 +486,14 @@ class SegmentsSampler:
                 if all_trans:
                     print(f"🔄 Full translation: {all_trans[:100]}{'...' if len(all_trans) > 100 else ''}")
             
+        # The embedding model is not needed during synthesis, free its GPU memory
+        if self.voice_library is not None:
+            self.voice_library.release_embedding_model()
+
         # Save to cache
         if cache_path:
             save_cache(cache_path, merged_files)
             print(f"Voice samples cached to: {cache_path}")
         
-        # Unload Whisper model and free GPU memory
-        del self.transcriber.model
-        import gc
-        gc.collect()
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-            torch.cuda.synchronize()
-        print("Whisper model unloaded and GPU memory cleared.")
-            
         print(f"✓ Voice sampling completed! {len(merged_files)} speakers processed")
         return merged_files
\ No newline at end of file
@@ -50,7 +50,7 @@ def load_processing_modules():
         from transcribe_audio_segments.transcribe_audio_segments import AudioTranscriber
         from translate_segments.translate_segments import SegmentsTranslator
         from sample_segments.sample_segments import SegmentsSampler
-        from synthensize_translations.synthensize_translations import TranslationsSynthensizer, force_cleanup_gpt_sovits
+        from synthensize_translations.synthensize_translations import TranslationsSynthensizer
         from assemble_translations.assemble_translations import AudioAssembler
         from apply_video_no_vocals.apply_video_no_vocals import VideoNoVocalsApplier
         
@@ -145,10 +145,10 @@ def process_video_full(video_file, parameters, progress_callback=None):
         from transcribe_audio_segments.transcribe_audio_segments import AudioTranscriber
         from translate_segments.translate_segments import SegmentsTranslator
         from sample_segments.sample_segments import SegmentsSampler
-        from synthensize_translations.synthensize_translations import TranslationsSynthensizer, force_cleanup_gpt_sovits
+        from synthensize_translations.synthensize_translations import TranslationsSynthensizer
         from assemble_translations.assemble_translations import AudioAssembler
         from apply_video_no_vocals.apply_video_no_vocals import VideoNoVocalsApplier
-        from utils import comprehensive_final_cleanup
+        from utils import cleanup_gpu_memory, comprehensive_final_cleanup
         
         # Step 1: Extract audio
         audio_extractor = ExtractAudio(input_video_path)
@@ -232,11 +232,9 @@ def process_video_full(video_file, parameters, progress_callback=None):
             read_from_cache=False
         )
         
-        # Explicitly delete synthesizer to ensure GPU cleanup
+        # Explicitly delete synthesizer (and its GPT-SoVITS models) to ensure GPU cleanup
         del translations_synthesizer
-        
-        # Force cleanup of GPT-SoVITS models
-        force_cleanup_gpt_sovits()
+        cleanup_gpu_memory()
         
         if progress_callback:
             progress_callback(0.9, "Synthesis complete, assembling final video...")
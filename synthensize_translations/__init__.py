@@ -1 +1,2 @@
-from .synthensize_translations import TranslationsSynthensizer, force_cleanup_gpt_sovits
\ No newline at end of file
+from .synthensize_translations import TranslationsSynthensizer
+from .synthesis_session import SynthesisSession
@@ -5,75 +5,12 @@ import numpy as np
 from pathlib import Path
 import json
 import glob
-from utils import save_cache, read_cache, cleanup_gpu_memory
+from utils import save_cache, read_cache, cleanup_gpu_memory, SegmentSynthesisCache, weights_fingerprint
 from utils.audio_normalizer import AudioVolumeNormalizer
-
-def force_cleanup_gpt_sovits():
-    """Force cleanup of GPT-SoVITS models - aggressive cleanup for maximum memory savings"""
-    try:
-        import gc
-        import torch
-        import sys
-        import os
-        
-        # Try to access the GPT-SoVITS module if it's been imported
-        # Get the project root directory (parent of synthensize_translations directory)
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)
-        gpt_sovits_path = os.path.join(project_root, "GPT-SoVITS")
-        
-        if gpt_sovits_path in sys.path:
-            try:
-                import GPT_SoVITS.inference_webui as inference_webui
-                
-                # Clear ALL models for maximum memory savings
-                all_model_vars = [
-                    'vq_model', 't2s_model', 'hifigan_model', 'bigvgan_model',
-                    'bert_model', 'ssl_model'
-                ]
-                
-                # Preserve only essential lightweight configuration:
-                # 'hps', 'config', 'dict_language', 'tokenizer' - small config objects
-                
-                for var_name in all_model_vars:
-                    if hasattr(inference_webui, var_name):
-                        try:
-                            model = getattr(inference_webui, var_name)
-                            if model is not None:
-                                if hasattr(model, 'cpu'):
-                                    model = model.cpu()
-                                if hasattr(model, 'to'):
-                                    model = model.to('cpu')
-                                del model
-                            setattr(inference_webui, var_name, None)
-                            print(f"Force cleared {var_name}")
-                        except Exception as e:
-                            print(f"Warning force clearing {var_name}: {e}")
-                            try:
-                                setattr(inference_webui, var_name, None)
-                            except:
-                                pass
-                                
-            except Exception as e:
-                print(f"Could not access GPT-SoVITS inference module: {e}")
-        
-        # Aggressive garbage collection
-        for _ in range(5):
-            gc.collect()
-        
-        # Aggressive GPU cleanup
-        if torch.cuda.is_available():
-            for _ in range(5):
-                torch.cuda.empty_cache()
-                torch.cuda.synchronize()
-                
-        print("Aggressive force cleanup of GPT-SoVITS completed")
-        
-    except Exception as e:
-        print(f"Force cleanup failed: {e}")
+from .synthesis_session import SynthesisSession
 
 class TranslationsSynthensizer:
-    def __init__(self, gpt_model_path=None, sovits_model_path=None):
+    def __init__(self, gpt_model_path=None, sovits_model_path=None, voice_library=None, segment_cache_dir=None, cpu_int8=False, cpu_bf16=False, backend="torch", onnx_model_dir=None, onnx_pool_size=1, onnx_threads=0, torchscript_bundle_dir=None):
         # Get the project root directory (parent of synthensize_translations directory)
         current_dir = os.path.dirname(os.path.abspath(__file__))
         project_root = os.path.dirname(current_dir)
@@ -84,6 +21,31 @@ class TranslationsSynthensizer:
         self.gpt_model_path = gpt_model_path or "GPT_SoVITS/pretrained_models/s1v3.ckpt"
         self.sovits_model_path = sovits_model_path or "GPT_SoVITS/pretrained_models/v2Pro/s2Gv2ProPlus.pth"
         
+        # Optional cross-episode VoiceLibrary holding per-speaker prompt features
+        self.voice_library = voice_library
+        
+        # Optional persistent per-line cache so re-dubs only re-synthesize changed lines
+        self.segment_cache = SegmentSynthesisCache(segment_cache_dir) if segment_cache_dir else None
+        
+        # CPU-only deployments: dynamic int8 quantization and/or bfloat16 autocast (ignored when CUDA is available)
+        self.cpu_int8 = cpu_int8
+        self.cpu_bf16 = cpu_bf16
+        
+        # "torch" runs GPT_SoVITS/inference_core.py; "onnx" runs T2S/SV/VITS exported by
+        # GPT_SoVITS/onnx_export_v2pro.py with onnxruntime (the text frontend stays on inference_core);
+        # "torchscript" runs a bundle exported by GPT_SoVITS/export_torch_script.py
+        if backend not in ("torch", "onnx", "torchscript"):
+            raise ValueError(f"Unknown synthesis backend: {backend}")
+        if backend == "onnx" and not onnx_model_dir:
+            raise ValueError("onnx_model_dir is required for the onnx backend")
+        if backend == "torchscript" and not torchscript_bundle_dir:
+            raise ValueError("torchscript_bundle_dir is required for the torchscript backend")
+        self.backend = backend
+        self.onnx_model_dir = onnx_model_dir
+        self.onnx_pool_size = onnx_pool_size
+        self.onnx_threads = onnx_threads
+        self.torchscript_bundle_dir = torchscript_bundle_dir
+        
         # Initialize audio normalizer for consistent volume
         self.audio_normalizer = AudioVolumeNormalizer(target_lufs=-20.0, peak_limit=-3.0)
         
@@ -94,322 +56,107 @@ class TranslationsSynthensizer:
         os.makedirs(self.output_dir, exist_ok=True)
         
     def _setup_gpt_sovits(self):
-        """Setup GPT-SoVITS environment and imports"""
-        # Add the GPT-SoVITS directory to Python path
-        sys.path.append(self.gpt_sovits_path)
-
-        # Change to the GPT-SoVITS directory before importing modules
-        self.original_cwd = os.getcwd()
-        os.chdir(self.gpt_sovits_path)
-
-        # Set the correct BERT and CNHubert paths before importing GPT-SoVITS modules
-        os.environ["bert_path"] = os.path.join(self.gpt_sovits_path, "GPT_SoVITS", "pretrained_models", "chinese-roberta-wwm-ext-large")
-        os.environ["cnhubert_base_path"] = os.path.join(self.gpt_sovits_path, "GPT_SoVITS", "pretrained_models", "chinese-hubert-base")
+        """Build the GPT-SoVITS inference objects; paths resolve against the GPT-SoVITS root, the cwd is never changed"""
+        # inference_core/TTS_infer_pack are imported by module name from GPT-SoVITS/GPT_SoVITS
+        for path in (self.gpt_sovits_path, os.path.join(self.gpt_sovits_path, "GPT_SoVITS")):
+            if path not in sys.path:
+                sys.path.append(path)
         
         # Set CUDA memory allocation configuration to help with fragmentation
         os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
-
-        # Import GPT-SoVITS modules directly
-        from tools.i18n.i18n import I18nAuto
         
-        print("Importing GPT-SoVITS inference functions...")
-        try:
-            from GPT_SoVITS.inference_webui import change_gpt_weights, change_sovits_weights, get_tts_wav
-            print("Successfully imported inference functions")
-        except Exception as e:
-            print(f"Failed to import inference functions: {e}")
-            raise
-
-        # Store the imports for later use
-        self.change_gpt_weights = change_gpt_weights
-        self.change_sovits_weights = change_sovits_weights
-        self.get_tts_wav = get_tts_wav
-
-        # Initialize i18n (do this from the GPT-SoVITS directory)
-        self.i18n = I18nAuto()
-        
-        # Change back to original directory
-        os.chdir(self.original_cwd)
-        
-        # Load models once
-        print("Loading GPT-SoVITS models...")
-        print(f"GPT model path: {self.gpt_model_path}")
-        print(f"SoVITS model path: {self.sovits_model_path}")
-        
-        # Change back to GPT-SoVITS directory for loading
-        os.chdir(self.gpt_sovits_path)
-        try:
-            print(f"Loading GPT model: {self.gpt_model_path}")
-            gpt_result = self.change_gpt_weights(gpt_path=self.gpt_model_path)
-            print(f"Initial GPT load result: {type(gpt_result)}")
-            
-            print(f"Loading SoVITS model: {self.sovits_model_path}")
-            # SoVITS function is a generator, consume it properly
-            sovits_generator = self.change_sovits_weights(
-                sovits_path=self.sovits_model_path,
-                prompt_language="中文",
-                text_language="中文"
-            )
-            sovits_results = []
-            try:
-                for result in sovits_generator:
-                    sovits_results.append(result)
-            except Exception as e:
-                print(f"SoVITS generator completed: {e}")
-            
-            print("Models loaded successfully!")
-        finally:
-            os.chdir(self.original_cwd)
-    
-    def _verify_model_files_exist(self):
-        """Verify that the model files actually exist on disk"""
-        import os
-        
-        print("Verifying model files exist...")
-        
-        # Convert relative paths to absolute paths from GPT-SoVITS directory
-        gpt_full_path = os.path.join(self.gpt_sovits_path, self.gpt_model_path)
-        sovits_full_path = os.path.join(self.gpt_sovits_path, self.sovits_model_path)
-        
-        if not os.path.exists(gpt_full_path):
-            print(f"GPT model file not found: {gpt_full_path}")
-            return False
+        # Models are loaded once here and then only health-checked; see SynthesisSession
+        if self.backend == "torchscript":
+            self.session = SynthesisSession("TorchScript", self._setup_torchscript_backend)
         else:
-            print(f"GPT model file exists: {gpt_full_path}")
-            
-        if not os.path.exists(sovits_full_path):
-            print(f"SoVITS model file not found: {sovits_full_path}")
-            return False
-        else:
-            print(f"SoVITS model file exists: {sovits_full_path}")
-            
-        return True
-    
-    def _manually_load_bert_ssl_models(self):
-        """Manually load BERT and SSL models if they're missing"""
-        try:
-            import GPT_SoVITS.inference_webui as inference_webui
+            print("Importing GPT-SoVITS inference core...")
+            from inference_core import GPTSoVITSInference, i18n, set_seed
             
-            # Check if models need to be loaded
-            need_bert = not (hasattr(inference_webui, 'bert_model') and inference_webui.bert_model is not None)
-            need_ssl = not (hasattr(inference_webui, 'ssl_model') and inference_webui.ssl_model is not None)
+            # No models are loaded here: BERT/SSL load on first use, the rest in session.load()
+            self.tts = GPTSoVITSInference(cpu_int8=self.cpu_int8, cpu_bf16=self.cpu_bf16)
+            self.set_seed = set_seed
+            self.i18n = i18n
             
-            if need_bert or need_ssl:
-                print(f"Manually loading missing models: BERT={need_bert}, SSL={need_ssl}")
-                
-                # Change to GPT-SoVITS directory for loading
-                original_cwd = os.getcwd()
-                os.chdir(self.gpt_sovits_path)
-                
-                try:
-                    # Get the necessary imports and settings
-                    from transformers import AutoTokenizer, AutoModelForMaskedLM
-                    from feature_extractor import cnhubert
-                    import torch
-                    
-                    # Get device and half precision settings
-                    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-                    is_half = torch.cuda.is_available() and torch.cuda.get_device_capability()[0] >= 6
-                    
-                    # Load BERT model if needed
-                    if need_bert:
-                        bert_path = os.environ.get("bert_path", os.path.join(self.gpt_sovits_path, "GPT_SoVITS", "pretrained_models", "chinese-roberta-wwm-ext-large"))
-                        print(f"Loading BERT model from: {bert_path}")
-                        
-                        if not hasattr(inference_webui, 'tokenizer') or inference_webui.tokenizer is None:
-                            inference_webui.tokenizer = AutoTokenizer.from_pretrained(bert_path)
-                            print("Tokenizer loaded")
-                        
-                        inference_webui.bert_model = AutoModelForMaskedLM.from_pretrained(bert_path)
-                        if is_half:
-                            inference_webui.bert_model = inference_webui.bert_model.half().to(device)
-                        else:
-                            inference_webui.bert_model = inference_webui.bert_model.to(device)
-                        print("BERT model loaded")
-                    
-                    # Load SSL model if needed
-                    if need_ssl:
-                        print("Loading SSL model...")
-                        inference_webui.ssl_model = cnhubert.get_model()
-                        if is_half:
-                            inference_webui.ssl_model = inference_webui.ssl_model.half().to(device)
-                        else:
-                            inference_webui.ssl_model = inference_webui.ssl_model.to(device)
-                        print("SSL model loaded")
-                        
-                    return True
-                    
-                except Exception as e:
-                    print(f"Error manually loading models: {e}")
-                    return False
-                finally:
-                    os.chdir(original_cwd)
+            if self.backend == "onnx":
+                self.session = SynthesisSession("ONNX", self._setup_onnx_backend)
             else:
-                print("BERT and SSL models already loaded")
-                return True
-                
-        except Exception as e:
-            print(f"Error in manual model loading: {e}")
-            return False
+                self.get_tts_wav = self.tts.get_tts_wav
+                self.prefetch_g2pw = self.tts.prefetch_g2pw
+                self.session = SynthesisSession(
+                    "GPT-SoVITS",
+                    self._load_gpt_sovits_weights,
+                    model_holder=self.tts,
+                    required_models=("t2s_model", "vq_model", "hps")
+                )
+        self.session.load()
+    
+    def _load_gpt_sovits_weights(self):
+        """Load the GPT and SoVITS weights into the inference core"""
+        print("Loading GPT-SoVITS models...")
+        print(f"Loading GPT model: {self.gpt_model_path}")
+        self.tts.load_gpt(self.gpt_model_path)
+        print(f"Loading SoVITS model: {self.sovits_model_path}")
+        self.tts.load_sovits(self.sovits_model_path)
+        print("Models loaded successfully!")
+    
+    def _setup_onnx_backend(self):
+        """Route get_tts_wav through onnxruntime sessions instead of the PyTorch GPT/SoVITS weights"""
+        from onnx_runtime_v2pro import OnnxV2ProRunner, OnnxV2ProTTS
+        
+        onnx_model_dir = os.path.join(self.gpt_sovits_path, self.onnx_model_dir)
+        print(f"Loading ONNX models from: {onnx_model_dir}")
+        runner = OnnxV2ProRunner(
+            onnx_model_dir,
+            pool_size=self.onnx_pool_size,
+            intra_op_num_threads=self.onnx_threads
+        )
+        onnx_tts = OnnxV2ProTTS(runner, self.tts)
+        self.get_tts_wav = onnx_tts.get_tts_wav
+        self.prefetch_g2pw = onnx_tts.prefetch_g2pw
+        print(f"ONNX backend ready ({runner.config['model_version']})")
+    
+    def _setup_torchscript_backend(self):
+        """Load a scripted GPT-SoVITS bundle; all models live on this instance, nothing global is touched"""
+        from tools.i18n.i18n import I18nAuto
+        from TTS_infer_pack.TorchScriptTTS import TorchScriptTTS
+        
+        bundle_dir = os.path.join(self.gpt_sovits_path, self.torchscript_bundle_dir)
+        print(f"Loading TorchScript bundle from: {bundle_dir}")
+        self.torchscript_tts = TorchScriptTTS(bundle_dir)
+        self.get_tts_wav = self.torchscript_tts.get_tts_wav
+        self.prefetch_g2pw = self.torchscript_tts.prefetch_g2pw
+        self.set_seed = self._set_seed
+        self.i18n = I18nAuto()
+        print(f"TorchScript backend ready ({self.torchscript_tts.config['version']})")
     
-    def ensure_models_loaded(self):
-        """Ensure models are loaded before synthesis"""
+    @staticmethod
+    def _set_seed(seed):
+        """Same seeding as inference_webui.set_seed, without importing it"""
+        import random
+        import torch
         
-        # First verify model files exist
-        if not self._verify_model_files_exist():
-            print("Model files missing, cannot reload models")
-            return
-            
-        try:
-            import GPT_SoVITS.inference_webui as inference_webui
-            
-            # Check if main models are loaded and accessible
-            models_loaded = True
-            missing_models = []
-            
-            # Check critical models that must be loaded for synthesis
-            critical_models = ['vq_model', 't2s_model', 'hps', 'ssl_model', 'bert_model']
-            
-            for model_name in critical_models:
-                if not (hasattr(inference_webui, model_name) and 
-                       getattr(inference_webui, model_name) is not None):
-                    models_loaded = False
-                    missing_models.append(model_name)
-            
-            if missing_models:
-                print(f"Missing models: {', '.join(missing_models)}")
-                print("Reloading all models...")
-                
-                # Debug: Check current working directory and available functions
-                print(f"Current working directory: {os.getcwd()}")
-                print(f"GPT-SoVITS path: {self.gpt_sovits_path}")
-                print(f"Available functions: change_gpt_weights={self.change_gpt_weights}, change_sovits_weights={self.change_sovits_weights}")
-                
-                # Change to GPT-SoVITS directory for model loading
-                original_cwd = os.getcwd()
-                os.chdir(self.gpt_sovits_path)
-                print(f"Changed to directory: {os.getcwd()}")
-                
-                try:
-                    # Reload both GPT and SoVITS models (this loads all necessary models)
-                    # Make sure we're in the right directory context
-                    print(f"Loading GPT model from: {self.gpt_model_path}")
-                    gpt_result = self.change_gpt_weights(gpt_path=self.gpt_model_path)
-                    print(f"GPT model load result: {type(gpt_result)}")
-                    
-                    print(f"Loading SoVITS model from: {self.sovits_model_path}")
-                    # The sovits function is a generator, so we need to consume it
-                    # Also provide default language parameters to avoid the prompt_text_update error
-                    sovits_generator = self.change_sovits_weights(
-                        sovits_path=self.sovits_model_path,
-                        prompt_language="中文",  # Provide default Chinese
-                        text_language="中文"     # Provide default Chinese
-                    )
-                    sovits_results = []
-                    try:
-                        for result in sovits_generator:
-                            sovits_results.append(result)
-                            print(f"SoVITS generator yielded: {type(result)}")
-                    except Exception as gen_e:
-                        print(f"SoVITS generator completed or error: {gen_e}")
-                    
-                    print("Model loading functions called successfully!")
-                    
-                    # Give models a moment to load
-                    import time
-                    time.sleep(3)  # Increased wait time
-                    
-                    # Manually load BERT and SSL models if needed
-                    self._manually_load_bert_ssl_models()
-                    
-                    # Verify models are actually loaded after reload
-                    print("Verifying model state after reload...")
-                    for model_name in critical_models:
-                        if hasattr(inference_webui, model_name):
-                            model_value = getattr(inference_webui, model_name)
-                            if model_value is None:
-                                print(f" Warning: {model_name} is None after reload")
-                            else:
-                                print(f"{model_name} successfully loaded (type: {type(model_value)})")
-                        else:
-                            print(f" Warning: {model_name} attribute missing after reload")
-                    
-                finally:
-                    os.chdir(original_cwd)
-            else:
-                print("All critical models already loaded")
-            
-        except Exception as e:
-            print(f"Warning: Could not check model status: {e}")
-            # Try to reload anyway
-            try:
-                original_cwd = os.getcwd()
-                os.chdir(self.gpt_sovits_path)
-                
-                try:
-                    print(f"Emergency reload - GPT model: {self.gpt_model_path}")
-                    gpt_result = self.change_gpt_weights(gpt_path=self.gpt_model_path)
-                    print(f"Emergency GPT result: {type(gpt_result)}")
-                    
-                    print(f"Emergency reload - SoVITS model: {self.sovits_model_path}")
-                    # Handle generator properly with default language parameters
-                    sovits_generator = self.change_sovits_weights(
-                        sovits_path=self.sovits_model_path,
-                        prompt_language="中文",
-                        text_language="中文"
-                    )
-                    try:
-                        for result in sovits_generator:
-                            pass  # Just consume the generator
-                    except Exception as gen_e:
-                        print(f"Emergency SoVITS generator: {gen_e}")
-                    
-                    print("Emergency models reloaded!")
-                    
-                    # Wait a bit and check again
-                    import time
-                    time.sleep(3)
-                    
-                    # Also try manual BERT/SSL loading
-                    self._manually_load_bert_ssl_models()
-                    
-                    try:
-                        import GPT_SoVITS.inference_webui as inference_webui
-                        for model_name in ['vq_model', 't2s_model', 'hps']:
-                            if hasattr(inference_webui, model_name):
-                                model_value = getattr(inference_webui, model_name)
-                                if model_value is None:
-                                    print(f" Emergency check: {model_name} is still None")
-                                else:
-                                    print(f"Emergency check: {model_name} loaded")
-                    except Exception as check_e:
-                        print(f"Could not verify emergency reload: {check_e}")
-                        
-                finally:
-                    os.chdir(original_cwd)
-            except Exception as reload_error:
-                print(f"Emergency reload failed: {reload_error}")
-                # Last resort - try to reinitialize everything
-                try:
-                    print("Attempting full reinitialization...")
-                    self._setup_gpt_sovits()
-                except Exception as init_error:
-                    print(f"Full reinitialization failed: {init_error}")
+        if seed == -1:
+            seed = random.randint(0, 1000000)
+        seed = int(seed)
+        random.seed(seed)
+        os.environ["PYTHONHASHSEED"] = str(seed)
+        np.random.seed(seed)
+        torch.manual_seed(seed)
+        if torch.cuda.is_available():
+            torch.cuda.manual_seed(seed)
     
     def cleanup_models(self):
         """Unload GPT-SoVITS models and free GPU memory (conservative cleanup during processing)"""
+        # The TorchScript bundle has no separately releasable models
+        if self.backend == "torchscript":
+            cleanup_gpu_memory()
+            return
+        
         try:
             import gc
             import torch
             
-            # Change to GPT-SoVITS directory to access global variables
-            original_cwd = os.getcwd()
-            os.chdir(self.gpt_sovits_path)
-            
-            # Import the inference module to access global variables
             try:
-                import GPT_SoVITS.inference_webui as inference_webui
-                
                 # Only clear non-essential models during processing to avoid errors
                 # Keep essential models loaded to prevent "NoneType has no attribute 'model'" errors
                 
@@ -423,29 +170,26 @@ class TranslationsSynthensizer:
                 # - hps, config (essential configuration)
                 
                 for model_name in models_to_clear:
-                    if hasattr(inference_webui, model_name):
+                    if hasattr(self.tts, model_name):
                         try:
-                            model = getattr(inference_webui, model_name)
+                            model = getattr(self.tts, model_name)
                             if model is not None:
                                 if hasattr(model, 'cpu'):
                                     model = model.cpu()
                                 if hasattr(model, 'to'):
                                     model = model.to('cpu')
                                 del model
-                            setattr(inference_webui, model_name, None)
+                            setattr(self.tts, model_name, None)
                             print(f"{model_name} cleared")
                         except Exception as e:
                             print(f"Warning clearing {model_name}: {e}")
                             try:
-                                setattr(inference_webui, model_name, None)
+                                setattr(self.tts, model_name, None)
                             except:
                                 pass
                         
             except Exception as e:
-                print(f"Warning: Could not access GPT-SoVITS global variables: {e}")
-            
-            # Change back to original directory
-            os.chdir(original_cwd)
+                print(f"Warning: Could not clear GPT-SoVITS models: {e}")
             
             # Light memory cleanup
             gc.collect()
@@ -472,7 +216,7 @@ class TranslationsSynthensizer:
     def __del__(self):
         """Destructor to ensure models are cleaned up when object is destroyed"""
         try:
-            if hasattr(self, 'change_gpt_weights') and self.change_gpt_weights is not None:
+            if hasattr(self, 'tts') or hasattr(self, 'torchscript_tts'):
                 self.cleanup_models()
         except:
             pass  # Ignore errors during destruction
@@ -493,56 +237,44 @@ class TranslationsSynthensizer:
         }
         return language_map.get(lang_code.lower(), '英文')  # Default to English if not found
     
-    def _cleanup_chinese_models(self):
-        """Clean up Chinese-specific models (G2PW) to free GPU memory"""
+    def _text_feature_cache(self):
+        """The phoneme/BERT cache of the active text frontend (see text_feature_cache.py), if any"""
+        if self.backend == "torchscript":
+            text_preprocessor = getattr(getattr(self, 'torchscript_tts', None), 'text_preprocessor', None)
+            return getattr(text_preprocessor, 'feature_cache', None)
+        return getattr(getattr(self, 'tts', None), 'text_feature_cache', None)
+    
+    def _prefetch_g2pw(self, translations, target_language):
+        """Run G2PW once over every chunk the speaker's remaining lines will send to get_tts_wav.
+
+        The backend splits each chunk into sentences and language segments exactly as get_tts_wav does,
+        so every line's frontend then hits the resident G2PW cache.
+        """
+        texts = [
+            chunk['text']
+            for segment in translations if segment.get('translation', '').strip()
+            for chunk in self._split_long_text_smartly(segment['translation'], max_length=180)
+        ]
         try:
-            # Change to GPT-SoVITS directory to access the chinese2 module
-            original_cwd = os.getcwd()
-            os.chdir(self.gpt_sovits_path)
-            
+            self.session.run(
+                self.prefetch_g2pw,
+                texts,
+                self.i18n(self._get_language_name(target_language)),
+                self.i18n("不切")
+            )
+        except Exception as e:
+            print(f"Warning: G2PW prefetch failed, falling back to per-line inference: {e}")
+    
+    def _cleanup_chinese_models(self):
+        """Release the resident G2PW session (final cleanup only; it stays loaded between lines and speakers)"""
+        chinese2_module = sys.modules.get('text.chinese2')
+        if chinese2_module is not None and hasattr(chinese2_module, 'cleanup_g2pw'):
             try:
-                # Import and call the Chinese cleanup function
-                import sys
-                if 'GPT_SoVITS.text.chinese2' in sys.modules:
-                    chinese2_module = sys.modules['GPT_SoVITS.text.chinese2']
-                    if hasattr(chinese2_module, 'cleanup_g2pw'):
-                        chinese2_module.cleanup_g2pw()
-                elif 'text.chinese2' in sys.modules:
-                    chinese2_module = sys.modules['text.chinese2']
-                    if hasattr(chinese2_module, 'cleanup_g2pw'):
-                        chinese2_module.cleanup_g2pw()
-                
-                # Force aggressive garbage collection and GPU cleanup
-                import gc
-                import torch
-                
-                # Multiple rounds of garbage collection
-                for i in range(3):
-                    collected = gc.collect()
-                    if collected > 0:
-                        print(f"  GC round {i+1}: Collected {collected} objects")
-                
-                # Aggressive GPU memory cleanup
-                if torch.cuda.is_available():
-                    for _ in range(5):
-                        torch.cuda.empty_cache()
-                        torch.cuda.synchronize()
-                    
-                    try:
-                        memory_allocated = torch.cuda.memory_allocated() / 1024**3
-                        memory_reserved = torch.cuda.memory_reserved() / 1024**3
-                    except:
-                        pass
-                        
+                chinese2_module.cleanup_g2pw()
             except Exception as e:
                 print(f"Warning during Chinese model cleanup: {e}")
-            finally:
-                os.chdir(original_cwd)
-                
-        except Exception as e:
-            print(f"Error in Chinese model cleanup: {e}")
         
-    def synthesize_translations(self, transcribed_segments, translated_segments, voice_samples_dir, audio_segments_dir, top_k, top_p, temperature, speed, prompt_language="ja", target_language="en", read_from_cache=False, cache_path=None):
+    def synthesize_translations(self, transcribed_segments, translated_segments, voice_samples_dir, audio_segments_dir, top_k, top_p, temperature, speed, prompt_language="ja", target_language="en", read_from_cache=False, cache_path=None, voice_samples=None, seed=None):
         """
         Synthesize translated audio for all speakers
         
@@ -559,12 +291,14 @@ class TranslationsSynthensizer:
             target_language: Target language for synthesis ('ja', 'en', 'zh', etc.)
             read_from_cache: Whether to try loading from cache first
             cache_path: Path to cache file
+            voice_samples: Optional SegmentsSampler.merge result, used to find each speaker's library voice
+            seed: Optional seed applied before every line so results are reproducible and cacheable
             
         Returns:
             Dict with synthesis results including timing information
         """
-        # Ensure models are loaded before synthesis
-        self.ensure_models_loaded()
+        # Cheap health check; reloads (and says so) only if the models were released or a call failed
+        self.session.ensure_ready()
         
         self.top_k = top_k
         self.top_p = top_p
@@ -572,6 +306,7 @@ class TranslationsSynthensizer:
         self.speed = speed
         self.prompt_language = prompt_language
         self.target_language = target_language
+        self.seed = seed
         # Try loading from cache first
         synthesis_results = read_cache(read_from_cache, cache_path)
         if synthesis_results:
@@ -603,6 +338,18 @@ class TranslationsSynthensizer:
                 
             speaker_translations = translated_segments[speaker_id]
             
+            # Reuse stored prompt features for speakers known to the voice library
+            library_id = (voice_samples or {}).get(speaker_id, {}).get('library_id')
+            features_key = f"{self.sovits_model_path}|{self.prompt_language}"
+            if self.backend != "torch":
+                features_key += f"|{self.backend}"
+            prompt_cache = {}
+            if self.voice_library is not None and library_id:
+                prompt_cache = self.voice_library.load_prompt_features(library_id, features_key) or {}
+                if prompt_cache:
+                    print(f"Using voice library prompt features for {speaker_id} ({library_id})")
+            had_prompt_features = bool(prompt_cache)
+            
             # Synthesize each translated segment
             speaker_results = self._synthesize_speaker_segments(
                 speaker_id=speaker_id,
@@ -611,18 +358,28 @@ class TranslationsSynthensizer:
                 other_references=other_references,
                 translations=speaker_translations,
                 prompt_language=self.prompt_language,
-                target_language=self.target_language
+                target_language=self.target_language,
+                prompt_cache=prompt_cache
             )
             
-            synthesis_results[speaker_id] = speaker_results
+            if self.voice_library is not None and library_id and prompt_cache and not had_prompt_features:
+                self.voice_library.save_prompt_features(library_id, features_key, prompt_cache)
             
-            # Clean up Chinese models if target language is Chinese
-            if self.target_language.lower() == 'zh' or self.target_language == '中文':
-                self._cleanup_chinese_models()
+            synthesis_results[speaker_id] = speaker_results
             
             # Light memory cleanup between speakers (non-disruptive)
             self._intermediate_cleanup()
             
+        if self.segment_cache is not None:
+            stats = self.segment_cache.stats()
+            print(f"Segment cache: {stats['hits']} reused, {stats['misses']} synthesized ({stats['hit_rate']:.0%} hit rate)")
+        text_feature_cache = self._text_feature_cache()
+        if text_feature_cache is not None and text_feature_cache.enabled:
+            print(text_feature_cache.report())
+        word_pron_cache_module = sys.modules.get('text.word_pron_cache')
+        if word_pron_cache_module is not None:
+            print(word_pron_cache_module.word_pron_cache.report())
+        
         # Save to cache
         if cache_path:
             save_cache(cache_path, synthesis_results)
@@ -638,19 +395,18 @@ class TranslationsSynthensizer:
     
     def _final_memory_cleanup(self):
         """Aggressive memory cleanup after ALL synthesis is complete"""
+        # The TorchScript bundle has no separately releasable models
+        if self.backend == "torchscript":
+            cleanup_gpu_memory()
+            return
+        
         try:
             import gc
             import torch
             
             print("Performing aggressive final memory cleanup...")
             
-            # Change to GPT-SoVITS directory to access global variables
-            original_cwd = os.getcwd()
-            os.chdir(self.gpt_sovits_path)
-            
             try:
-                import GPT_SoVITS.inference_webui as inference_webui
-                
                 # NOW we can aggressively clear ALL models since synthesis is done
                 all_models_to_clear = [
                     'vq_model', 't2s_model', 'hifigan_model', 'bigvgan_model',
@@ -658,35 +414,36 @@ class TranslationsSynthensizer:
                 ]
                 
                 for model_name in all_models_to_clear:
-                    if hasattr(inference_webui, model_name):
+                    if hasattr(self.tts, model_name):
                         try:
-                            model = getattr(inference_webui, model_name)
+                            model = getattr(self.tts, model_name)
                             if model is not None:
                                 if hasattr(model, 'cpu'):
                                     model = model.cpu()
                                 if hasattr(model, 'to'):
                                     model = model.to('cpu')
                                 del model
-                            setattr(inference_webui, model_name, None)
+                            setattr(self.tts, model_name, None)
                             print(f"  Final cleanup: {model_name} cleared")
                         except Exception as e:
                             print(f"  Warning clearing {model_name}: {e}")
                             try:
-                                setattr(inference_webui, model_name, None)
+                                setattr(self.tts, model_name, None)
                             except:
                                 pass
                 
                 # Keep only essential lightweight configuration:
                 # 'hps', 'config', 'dict_language', 'tokenizer' - for next video
                 
+                # The ONNX frontend reloads BERT/SSL lazily; the torch weights need an explicit reload
+                if self.backend == "torch":
+                    self.session.invalidate("models released by final cleanup")
+                
                 # Also clean up Chinese models in final cleanup
                 self._cleanup_chinese_models()
                         
             except Exception as e:
-                print(f"   Could not access GPT-SoVITS global variables: {e}")
-            
-            # Change back to original directory
-            os.chdir(original_cwd)
+                print(f"   Could not clear GPT-SoVITS models: {e}")
             
             # Clear any remaining references
             if hasattr(self, 'get_tts_wav'):
@@ -822,7 +579,7 @@ class TranslationsSynthensizer:
         
         return chunks
 
-    def _synthesize_text_chunks(self, speaker_id, segment_num, text_chunks, reference_wav, reference_text, inp_refs, prompt_language, target_language, speaker_output_dir, start_time, end_time, original_text):
+    def _synthesize_text_chunks(self, speaker_id, segment_num, text_chunks, reference_wav, reference_text, inp_refs, prompt_language, target_language, speaker_output_dir, start_time, end_time, original_text, prompt_cache=None):
         """Synthesize multiple text chunks and combine them"""
         chunk_audio_files = []
         combined_audio = None
@@ -843,9 +600,6 @@ class TranslationsSynthensizer:
             print(f"  Synthesizing chunk {chunk_index + 1}/{len(text_chunks)}: '{chunk_text[:40]}...'")
             
             try:
-                # Ensure models are loaded before each chunk synthesis
-                self.ensure_models_loaded()
-                
                 # Adjust parameters for continuation chunks
                 synthesis_params = {
                     'ref_wav_path': reference_wav,
@@ -864,10 +618,10 @@ class TranslationsSynthensizer:
                     'sample_steps': 8,
                     'if_sr': False,
                     'pause_second': 0.1 if is_continuation else 0.3,  # Shorter pause for continuations
+                    'prompt_cache': prompt_cache,
                 }
                 
-                synthesis_result = self.get_tts_wav(**synthesis_params)
-                result_list = list(synthesis_result)
+                result_list = self._run_tts(**synthesis_params)
                 
                 if result_list:
                     sampling_rate, audio_data = result_list[-1]
@@ -933,8 +687,38 @@ class TranslationsSynthensizer:
         
         return None
 
-    def _synthesize_speaker_segments(self, speaker_id, reference_wav, reference_text, other_references, translations, prompt_language, target_language):
+    def _run_tts(self, **synthesis_params):
+        """One get_tts_wav call through the session, consumed to its final (sampling_rate, audio) list"""
+        if self.seed is not None:
+            self.set_seed(self.seed)
+        return self.session.run(lambda: list(self.get_tts_wav(**synthesis_params)))
+
+    def _segment_key_base(self, reference_wav, reference_text, other_references, prompt_language, target_language):
+        """Everything but the line text that determines a synthesized line, computed once per speaker"""
+        reference_hash = SegmentSynthesisCache.reference_voice_hash(reference_wav, reference_text, other_references, prompt_language)
+        params = {
+            'top_k': self.top_k,
+            'top_p': self.top_p,
+            'temperature': self.temperature,
+            'speed': self.speed,
+            'target_language': target_language
+        }
+        if self.cpu_int8 or self.cpu_bf16:
+            params['cpu_mode'] = {'int8': bool(self.cpu_int8), 'bf16': bool(self.cpu_bf16)}
+        if self.backend != "torch":
+            params['backend'] = self.backend
+        models = [
+            weights_fingerprint(os.path.join(self.gpt_sovits_path, self.gpt_model_path)),
+            weights_fingerprint(os.path.join(self.gpt_sovits_path, self.sovits_model_path))
+        ]
+        return reference_hash, params, self.seed, models
+
+    def _synthesize_speaker_segments(self, speaker_id, reference_wav, reference_text, other_references, translations, prompt_language, target_language, prompt_cache=None):
         """Synthesize all segments for a single speaker with smart text handling"""
+        # The reference voice is fixed for the speaker, so its prompt features are computed
+        # on the first line and shared by every following line and chunk
+        if prompt_cache is None:
+            prompt_cache = {}
         speaker_results = {
             'segments': [],
             'speaker_id': speaker_id,
@@ -953,7 +737,12 @@ class TranslationsSynthensizer:
         
         inp_refs = [FileObject(ref_file) for ref_file in other_references] if other_references else None
         
-        for segment in translations:
+        segment_key_base = None
+        if self.segment_cache is not None:
+            segment_key_base = self._segment_key_base(reference_wav, reference_text, other_references, prompt_language, target_language)
+        
+        g2p_prefetched = False
+        for segment_idx, segment in enumerate(translations):
             segment_num = segment.get('segment_num', 0)
             translated_text = segment.get('translation', '')
             start_time = segment.get('start')
@@ -964,11 +753,30 @@ class TranslationsSynthensizer:
                 print(f"Skipping empty translation for {speaker_id} segment {segment_num}")
                 continue
             
+            segment_key = None
+            if segment_key_base is not None:
+                segment_key = SegmentSynthesisCache.make_key(translated_text, *segment_key_base)
+                output_wav_path = os.path.join(speaker_output_dir, f"{speaker_id}_translated_seg{segment_num}.wav")
+                cached_result = self.segment_cache.load(segment_key, output_wav_path)
+                if cached_result:
+                    # Timing and source text come from this run, audio from the cache
+                    cached_result.update({
+                        'segment_num': segment_num,
+                        'original_text': original_text,
+                        'start_time': start_time,
+                        'end_time': end_time,
+                        'duration': end_time - start_time if (start_time is not None and end_time is not None) else None
+                    })
+                    speaker_results['segments'].append(cached_result)
+                    print(f"  ↺ Reused cached synthesis for {speaker_id} segment {segment_num}")
+                    continue
+            
             print(f"Synthesizing {speaker_id} segment {segment_num}: '{translated_text[:50]}...'")
             
-            # Pre-cleanup Chinese models before synthesis if target language is Chinese
-            if target_language.lower() == 'zh' or target_language == '中文':
-                self._cleanup_chinese_models()
+            # One batched G2PW pass over this and all following lines of the speaker
+            if not g2p_prefetched:
+                self._prefetch_g2pw(translations[segment_idx:], target_language)
+                g2p_prefetched = True
             
             # Smart text splitting
             text_chunks = self._split_long_text_smartly(translated_text, max_length=180)
@@ -976,10 +784,7 @@ class TranslationsSynthensizer:
             if len(text_chunks) == 1 and not text_chunks[0]['is_split']:
                 # Single chunk - use original method
                 try:
-                    # Ensure models are loaded right before synthesis
-                    self.ensure_models_loaded()
-                    
-                    synthesis_result = self.get_tts_wav(
+                    result_list = self._run_tts(
                         ref_wav_path=reference_wav,
                         prompt_text=reference_text,
                         prompt_language=self.i18n(self._get_language_name(prompt_language)),
@@ -995,14 +800,10 @@ class TranslationsSynthensizer:
                         inp_refs=inp_refs,
                         sample_steps=8,
                         if_sr=False,
-                        pause_second=0.3
+                        pause_second=0.3,
+                        prompt_cache=prompt_cache
                     )
                     
-                    # Immediately clean up Chinese models after synthesis call if target language is Chinese
-                    if target_language.lower() == 'zh' or target_language == '中文':
-                        self._cleanup_chinese_models()
-                    
-                    result_list = list(synthesis_result)
                     if result_list:
                         sampling_rate, audio_data = result_list[-1]
                         
@@ -1031,12 +832,9 @@ class TranslationsSynthensizer:
                         }
                         
                         speaker_results['segments'].append(segment_result)
+                        if segment_key:
+                            self.segment_cache.store(segment_key, segment_result)
                         print(f"  ✓ Saved to: {output_wav_path}")
-                        
-                        # Clean up Chinese models after each segment if target language is Chinese
-                        if target_language.lower() == 'zh' or target_language == '中文':
-                            self._cleanup_chinese_models()
-                            
                     else:
                         print(f"  ✗ No audio generated for segment {segment_num}")
                         
@@ -1050,17 +848,15 @@ class TranslationsSynthensizer:
                 
                 segment_result = self._synthesize_text_chunks(
                     speaker_id, segment_num, text_chunks, reference_wav, reference_text,
-                    inp_refs, prompt_language, target_language, speaker_output_dir, start_time, end_time, original_text
+                    inp_refs, prompt_language, target_language, speaker_output_dir, start_time, end_time, original_text,
+                    prompt_cache=prompt_cache
                 )
                 
                 if segment_result:
                     speaker_results['segments'].append(segment_result)
+                    if segment_key:
+                        self.segment_cache.store(segment_key, segment_result)
                     print(f"  ✓ Combined audio saved to: {segment_result['output_file']}")
-                    
-                    # Clean up Chinese models after each segment if target language is Chinese
-                    if target_language.lower() == 'zh' or target_language == '中文':
-                        self._cleanup_chinese_models()
-                        
                 else:
                     print(f"  ✗ Failed to synthesize long segment {segment_num}")
         
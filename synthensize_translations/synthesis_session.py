@@ -0,0 +1,62 @@
+import time
+
+
+class SynthesisSession:
+    """Holds the synthesis models for one TranslationsSynthensizer with an explicit lifecycle.
+
+    load() runs the backend loader once; healthy() only checks in-memory state, so it is cheap
+    enough to call before every line. A reload happens only when the session was invalidated
+    (e.g. models released by a cleanup) or a synthesis call failed and left a required model
+    missing, and it is always logged together with its cost.
+    """
+
+    def __init__(self, name, loader, model_holder=None, required_models=()):
+        self.name = name
+        self._loader = loader
+        self.model_holder = model_holder
+        self.required_models = tuple(required_models)
+        self.state = "unloaded"
+        self.reason = None
+        self.load_count = 0
+        self.last_load_seconds = None
+
+    def load(self):
+        start = time.perf_counter()
+        self._loader()
+        self.last_load_seconds = time.perf_counter() - start
+        self.load_count += 1
+        self.state = "ready"
+        self.reason = None
+        print(f"{self.name} session loaded in {self.last_load_seconds:.1f}s")
+
+    def missing_models(self):
+        return [name for name in self.required_models if getattr(self.model_holder, name, None) is None]
+
+    def healthy(self):
+        return self.state == "ready" and not self.missing_models()
+
+    def ensure_ready(self):
+        """Load on first use and reload only after invalidate()/a failed call; otherwise a no-op"""
+        if self.healthy():
+            return
+        if self.state != "unloaded":
+            reason = self.reason or f"missing {', '.join(self.missing_models())}"
+            print(f"Reloading {self.name} session ({reason})")
+        self.load()
+
+    def invalidate(self, reason):
+        """Mark the models as released so the next ensure_ready() reloads them"""
+        self.state = "stale"
+        self.reason = reason
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn with the session ready; a failure that leaves required models missing marks the session failed"""
+        self.ensure_ready()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            missing = self.missing_models()
+            if missing:
+                self.state = "failed"
+                self.reason = f"{type(e).__name__} with {', '.join(missing)} missing"
+            raise
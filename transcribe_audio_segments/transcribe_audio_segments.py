@@ -13,7 +13,7 @@ class AudioTranscriber:
         self.model = whisper.load_model(model_size, device=device)
         self.model_size = model_size
     
-    def transcribe_folder(self, segments_folder, diarization_data=None, language=None, read_from_cache=False, cache_path=None):
+    def transcribe_folder(self, segments_folder, diarization_data=None, language=None, read_from_cache=False, cache_path=None, keep_model_loaded=False):
         
         # Try loading from cache first
         transcriptions = read_cache(read_from_cache, cache_path)
@@ -112,16 +112,30 @@ class AudioTranscriber:
             save_cache(cache_path, dict(transcriptions))
             print(f"Transcriptions cached to: {cache_path}")
         
-        # Unload Whisper model and free GPU memory
-        del self.model
+        # Unload Whisper model and free GPU memory unless a later stage shares it
+        if not keep_model_loaded:
+            self.release_model()
+        
+        print(f"✓ Transcription completed! {len(transcriptions)} speakers")
+        return dict(transcriptions)
+
+    def transcribe_file(self, audio_file, language=None):
+        """Transcribe a single audio file with the resident Whisper model"""
+        if self.model is None:
+            raise RuntimeError("Whisper model has already been unloaded")
+        result = self.model.transcribe(audio_file, language=language, verbose=False, word_timestamps=False)
+        return result.get('text', '').strip()
+
+    def release_model(self):
+        """Unload the Whisper model and free GPU memory"""
+        if self.model is None:
+            return
+        self.model = None
         import gc
         gc.collect()
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
             torch.cuda.synchronize()
         print("Whisper model unloaded and GPU memory cleared.")
-        
-        print(f"✓ Transcription completed! {len(transcriptions)} speakers")
-        return dict(transcriptions)
     
         
\ No newline at end of file
@@ -2,4 +2,5 @@ from .cache_utils import save_cache, read_cache
 from .token_utils import save_token, load_token
 from .api_key_utils import save_api_key, load_api_key
 from .gpu_utils import cleanup_gpu_memory, get_gpu_memory_info, print_gpu_memory_usage, comprehensive_final_cleanup
-from .clear_output_directories import clear_output_directories
\ No newline at end of file
+from .clear_output_directories import clear_output_directories
+from .segment_cache import SegmentSynthesisCache, hash_file, weights_fingerprint
@@ -0,0 +1,92 @@
+import os
+import json
+import shutil
+import hashlib
+
+
+def hash_file(path, hasher=None):
+    """Hash a file's contents in chunks"""
+    hasher = hasher or hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(chunk)
+    return hasher
+
+
+def weights_fingerprint(path):
+    """Identify a weights file by path, size and modification time without reading it"""
+    if path and os.path.exists(path):
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+    return str(path)
+
+
+class SegmentSynthesisCache:
+    """Persistent per-line synthesis cache for incremental re-dubs.
+
+    Each synthesized line is stored as <key>.wav plus <key>.json (its segment metadata),
+    where the key covers everything that changes the generated audio.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def reference_voice_hash(reference_wav, reference_text, other_references=None, prompt_language=None):
+        hasher = hashlib.sha1()
+        hasher.update(f"{reference_text}|{prompt_language}".encode('utf-8'))
+        for path in [reference_wav] + sorted(other_references or []):
+            hash_file(path, hasher)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def make_key(translated_text, reference_hash, params, seed, model_fingerprints):
+        payload = json.dumps({
+            'text': translated_text,
+            'reference': reference_hash,
+            'params': params,
+            'seed': seed,
+            'models': model_fingerprints
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav"), os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, key, output_path):
+        """Copy the cached WAV to output_path and return its stored metadata, or None on a miss"""
+        wav_path, meta_path = self._paths(key)
+        if not (os.path.exists(wav_path) and os.path.exists(meta_path)):
+            self.misses += 1
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                segment_result = json.load(f)
+            shutil.copyfile(wav_path, output_path)
+        except Exception as e:
+            print(f"Failed to read segment cache entry {key}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        segment_result['output_file'] = output_path
+        return segment_result
+
+    def store(self, key, segment_result):
+        wav_path, meta_path = self._paths(key)
+        try:
+            shutil.copyfile(segment_result['output_file'], wav_path)
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(segment_result, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            print(f"Failed to store segment cache entry {key}: {e}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
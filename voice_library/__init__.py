@@ -0,0 +1 @@
+from .voice_library import VoiceLibrary
\ No newline at end of file
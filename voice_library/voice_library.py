@@ -0,0 +1,169 @@
+import os
+import json
+import shutil
+import uuid
+from datetime import datetime
+import numpy as np
+import torch
+from utils import load_token
+
+
+class VoiceLibrary:
+    """Persistent cross-episode store of speaker voices indexed by speaker embedding.
+
+    Layout on disk:
+        <library_dir>/index.json                      speaker entries and their embeddings
+        <library_dir>/<voice_id>/reference.wav        chosen reference clip
+        <library_dir>/<voice_id>/prompt_features.pt   GPT-SoVITS prompt features per SoVITS model
+    """
+
+    def __init__(self, library_dir="caches/voice_library", match_threshold=0.75, embedding_model="pyannote/wespeaker-voxceleb-resnet34-LM"):
+        self.library_dir = os.path.abspath(library_dir)
+        self.index_path = os.path.join(self.library_dir, "index.json")
+        self.match_threshold = match_threshold
+        self.embedding_model = embedding_model
+        self._inference = None
+        os.makedirs(self.library_dir, exist_ok=True)
+        self.entries = self._load_index()
+        self._rebuild_matrix()
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    return json.load(f).get("speakers", {})
+            except Exception as e:
+                print(f"⚠️  Failed to read voice library index: {e}")
+        return {}
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"speakers": self.entries}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _rebuild_matrix(self):
+        """Stack the normalized embeddings so a lookup is a single matrix-vector product"""
+        self._ids = list(self.entries.keys())
+        if self._ids:
+            self._matrix = np.stack([self._normalize(self.entries[i]['embedding']) for i in self._ids])
+        else:
+            self._matrix = None
+
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    def _get_inference(self):
+        if self._inference is None:
+            from pyannote.audio import Inference, Model
+            print(f"Loading speaker embedding model: {self.embedding_model}")
+            model = Model.from_pretrained(self.embedding_model, use_auth_token=load_token())
+            self._inference = Inference(model, window="whole")
+            if torch.cuda.is_available():
+                self._inference.to(torch.device("cuda"))
+        return self._inference
+
+    def embed_speaker(self, audio_files, max_files=8):
+        """Average the normalized per-segment embeddings of a diarized speaker"""
+        inference = self._get_inference()
+        embeddings = []
+        for audio_file in audio_files[:max_files]:
+            try:
+                embeddings.append(self._normalize(inference(audio_file)))
+            except Exception as e:
+                print(f"⚠️  Could not embed {audio_file}: {e}")
+        if not embeddings:
+            return None
+        return self._normalize(np.mean(embeddings, axis=0))
+
+    def release_embedding_model(self):
+        """Free the speaker embedding model once the library has been built; it is reloaded on demand"""
+        if self._inference is None:
+            return
+        self._inference = None
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def match(self, embedding):
+        """Return (voice_id, similarity) of the nearest stored speaker above the threshold, else (None, best)"""
+        if embedding is None or self._matrix is None:
+            return None, 0.0
+        similarities = self._matrix @ self._normalize(embedding)
+        best = int(np.argmax(similarities))
+        score = float(similarities[best])
+        if score >= self.match_threshold:
+            return self._ids[best], score
+        return None, score
+
+    def get(self, voice_id):
+        entry = self.entries.get(voice_id)
+        if entry is None:
+            return None
+        return dict(entry, reference_wav=os.path.join(self.library_dir, entry['reference_wav']))
+
+    def add_speaker(self, embedding, reference_wav, transcript, name=None):
+        """Store a new speaker's reference clip and transcript, returning its voice id"""
+        voice_id = uuid.uuid4().hex[:12]
+        voice_dir = os.path.join(self.library_dir, voice_id)
+        os.makedirs(voice_dir, exist_ok=True)
+        shutil.copyfile(reference_wav, os.path.join(voice_dir, "reference.wav"))
+        self.entries[voice_id] = {
+            'name': name or voice_id,
+            'embedding': self._normalize(embedding).tolist(),
+            'reference_wav': os.path.join(voice_id, "reference.wav"),
+            'transcript': transcript,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'episodes': 1
+        }
+        self._save_index()
+        self._rebuild_matrix()
+        print(f"📚 Added {name or voice_id} to voice library as {voice_id}")
+        return voice_id
+
+    def mark_used(self, voice_id):
+        if voice_id in self.entries:
+            self.entries[voice_id]['episodes'] = self.entries[voice_id].get('episodes', 0) + 1
+            self._save_index()
+
+    def _features_path(self, voice_id):
+        return os.path.join(self.library_dir, voice_id, "prompt_features.pt")
+
+    def load_prompt_features(self, voice_id, model_key):
+        """Load cached GPT-SoVITS prompt features (prompt_semantic, phones, BERT, refers, SV embeddings)"""
+        path = self._features_path(voice_id)
+        if not voice_id or not os.path.exists(path):
+            return None
+        try:
+            features = torch.load(path, map_location="cpu", weights_only=False)
+            return features.get(model_key)
+        except Exception as e:
+            print(f"⚠️  Failed to load prompt features for {voice_id}: {e}")
+            return None
+
+    def save_prompt_features(self, voice_id, model_key, prompt_cache):
+        """Persist the prompt features computed by get_tts_wav for one SoVITS model"""
+        if not voice_id or voice_id not in self.entries or not prompt_cache:
+            return
+        path = self._features_path(voice_id)
+        features = {}
+        if os.path.exists(path):
+            try:
+                features = torch.load(path, map_location="cpu", weights_only=False)
+            except Exception:
+                features = {}
+        features[model_key] = _to_cpu(prompt_cache)
+        torch.save(features, path)
+        print(f"📚 Saved prompt features for {voice_id}")
+
+
+def _to_cpu(value):
+    if isinstance(value, torch.Tensor):
+        return value.detach().cpu()
+    if isinstance(value, dict):
+        return {k: _to_cpu(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_to_cpu(v) for v in value)
+    return value